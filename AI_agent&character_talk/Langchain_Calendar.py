@@ -1,58 +1,36 @@
 # langchain_calendar.py
 from langchain_groq import ChatGroq
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import PydanticOutputParser
+from langchain_core.output_parsers import PydanticOutputParser, StrOutputParser
+from langchain_core.runnables import RunnableLambda
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import List, Optional, Sequence
+from contextlib import asynccontextmanager
+import json
+import textwrap
 import datetime as dt
 import pytz
 from jsonschema import validate
-import re
+from llm_scheduler import PRIORITY_CALENDAR, estimate_tokens
+from parse_cache import ParseCache
+from chinese_time_parser import ChineseScheduleParser
+from event_router import MultiEventClassifier, split_schedule
+from json_repair import repair_events_json, failed_generation
 
 
-# =========================
-# 1️⃣ 日曆事件資料模型
-# =========================
-
-class CalendarEvent(BaseModel):
-    """單一日曆事件數據模型"""
-    title: str = Field(description="事件標題")
-    date: str = Field(description="日期，格式：YYYY-MM-DD")
-    start: str = Field(description="開始時間，格式：HH:MM")
-    end: str = Field(description="結束時間，格式：HH:MM")
+# 輸出模式
+OUTPUT_MODE_JSON = "json"  # JSON 模式，格式說明放在提示詞內
+OUTPUT_MODE_TOOL = "tool"  # 以工具呼叫傳遞 schema，提示詞不再附格式說明
+OUTPUT_MODES = (OUTPUT_MODE_JSON, OUTPUT_MODE_TOOL)
 
+# 拆分後至少有這麼多片段，才改走批次解析
+BULK_MIN_SEGMENTS = 3
 
-class MultipleCalendarEvents(BaseModel):
-    """多個日曆事件數據模型"""
-    events: List[CalendarEvent] = Field(description="事件列表")
-    count: int = Field(description="事件數量")
-
-
-# =========================
-# 2️⃣ 日曆助理主體
-# =========================
+# 工具模式下取代 format_instructions 的提示
+TOOL_INSTRUCTIONS = "請呼叫 CalendarEventList 工具回傳事件。"
 
-class CalendarAssistant:
-    """LangChain LCEL 日曆助理（支援多事件）"""
-
-    def __init__(self, groq_api_key: str, timezone: str = "Asia/Taipei"):
-        self.timezone = timezone
-
-        # LLM（Groq）
-        self.llm = ChatGroq(
-            temperature=0,
-            groq_api_key=groq_api_key,
-            model_name="llama-3.1-8b-instant"
-        )
-
-        # 單一事件解析器
-        self.single_parser = PydanticOutputParser(pydantic_object=CalendarEvent)
-        
-        # 多事件解析器
-        self.multi_parser = PydanticOutputParser(pydantic_object=MultipleCalendarEvents)
-
-        # 單一事件 Prompt
-        single_system_template = """
+# 單一事件 Prompt
+SINGLE_SYSTEM_TEMPLATE = """
             你是一個日曆助理，負責將自然語言轉換為結構化的日曆事件，請將以下行程轉為中文簡述。
 
             ⚠️ 要求規則：
@@ -74,9 +52,9 @@ class CalendarAssistant:
 
             {format_instructions}
             """
-        
-        # 多事件 Prompt
-        multi_system_template = """
+
+# 多事件 Prompt
+MULTI_SYSTEM_TEMPLATE = """
             你是一個日曆助理，負責將自然語言轉換為多個結構化的日曆事件。
 
             ⚠️ 要求規則：
@@ -113,101 +91,360 @@ class CalendarAssistant:
             {format_instructions}
             """
 
+
+# =========================
+# 1️⃣ 日曆事件資料模型
+# =========================
+
+class CalendarEvent(BaseModel):
+    """單一日曆事件數據模型"""
+    title: str = Field(description="事件標題")
+    date: str = Field(description="日期，格式：YYYY-MM-DD")
+    start: str = Field(description="開始時間，格式：HH:MM")
+    end: str = Field(description="結束時間，格式：HH:MM")
+
+
+class MultipleCalendarEvents(BaseModel):
+    """多個日曆事件數據模型"""
+    events: List[CalendarEvent] = Field(description="事件列表")
+    count: int = Field(description="事件數量")
+
+
+class CalendarEventList(BaseModel):
+    """記錄從用戶輸入中解析出的日曆事件"""
+    events: List[CalendarEvent] = Field(description="事件列表（單一事件也放在列表中）")
+
+
+# =========================
+# 2️⃣ 日曆助理主體
+# =========================
+
+class CalendarAssistant:
+    """LangChain LCEL 日曆助理（支援多事件）"""
+
+    def __init__(self, groq_api_key: str, timezone: str = "Asia/Taipei", scheduler=None,
+                 cache_size: int = 256, rule_confidence_threshold: float = 0.7,
+                 output_mode: str = OUTPUT_MODE_JSON, bulk_concurrency: int = 4):
+        if output_mode not in OUTPUT_MODES:
+            raise ValueError(f"❌ 不支援的輸出模式: {output_mode}")
+
+        self.timezone = timezone
+        self.output_mode = output_mode
+        # 批次解析（長篇貼上）的同時呼叫上限
+        self.bulk_concurrency = max(1, bulk_concurrency)
+        # 規則解析快速通道：信心足夠時不呼叫 LLM
+        self.rule_parser = ChineseScheduleParser(timezone)
+        self.event_classifier = MultiEventClassifier()
+        self.rule_confidence_threshold = rule_confidence_threshold
+        self.rule_stats = {"hits": 0, "fallbacks": 0}
+        # 全域 LLM 排程器（LLMScheduler），僅用於非同步介面
+        self.scheduler = scheduler
+        # 解析結果快取（換日自動失效）
+        self.parse_cache = ParseCache(timezone, max_size=cache_size)
+        # 模型輸出修復統計
+        self.repair_stats = {"clean": 0, "repaired": 0, "failed": 0}
+
+        # LLM（Groq）
+        self.llm = ChatGroq(
+            temperature=0,
+            groq_api_key=groq_api_key,
+            model_name="llama-3.1-8b-instant"
+        )
+        # JSON 模式：模型只會輸出 JSON 物件
+        self.json_llm = self.llm.bind(response_format={"type": "json_object"})
+        # 工具模式：schema 經由工具定義傳遞，強制呼叫 CalendarEventList
+        self.tool_llm = self.llm.bind_tools([CalendarEventList], tool_choice="CalendarEventList")
+
+        # 格式說明只在建立時產生一次，之後以 partial 固定在 Prompt 裡
+        if output_mode == OUTPUT_MODE_TOOL:
+            single_instructions = multi_instructions = TOOL_INSTRUCTIONS
+        else:
+            single_instructions = PydanticOutputParser(pydantic_object=CalendarEvent).get_format_instructions()
+            multi_instructions = PydanticOutputParser(pydantic_object=MultipleCalendarEvents).get_format_instructions()
+
+        # 去掉原始碼縮排，避免每次請求多送數百個空白
+        single_system = textwrap.dedent(SINGLE_SYSTEM_TEMPLATE).strip()
+        multi_system = textwrap.dedent(MULTI_SYSTEM_TEMPLATE).strip()
+
         self.single_prompt = ChatPromptTemplate.from_messages([
-            ("system", single_system_template),
+            ("system", single_system),
             ("human", "{user_input}")
-        ])
+        ]).partial(format_instructions=single_instructions)
         
         self.multi_prompt = ChatPromptTemplate.from_messages([
-            ("system", multi_system_template),
+            ("system", multi_system),
             ("human", "{user_input}")
-        ])
-
-        # 創建兩個 Chain：單一事件和多事件
-        self.single_chain = self.single_prompt | self.llm | self.single_parser
-        self.multi_chain = self.multi_prompt | self.llm | self.multi_parser
+        ]).partial(format_instructions=multi_instructions)
+
+        # 提示詞固定部分的 token 粗估（用於排程器額度估算）
+        self.prompt_overhead_tokens = estimate_tokens(max(
+            single_system.replace("{format_instructions}", single_instructions),
+            multi_system.replace("{format_instructions}", multi_instructions),
+            key=len
+        ))
+        if output_mode == OUTPUT_MODE_TOOL:
+            self.prompt_overhead_tokens += estimate_tokens(json.dumps(CalendarEventList.model_json_schema()))
+
+        # 兩個 Chain 共用同一段抽取流程：模型輸出 → 本地修復 → 事件列表
+        if output_mode == OUTPUT_MODE_TOOL:
+            extract_events = self.tool_llm | RunnableLambda(self._parse_tool_output)
+        else:
+            extract_events = self.json_llm | StrOutputParser() | RunnableLambda(self._parse_events_output)
+        self.single_chain = self.single_prompt | extract_events
+        self.multi_chain = self.multi_prompt | extract_events
+
+        # 批次用：每個項目依路由結果選擇 Chain（非同步時經過排程器）
+        self.extract_runnable = RunnableLambda(self._extract_item, afunc=self._aextract_item)
 
     # =========================
     # 3️⃣ 對外使用介面
     # =========================
 
-    def parse_input(self, user_input: str) -> CalendarEvent:
-        """解析自然語言為單一日曆事件"""
+    def _build_inputs(self, user_input: str) -> dict:
+        """組合 Prompt 輸入（含當前日期時間；格式說明已預先固定在 Prompt 中）"""
         now = dt.datetime.now(pytz.timezone(self.timezone))
         
-        inputs = {
+        return {
             "user_input": user_input,
             "current_date": now.strftime("%Y-%m-%d"),
-            "current_time": now.strftime("%H:%M"),
-            "format_instructions": self.single_parser.get_format_instructions()
+            "current_time": now.strftime("%H:%M")
         }
 
+    def _try_rule_parse(self, user_input: str) -> Optional[List[CalendarEvent]]:
+        """先以規則解析；信心不足時回傳 None，交給 LLM"""
+        result = self.rule_parser.parse(user_input)
+        if result.confidence < self.rule_confidence_threshold:
+            self.rule_stats["fallbacks"] += 1
+            return None
+
+        try:
+            events = [CalendarEvent(**parsed.to_dict()) for parsed in result.events]
+            for event in events:
+                self._validate_event(event)
+        except Exception:
+            self.rule_stats["fallbacks"] += 1
+            return None
+
+        self.rule_stats["hits"] += 1
+        return events
+
+    def _parse_events_output(self, text: str) -> List[CalendarEvent]:
+        """把模型輸出轉為事件列表（先在本地修復，不重新呼叫 LLM）"""
+        try:
+            items, repaired = repair_events_json(text)
+            events = [CalendarEvent(**item) for item in items]
+            for event in events:
+                self._validate_event(event)
+        except Exception:
+            self.repair_stats["failed"] += 1
+            raise
+
+        self.repair_stats["repaired" if repaired else "clean"] += 1
+        return events
+
+    def _parse_tool_output(self, message) -> List[CalendarEvent]:
+        """工具模式：讀取 CalendarEventList 的參數（沒有工具呼叫時改修復文字內容）"""
+        if message.tool_calls:
+            return self._parse_events_output(json.dumps(message.tool_calls[0]["args"], ensure_ascii=False))
+        return self._parse_events_output(message.content)
+
+    def _recover_events(self, error: Exception) -> List[CalendarEvent]:
+        """JSON 模式驗證失敗時，改為修復錯誤訊息附帶的原始輸出"""
+        raw = failed_generation(error)
+        if not raw:
+            raise error
+        return self._parse_events_output(raw)
+
+    def _invoke_events(self, chain, inputs: dict) -> List[CalendarEvent]:
         try:
-            event = self.single_chain.invoke(inputs)
-            self._validate_event(event)
-            return event
+            return chain.invoke(inputs)
+        except Exception as e:
+            return self._recover_events(e)
+
+    async def _ainvoke_events(self, chain, inputs: dict) -> List[CalendarEvent]:
+        try:
+            return await chain.ainvoke(inputs)
+        except Exception as e:
+            return self._recover_events(e)
+
+    def parse_input(self, user_input: str, use_rules: bool = True) -> CalendarEvent:
+        """解析自然語言為單一日曆事件"""
+        if use_rules:
+            events = self._try_rule_parse(user_input)
+            if events and len(events) == 1:
+                return events[0]
+
+        inputs = self._build_inputs(user_input)
+
+        try:
+            return self._invoke_events(self.single_chain, inputs)[0]
         except Exception as e:
             raise ValueError(f"❌ LangChain 解析錯誤: {e}")
 
     def parse_multiple_input(self, user_input: str) -> List[CalendarEvent]:
         """解析自然語言為多個日曆事件"""
-        now = dt.datetime.now(pytz.timezone(self.timezone))
-        
-        inputs = {
-            "user_input": user_input,
-            "current_date": now.strftime("%Y-%m-%d"),
-            "current_time": now.strftime("%H:%M"),
-            "format_instructions": self.multi_parser.get_format_instructions()
-        }
+        inputs = self._build_inputs(user_input)
 
         try:
-            result = self.multi_chain.invoke(inputs)
-            for event in result.events:
-                self._validate_event(event)
-            return result.events
+            return self._invoke_events(self.multi_chain, inputs)
+        except Exception as e:
+            raise ValueError(f"❌ LangChain 多事件解析錯誤: {e}")
+
+    @asynccontextmanager
+    async def _llm_slot(self, inputs: dict, tenant=None):
+        """經由排程器取得 LLM 呼叫許可（日曆解析為高優先）"""
+        if self.scheduler is None:
+            yield
+            return
+
+        estimated = estimate_tokens("".join(str(v) for v in inputs.values()), 300) + self.prompt_overhead_tokens
+        async with self.scheduler.slot(PRIORITY_CALENDAR, tenant, estimated):
+            yield
+
+    async def aparse_input(self, user_input: str, tenant=None, use_rules: bool = True) -> CalendarEvent:
+        """非同步解析自然語言為單一日曆事件"""
+        if use_rules:
+            events = self._try_rule_parse(user_input)
+            if events and len(events) == 1:
+                return events[0]
+
+        inputs = self._build_inputs(user_input)
+
+        try:
+            async with self._llm_slot(inputs, tenant):
+                events = await self._ainvoke_events(self.single_chain, inputs)
+            return events[0]
         except Exception as e:
-            # 如果多事件解析失敗，嘗試單一事件
-            try:
-                single_event = self.parse_input(user_input)
-                return [single_event]
-            except:
-                raise ValueError(f"❌ LangChain 多事件解析錯誤: {e}")
+            raise ValueError(f"❌ LangChain 解析錯誤: {e}")
+
+    async def aparse_multiple_input(self, user_input: str, tenant=None) -> List[CalendarEvent]:
+        """非同步解析自然語言為多個日曆事件"""
+        inputs = self._build_inputs(user_input)
+
+        try:
+            async with self._llm_slot(inputs, tenant):
+                return await self._ainvoke_events(self.multi_chain, inputs)
+        except Exception as e:
+            raise ValueError(f"❌ LangChain 多事件解析錯誤: {e}")
+
+    # --------------------------
+    # 批次解析
+    # --------------------------
+    def _extract_item(self, item: dict) -> List[CalendarEvent]:
+        chain = self.multi_chain if item["mode"] == "multi" else self.single_chain
+        return self._invoke_events(chain, item["inputs"])
+
+    async def _aextract_item(self, item: dict) -> List[CalendarEvent]:
+        chain = self.multi_chain if item["mode"] == "multi" else self.single_chain
+        async with self._llm_slot(item["inputs"], item.get("tenant")):
+            return await self._ainvoke_events(chain, item["inputs"])
+
+    def _plan_many(self, texts: Sequence[str], tenant=None, populate_cache: bool = True):
+        """先以快取與規則解析處理，回傳 (結果列表, 需要 LLM 的項目)"""
+        results: List[Optional[dict]] = [None] * len(texts)
+        pending = []
+
+        for index, text in enumerate(texts):
+            cached = self.parse_cache.get(text, False)
+            if cached is not None:
+                results[index] = cached
+                continue
+
+            rule_result = self._rule_result(text, False)
+            if rule_result is not None:
+                if populate_cache:
+                    self.parse_cache.put(text, rule_result, False)
+                results[index] = rule_result
+                continue
+
+            mode = "multi" if self._has_multiple_events(text) else "single"
+            pending.append({
+                "index": index,
+                "text": text,
+                "mode": mode,
+                "inputs": self._build_inputs(text),
+                "tenant": tenant
+            })
+
+        return results, pending
+
+    def _collect_many(self, results: List[Optional[dict]], pending: List[dict], outputs,
+                      populate_cache: bool = True) -> List[dict]:
+        """把批次輸出依原順序放回結果列表"""
+        for item, output in zip(pending, outputs):
+            if isinstance(output, Exception):
+                results[item["index"]] = self._build_error_result(output)
+                continue
+
+            events = output if item["mode"] == "multi" else output[:1]
+            result = self._build_result(events, item["mode"])
+            if populate_cache:
+                self.parse_cache.put(item["text"], result, False)
+            results[item["index"]] = result
+
+        return results
+
+    def parse_many(self, texts: Sequence[str], max_concurrency: Optional[int] = None) -> List[dict]:
+        """批次解析多段輸入，結果順序與輸入相同；單筆失敗不影響其他筆"""
+        results, pending = self._plan_many(texts)
+        if pending:
+            outputs = self.extract_runnable.batch(
+                pending,
+                config={"max_concurrency": max_concurrency or self.bulk_concurrency},
+                return_exceptions=True
+            )
+            self._collect_many(results, pending, outputs)
+        return results
+
+    async def aparse_many(self, texts: Sequence[str], max_concurrency: Optional[int] = None,
+                          tenant=None, populate_cache: bool = True) -> List[dict]:
+        """非同步批次解析（每一筆仍經過排程器）
+
+        populate_cache=False：仍會讀取快取，但不寫入（大量匯入時使用）
+        """
+        results, pending = self._plan_many(texts, tenant, populate_cache)
+        if pending:
+            outputs = await self.extract_runnable.abatch(
+                pending,
+                config={"max_concurrency": max_concurrency or self.bulk_concurrency},
+                return_exceptions=True
+            )
+            self._collect_many(results, pending, outputs, populate_cache)
+        return results
+
+    def _merge_many_results(self, segments: List[str], results: List[dict]) -> dict:
+        """把各片段的結果合併成一個多事件結果"""
+        events = []
+        failed = []
+        for segment, result in zip(segments, results):
+            if result["success"]:
+                events.extend(CalendarEvent(**{key: event[key] for key in ("title", "date", "start", "end")})
+                              for event in result["events"])
+            else:
+                failed.append({"text": segment, "error": result["error"]})
+
+        if not events:
+            return self._build_error_result(ValueError(f"❌ {len(failed)} 個片段全部解析失敗"))
+
+        merged = self._build_result(events, "multi", source="bulk")
+        merged["segments"] = len(segments)
+        merged["failed_segments"] = failed
+        if failed:
+            merged["summary"] += f"，{len(failed)} 個片段失敗"
+        return merged
+
+    def _cache_bulk_result(self, user_input: str, result: dict, force_multi: bool):
+        """只快取全部片段都成功的合併結果
+
+        有片段失敗（例如限流、逾時）時不快取整段輸入，重送時才會重試失敗的片段；
+        成功的片段已在 parse_many 中各自快取，不會重複呼叫 LLM。
+        """
+        if not result.get("failed_segments"):
+            self.parse_cache.put(user_input, result, force_multi)
 
     def _has_multiple_events(self, text: str) -> bool:
-        """判斷輸入是否可能包含多個事件"""
-        # 檢查多事件關鍵字
-        keywords = [
-            # 序列詞
-            "然後", "接著", "之後", "另外", "還有", "以及", "再來", "隨後",
-            "第一", "第二", "第三", "首先", "其次", "最後", 
-            # 時間詞
-            "早上", "上午", "中午", "下午", "晚上", "傍晚", "深夜",
-            "9點", "10點", "11點", "12點", "13點", "14點", "15點", "16點", "17點", "18點", "19點", "20點",
-            # 分隔符
-            "，", "、", "；", " ", "  ", "\n"
-        ]
-        
-        # 檢查關鍵字
-        for keyword in keywords:
-            if keyword in text:
-                return True
-        
-        # 檢查是否有多個時間段
-        time_patterns = [
-            r'\d{1,2}[:：]\d{2}',  # 12:30
-            r'\d{1,2}點\d{1,2}分',  # 12點30分
-            r'\d{1,2}點',           # 12點
-        ]
-        
-        total_times = 0
-        for pattern in time_patterns:
-            matches = re.findall(pattern, text)
-            total_times += len(matches)
-            
-            if total_times >= 2:  # 如果有兩個或更多時間點，可能是多事件
-                return True
-        
-        return False
+        """判斷輸入是否可能包含多個事件（單次掃描評分）"""
+        return self.event_classifier.is_multi(text)
 
     # =========================
     # 4️⃣ 輸出驗證
@@ -230,6 +467,22 @@ class CalendarAssistant:
     
     def process_multiple_events(self, user_input: str, force_multi: bool = False) -> dict:
         """處理多事件輸入並返回詳細結果"""
+        cached = self.parse_cache.get(user_input, force_multi)
+        if cached is not None:
+            return cached
+        
+        rule_result = self._rule_result(user_input, force_multi)
+        if rule_result is not None:
+            self.parse_cache.put(user_input, rule_result, force_multi)
+            return rule_result
+        
+        segments = split_schedule(user_input)
+        if len(segments) >= BULK_MIN_SEGMENTS:
+            # 長篇貼上：拆成片段平行解析
+            result = self._merge_many_results(segments, self.parse_many(segments))
+            self._cache_bulk_result(user_input, result, force_multi)
+            return result
+        
         try:
             if force_multi or self._has_multiple_events(user_input):
                 # 解析多事件
@@ -237,33 +490,89 @@ class CalendarAssistant:
                 mode = "multi"
             else:
                 # 解析單一事件
-                event = self.parse_input(user_input)
+                event = self.parse_input(user_input, use_rules=False)
                 events = [event]
                 mode = "single"
             
-            result = {
-                "success": True,
-                "mode": mode,
-                "count": len(events),
-                "events": [],
-                "summary": f"成功解析 {len(events)} 個事件 ({mode}模式)"
-            }
+            result = self._build_result(events, mode)
+            self.parse_cache.put(user_input, result, force_multi)
+            return result
             
-            for i, event in enumerate(events, 1):
-                event_dict = event.dict()
-                event_dict["index"] = i
-                event_dict["time_range"] = f"{event.start} - {event.end}"
-                result["events"].append(event_dict)
+        except Exception as e:
+            return self._build_error_result(e)
+    
+    async def aprocess_multiple_events(self, user_input: str, force_multi: bool = False,
+                                       tenant=None) -> dict:
+        """非同步處理多事件輸入並返回詳細結果"""
+        cached = self.parse_cache.get(user_input, force_multi)
+        if cached is not None:
+            return cached
+        
+        rule_result = self._rule_result(user_input, force_multi)
+        if rule_result is not None:
+            self.parse_cache.put(user_input, rule_result, force_multi)
+            return rule_result
+        
+        segments = split_schedule(user_input)
+        if len(segments) >= BULK_MIN_SEGMENTS:
+            results = await self.aparse_many(segments, tenant=tenant)
+            result = self._merge_many_results(segments, results)
+            self._cache_bulk_result(user_input, result, force_multi)
+            return result
+        
+        try:
+            if force_multi or self._has_multiple_events(user_input):
+                events = await self.aparse_multiple_input(user_input, tenant)
+                mode = "multi"
+            else:
+                event = await self.aparse_input(user_input, tenant, use_rules=False)
+                events = [event]
+                mode = "single"
             
+            result = self._build_result(events, mode)
+            self.parse_cache.put(user_input, result, force_multi)
             return result
             
         except Exception as e:
-            return {
-                "success": False,
-                "error": str(e),
-                "count": 0,
-                "events": []
-            }
+            return self._build_error_result(e)
+    
+    def _rule_result(self, user_input: str, force_multi: bool) -> Optional[dict]:
+        """規則解析成功時直接組合結果（不呼叫 LLM）"""
+        events = self._try_rule_parse(user_input)
+        if not events:
+            return None
+        
+        mode = "multi" if force_multi or len(events) > 1 else "single"
+        return self._build_result(events, mode, source="rule")
+    
+    def _build_result(self, events: List[CalendarEvent], mode: str, source: str = "llm") -> dict:
+        """組合解析結果"""
+        source_text = {"rule": "，規則解析", "bulk": "，分段批次解析"}.get(source, "")
+        result = {
+            "success": True,
+            "mode": mode,
+            "source": source,
+            "count": len(events),
+            "events": [],
+            "summary": f"成功解析 {len(events)} 個事件 ({mode}模式{source_text})"
+        }
+        
+        for i, event in enumerate(events, 1):
+            event_dict = event.dict()
+            event_dict["index"] = i
+            event_dict["time_range"] = f"{event.start} - {event.end}"
+            result["events"].append(event_dict)
+        
+        return result
+    
+    def _build_error_result(self, error: Exception) -> dict:
+        """組合解析失敗結果"""
+        return {
+            "success": False,
+            "error": str(error),
+            "count": 0,
+            "events": []
+        }
 
 
 # =========================
@@ -0,0 +1,122 @@
+"""日曆解析提示詞基準測試
+
+比較三種提示詞組合方式：
+- legacy：原本的做法（保留縮排、每次呼叫重新產生 format_instructions）
+- json：預先固定格式說明並去除縮排（JSON 模式）
+- tool：schema 經由工具定義傳遞，提示詞不含格式說明
+
+離線報告提示詞大小與組合耗時；設定 GROQ_API_KEY 並加上 --live 時，
+會實際呼叫模型，報告 API 回傳的 prompt tokens 與延遲。
+
+執行方式：python benchmarks/bench_prompts.py [--live] [--samples N]
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.output_parsers import PydanticOutputParser  # noqa: E402
+from langchain_core.prompts import ChatPromptTemplate  # noqa: E402
+
+from Langchain_Calendar import (  # noqa: E402
+    MULTI_SYSTEM_TEMPLATE, OUTPUT_MODE_JSON, OUTPUT_MODE_TOOL,
+    CalendarAssistant, CalendarEventList, MultipleCalendarEvents
+)
+from llm_scheduler import estimate_tokens  # noqa: E402
+
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "routing_corpus.jsonl")
+
+
+def load_texts(limit: int):
+    with open(CORPUS_PATH, "r", encoding="utf-8") as f:
+        return [json.loads(line)["text"] for line in f if line.strip()][:limit]
+
+
+def legacy_messages(inputs: dict):
+    """原本的組合方式：每次呼叫重建格式說明"""
+    parser = PydanticOutputParser(pydantic_object=MultipleCalendarEvents)
+    prompt = ChatPromptTemplate.from_messages([
+        ("system", MULTI_SYSTEM_TEMPLATE),
+        ("human", "{user_input}")
+    ])
+    return prompt.invoke({**inputs, "format_instructions": parser.get_format_instructions()})
+
+
+def prompt_text(prompt_value) -> str:
+    return "".join(message.content for message in prompt_value.to_messages())
+
+
+def time_per_call(func, repeat: int = 200) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - started) / repeat
+
+
+def offline_report(assistants, inputs):
+    tool_schema = json.dumps(CalendarEventList.model_json_schema(), ensure_ascii=False)
+
+    rows = [("legacy", prompt_text(legacy_messages(inputs)), "", lambda: legacy_messages(inputs))]
+    for mode, assistant in assistants.items():
+        extra = tool_schema if mode == OUTPUT_MODE_TOOL else ""
+        rows.append((mode, prompt_text(assistant.multi_prompt.invoke(inputs)), extra,
+                     lambda a=assistant: a.multi_prompt.invoke(inputs)))
+
+    print("📏 多事件提示詞大小（離線估算）")
+    for name, text, extra, build in rows:
+        total = estimate_tokens(text) + estimate_tokens(extra)
+        print(f"  {name:<7} 提示詞 {len(text):>5} 字  工具 schema {len(extra):>4} 字  "
+              f"≈{total:>5} tokens  組合耗時 {time_per_call(build) * 1e6:>7.1f} µs")
+
+
+def live_report(assistants, texts):
+    print(f"\n⏱️ 實際呼叫（{len(texts)} 筆）")
+    for name in ("legacy", OUTPUT_MODE_JSON, OUTPUT_MODE_TOOL):
+        assistant = assistants.get(name, assistants[OUTPUT_MODE_JSON])
+        llm = assistant.tool_llm if name == OUTPUT_MODE_TOOL else assistant.json_llm
+        prompt_tokens, latencies = [], []
+
+        for text in texts:
+            inputs = assistant._build_inputs(text)
+            if name == "legacy":
+                messages = legacy_messages(inputs)
+            else:
+                messages = assistant.multi_prompt.invoke(inputs)
+            started = time.perf_counter()
+            response = llm.invoke(messages)
+            latencies.append(time.perf_counter() - started)
+            prompt_tokens.append((response.usage_metadata or {}).get("input_tokens", 0))
+
+        print(f"  {name:<7} prompt tokens 平均 {statistics.mean(prompt_tokens):>6.0f}  "
+              f"延遲中位數 {statistics.median(latencies) * 1000:>6.0f} ms  "
+              f"最大 {max(latencies) * 1000:>6.0f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--live", action="store_true", help="實際呼叫模型")
+    parser.add_argument("--samples", type=int, default=5)
+    args = parser.parse_args()
+
+    api_key = os.getenv("GROQ_API_KEY", "")
+    assistants = {
+        mode: CalendarAssistant(api_key or "offline", output_mode=mode)
+        for mode in (OUTPUT_MODE_JSON, OUTPUT_MODE_TOOL)
+    }
+
+    texts = load_texts(args.samples)
+    offline_report(assistants, assistants[OUTPUT_MODE_JSON]._build_inputs(texts[0]))
+
+    if args.live:
+        if not api_key:
+            print("\n⚠️ 未設定 GROQ_API_KEY，略過實際呼叫")
+            return
+        live_report(assistants, texts)
+
+
+if __name__ == "__main__":
+    main()
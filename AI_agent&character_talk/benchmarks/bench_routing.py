@@ -0,0 +1,122 @@
+"""單事件 / 多事件路由基準測試
+
+用標記好的語料比較舊版關鍵字判斷與新版掃描評分：
+- 路由準確率（混淆矩陣）
+- 走多事件鏈的比例
+- 每個請求平均的 LLM 呼叫次數（規則解析可處理的請求不需呼叫 LLM）
+- 每次判斷耗時
+
+執行方式：python benchmarks/bench_routing.py
+"""
+import json
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chinese_time_parser import ChineseScheduleParser  # noqa: E402
+from event_router import MultiEventClassifier  # noqa: E402
+
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "routing_corpus.jsonl")
+RULE_CONFIDENCE_THRESHOLD = 0.7
+
+
+def legacy_has_multiple_events(text: str) -> bool:
+    """舊版判斷（保留作為對照組）"""
+    keywords = [
+        "然後", "接著", "之後", "另外", "還有", "以及", "再來", "隨後",
+        "第一", "第二", "第三", "首先", "其次", "最後",
+        "早上", "上午", "中午", "下午", "晚上", "傍晚", "深夜",
+        "9點", "10點", "11點", "12點", "13點", "14點", "15點", "16點", "17點", "18點", "19點", "20點",
+        "，", "、", "；", " ", "  ", "\n"
+    ]
+    for keyword in keywords:
+        if keyword in text:
+            return True
+
+    total_times = 0
+    for pattern in [r'\d{1,2}[:：]\d{2}', r'\d{1,2}點\d{1,2}分', r'\d{1,2}點']:
+        total_times += len(re.findall(pattern, text))
+        if total_times >= 2:
+            return True
+    return False
+
+
+def load_corpus(path: str = CORPUS_PATH):
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def evaluate(name, router, corpus, rule_parser=None):
+    """評估單一路由方式"""
+    confusion = {"tp": 0, "fp": 0, "tn": 0, "fn": 0}
+    llm_calls = 0
+    multi_routes = 0
+    rule_hits = 0
+    lost_events = 0
+
+    for sample in corpus:
+        text = sample["text"]
+        expected_multi = sample["events"] > 1
+
+        # 規則解析有把握（且事件數正確）→ 不需要 LLM，也不需要路由
+        if rule_parser is not None:
+            result = rule_parser.parse(text)
+            if result.events and result.confidence >= RULE_CONFIDENCE_THRESHOLD:
+                rule_hits += 1
+                if len(result.events) != sample["events"]:
+                    lost_events += abs(sample["events"] - len(result.events))
+                continue
+
+        predicted_multi = router(text)
+        llm_calls += 1
+        multi_routes += predicted_multi
+
+        if predicted_multi and expected_multi:
+            confusion["tp"] += 1
+        elif predicted_multi:
+            confusion["fp"] += 1
+        elif expected_multi:
+            confusion["fn"] += 1
+            # 多事件被送進單事件鏈，只會拿到一個事件
+            lost_events += sample["events"] - 1
+        else:
+            confusion["tn"] += 1
+
+    # 路由準確率以全部語料計算（不經規則解析）
+    correct = sum(router(s["text"]) == (s["events"] > 1) for s in corpus)
+    seconds = timeit.timeit(lambda: [router(s["text"]) for s in corpus], number=200)
+
+    total = len(corpus)
+    routed = total - rule_hits
+    print(f"\n📊 {name}")
+    print(f"  路由準確率：{correct}/{total} ({correct / total:.1%})")
+    print(f"  混淆矩陣（經規則解析後剩餘 {routed} 筆）：{confusion}")
+    print(f"  規則解析直接處理：{rule_hits}/{total}")
+    print(f"  走多事件鏈比例：{multi_routes}/{routed or 1} ({multi_routes / (routed or 1):.1%})")
+    print(f"  平均 LLM 呼叫次數：{llm_calls / total:.2f} 次/請求")
+    print(f"  遺漏事件數：{lost_events}")
+    print(f"  判斷耗時：{seconds / (200 * total) * 1e6:.1f} µs/次")
+
+
+def main():
+    corpus = load_corpus()
+    classifier = MultiEventClassifier()
+    rule_parser = ChineseScheduleParser("Asia/Taipei")
+
+    print(f"語料：{len(corpus)} 筆（多事件 {sum(s['events'] > 1 for s in corpus)} 筆）")
+    evaluate("舊版關鍵字判斷", legacy_has_multiple_events, corpus)
+    evaluate("掃描評分", classifier.is_multi, corpus)
+    evaluate("規則解析 + 掃描評分", classifier.is_multi, corpus, rule_parser)
+
+    misrouted = [s["text"] for s in corpus if classifier.is_multi(s["text"]) != (s["events"] > 1)]
+    if misrouted:
+        print("\n⚠️ 掃描評分判斷錯誤：")
+        for text in misrouted:
+            print(f"  - {text!r}: {classifier.scan(text)}")
+
+
+if __name__ == "__main__":
+    main()
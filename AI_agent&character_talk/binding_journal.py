@@ -0,0 +1,193 @@
+import json
+import os
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+from content_manifest import atomic_write_text
+
+# 累積多少筆變更後壓縮成快照
+COMPACT_EVERY = 500
+
+# 佇列中的工作種類
+_APPEND = "append"
+_SNAPSHOT = "snapshot"
+
+
+class BindingJournal:
+    """角色綁定與背景故事的持久化：append-only JSONL 日誌 + 快照
+
+    - 每次變更寫一行 {"seq": n, "op": ...}，flush 並 fsync
+    - 累積 compact_every 筆後，以 snapshot() 的結果原子寫入快照並清空日誌
+    - append()/compact() 只排入佇列就回傳，寫檔與 fsync 在背景執行緒進行（不阻塞事件迴圈）
+    - 啟動時讀取快照，只重播 seq 大於快照的日誌；最後一行若寫到一半（當機）則捨棄，
+      中間無法解析的行只略過並警告
+    因此重播的筆數不會超過 compact_every，復原時間與執行多久無關。
+    """
+
+    def __init__(self, directory: str = "custom/state", compact_every: int = COMPACT_EVERY):
+        self.directory = directory
+        self.compact_every = max(1, compact_every)
+        self.snapshot_path = os.path.join(directory, "bindings_snapshot.json")
+        self.journal_path = os.path.join(directory, "bindings_journal.jsonl")
+        # 回傳目前完整狀態的函式（由 VirtualSandboxSociety 設定）
+        self.snapshot: Optional[Callable[[], Dict]] = None
+
+        self.seq = 0
+        self._pending = 0  # 快照之後的日誌筆數
+        self._file = None
+
+        self._queue: List[Tuple[str, object]] = []
+        self._cond = threading.Condition()
+        self._busy = False
+        self._closed = False
+        self._thread: Optional[threading.Thread] = None
+
+    # --------------------------
+    # 啟動
+    # --------------------------
+    def load(self) -> Tuple[Dict, List[Dict]]:
+        """讀取快照與其後的變更，回傳 (快照狀態, 待重播的變更)，並開啟日誌供寫入"""
+        os.makedirs(self.directory, exist_ok=True)
+
+        state, snapshot_seq = {}, 0
+        try:
+            with open(self.snapshot_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            state, snapshot_seq = data.get("state", {}), data.get("seq", 0)
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            print(f"⚠️ 無法讀取綁定快照，只重播日誌: {e}")
+
+        ops = []
+        self.seq = snapshot_seq
+        try:
+            with open(self.journal_path, "rb") as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            lines = []
+
+        torn = False
+        for index, raw in enumerate(lines):
+            try:
+                record = json.loads(raw)
+                seq, op = record["seq"], record["op"]
+            except (ValueError, KeyError, TypeError):
+                if index == len(lines) - 1:
+                    # 寫到一半的最後一行（當機）→ 截斷，之後的寫入從這裡接續
+                    print("⚠️ 綁定日誌結尾不完整，已捨棄最後一筆")
+                    torn = True
+                else:
+                    print(f"⚠️ 綁定日誌第 {index + 1} 行無法解析，已略過")
+                continue
+            if seq > snapshot_seq:
+                ops.append(op)
+                self.seq = seq
+
+        self._file = open(self.journal_path, "ab")
+        if torn:
+            self._file.truncate(sum(len(raw) for raw in lines[:-1]))
+        elif lines and not lines[-1].endswith(b"\n"):
+            # 最後一行完整但缺少換行 → 補上，下一筆才不會接在同一行
+            self._file.write(b"\n")
+        self._pending = len(ops)
+
+        self._thread = threading.Thread(target=self._run, name="binding-journal", daemon=True)
+        self._thread.start()
+        return state, ops
+
+    # --------------------------
+    # 寫入（呼叫端只排入佇列，檔案 I/O 在背景執行緒）
+    # --------------------------
+    def append(self, op: Dict):
+        """排入一筆變更（呼叫前變更已套用到記憶體）"""
+        if self._file is None:
+            return
+        self.seq += 1
+        line = json.dumps({"seq": self.seq, "op": op}, ensure_ascii=False) + "\n"
+        self._enqueue(_APPEND, line.encode("utf-8"))
+
+        self._pending += 1
+        if self._pending >= self.compact_every:
+            self.compact()
+
+    def compact(self):
+        """排入一次快照：寫入目前狀態並清空日誌
+
+        狀態在呼叫端序列化，與當下的 seq 一致；背景執行緒依佇列順序先寫完之前的變更，
+        再寫快照（帶 seq）並截斷日誌。兩步之間當機時，重播會略過 seq 已包含在快照中的變更。
+        """
+        if self._file is None or self.snapshot is None:
+            return
+        text = json.dumps({"seq": self.seq, "state": self.snapshot()}, ensure_ascii=False, indent=2)
+        self._enqueue(_SNAPSHOT, text)
+        self._pending = 0
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """等待佇列寫完（阻塞），回傳是否在時限內完成"""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._queue and not self._busy, timeout)
+
+    def close(self, timeout: Optional[float] = 10):
+        """寫完佇列並關閉日誌"""
+        if self._thread is not None:
+            with self._cond:
+                self._closed = True
+                self._cond.notify_all()
+            self._thread.join(timeout)
+            self._thread = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _enqueue(self, kind: str, payload):
+        with self._cond:
+            self._queue.append((kind, payload))
+            self._cond.notify_all()
+
+    # --------------------------
+    # 背景執行緒
+    # --------------------------
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._queue or self._closed)
+                if not self._queue:
+                    return
+                batch, self._queue = self._queue, []
+                self._busy = True
+
+            try:
+                self._write_batch(batch)
+            finally:
+                with self._cond:
+                    self._busy = False
+                    self._cond.notify_all()
+
+    def _write_batch(self, batch: List[Tuple[str, object]]):
+        """依序寫出；連續的變更只 fsync 一次"""
+        lines = []
+        for kind, payload in batch:
+            if kind == _APPEND:
+                lines.append(payload)
+                continue
+            self._write_lines(lines)
+            lines = []
+            try:
+                atomic_write_text(self.snapshot_path, payload)
+                self._file.truncate(0)
+                self._file.flush()
+                os.fsync(self._file.fileno())
+            except OSError as e:
+                print(f"⚠️ 綁定快照寫入失敗，繼續使用日誌: {e}")
+        self._write_lines(lines)
+
+    def _write_lines(self, lines: List[bytes]):
+        if not lines:
+            return
+        try:
+            self._file.write(b"".join(lines))
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        except OSError as e:
+            print(f"⚠️ 綁定日誌寫入失敗: {e}")
@@ -6,18 +6,81 @@ import os
 import datetime as dt
 from dotenv import load_dotenv
 from calendar_service import CalendarService
+from calendar_import import CalendarImporter, iter_csv_rows, iter_ics_rows
+from chinese_time_parser import parse_duration
 from Langchain_Calendar import CalendarAssistant
 from character_system import VirtualSandboxSociety, CharacterTrait, SceneSetting
 from groq import Groq
 import asyncio
+import codecs
+import aiohttp
 from discord_bot_langchain import bot
 
 load_dotenv()
 
+# 解析結果 embed 最多列出的事件數
+MAX_EMBED_EVENTS = 20
+# !free 最多列出的空檔數
+MAX_FREE_SLOTS = 10
+
 # ============================
 # 日曆功能命令
 # ============================
 
+def _refresh_mirror(created_specs=None):
+    """建立事件後要求本地鏡像立即同步，並把新事件加入衝突索引"""
+    if bot.calendar_mirror:
+        bot.calendar_mirror.request_sync()
+    if bot.conflict_checker and created_specs:
+        bot.conflict_checker.record(created_specs)
+
+async def _check_conflicts(events_data):
+    """衝突檢查（失敗時視為沒有衝突，不影響新增事件）"""
+    if not bot.conflict_checker:
+        return [[] for _ in events_data]
+    try:
+        return await bot.conflict_checker.check(events_data)
+    except Exception as e:
+        print(f"⚠️ 衝突檢查失敗: {e}")
+        return [[] for _ in events_data]
+
+def _format_conflicts(conflicts):
+    """衝突說明文字"""
+    lines = []
+    for conflict in conflicts[:3]:
+        source = "同批" if conflict["source"] == "batch" else "既有"
+        lines.append(f"⚠️ 與{source}「{conflict['title']}」重疊 ({conflict['start']}-{conflict['end']})")
+    if len(conflicts) > 3:
+        lines.append(f"⚠️ ...還有 {len(conflicts) - 3} 個重疊")
+    return "\n".join(lines)
+
+def _add_event_fields(embed, events_data, conflicts):
+    """列出事件與衝突（embed 最多 25 個欄位）"""
+    for i, (event, event_conflicts) in enumerate(zip(events_data[:MAX_EMBED_EVENTS], conflicts), 1):
+        value = f"日期: {event['date']}\n時間: {event['time_range']}"
+        if event_conflicts:
+            value += "\n" + _format_conflicts(event_conflicts)
+        embed.add_field(
+            name=f"事件 {i}: {event['title']}",
+            value=value,
+            inline=False
+        )
+    
+    if len(events_data) > MAX_EMBED_EVENTS:
+        embed.add_field(
+            name="…",
+            value=f"還有 {len(events_data) - MAX_EMBED_EVENTS} 個事件未顯示",
+            inline=False
+        )
+    
+    conflict_count = sum(1 for event_conflicts in conflicts if event_conflicts)
+    if conflict_count:
+        embed.add_field(
+            name="⚠️ 時間衝突",
+            value=f"{conflict_count} 個事件與其他行程重疊，確認後仍會建立",
+            inline=False
+        )
+
 @bot.command(name="add")
 async def add_event(ctx, *, description):
     """添加日曆事件 - LangChain 版本（支援多事件）"""
@@ -30,30 +93,36 @@ async def add_event(ctx, *, description):
         # 使用 LangChain 解析輸入
         await ctx.send("🤖 正在使用 LangChain 解析您的描述...")
         
-        # 使用 process_multiple_events 方法
-        result = bot.calendar_assistant.process_multiple_events(description)
+        # 使用 aprocess_multiple_events 方法（非同步，不阻塞其他指令）
+        result = await bot.calendar_assistant.aprocess_multiple_events(
+            description,
+            tenant=(ctx.guild.id if ctx.guild else None, ctx.author.id)
+        )
         
         if not result["success"]:
             await ctx.send(f"❌ LangChain 解析錯誤: {result.get('error', '未知錯誤')}")
             return
         
         events_data = result["events"]
+        conflicts = await _check_conflicts(events_data)
         
-        if result["mode"] == "multi" and len(events_data) > 1:
-            # 多事件處理
+        if (result["mode"] == "multi" and len(events_data) > 1) or any(conflicts):
+            # 多事件或有衝突 → 先確認
             embed = discord.Embed(
-                title="🤖 LangChain 多事件解析結果",
+                title="🤖 LangChain 多事件解析結果" if len(events_data) > 1 else "⚠️ 事件時間衝突",
                 description=f"偵測到 **{len(events_data)}** 個事件",
-                color=discord.Color.blue()
+                color=discord.Color.orange() if any(conflicts) else discord.Color.blue()
             )
             
-            # 顯示所有事件
-            for i, event in enumerate(events_data, 1):
-                embed.add_field(
-                    name=f"事件 {i}: {event['title']}",
-                    value=f"日期: {event['date']}\n時間: {event['time_range']}",
-                    inline=False
-                )
+            _add_event_fields(embed, events_data, conflicts)
+            
+            # 分段批次解析時，列出無法解析的片段
+            failed_segments = result.get("failed_segments", [])
+            if failed_segments:
+                failed_text = "\n".join(f"• {item['text'][:50]}" for item in failed_segments[:3])
+                if len(failed_segments) > 3:
+                    failed_text += f"\n...還有 {len(failed_segments) - 3} 個片段"
+                embed.add_field(name="⚠️ 無法解析的片段", value=failed_text, inline=False)
             
             embed.set_footer(text="輸入 '!confirm' 建立所有事件，或 '!cancel' 取消")
             await ctx.send(embed=embed)
@@ -78,7 +147,8 @@ async def add_event(ctx, *, description):
             
             # 創建日曆事件
             try:
-                event = bot.calendar_service.create_event(bot.calendar_id, spec)
+                event = await bot.calendar_service.acreate_event(bot.calendar_id, spec)
+                _refresh_mirror([spec])
                 
                 embed = discord.Embed(
                     title="✅ 事件已添加 (LangChain 解析)",
@@ -109,27 +179,28 @@ async def add_multi_event(ctx, *, description):
     try:
         await ctx.send("🤖 正在使用 LangChain 多事件強制解析模式...")
         
-        # 使用 process_multiple_events 並強制多事件模式
-        result = bot.calendar_assistant.process_multiple_events(description, force_multi=True)
+        # 使用 aprocess_multiple_events 並強制多事件模式
+        result = await bot.calendar_assistant.aprocess_multiple_events(
+            description,
+            force_multi=True,
+            tenant=(ctx.guild.id if ctx.guild else None, ctx.author.id)
+        )
         
         if not result["success"]:
             await ctx.send(f"❌ LangChain 多事件解析錯誤: {result.get('error', '未知錯誤')}")
             return
         
         events_data = result["events"]
+        # 同批事件彼此之間也會檢查
+        conflicts = await _check_conflicts(events_data)
         
         embed = discord.Embed(
             title="🤖 LangChain 強制多事件解析結果",
             description=f"強制多事件模式偵測到 **{len(events_data)}** 個事件",
-            color=discord.Color.purple()
+            color=discord.Color.orange() if any(conflicts) else discord.Color.purple()
         )
         
-        for i, event in enumerate(events_data, 1):
-            embed.add_field(
-                name=f"事件 {i}: {event['title']}",
-                value=f"日期: {event['date']}\n時間: {event['time_range']}",
-                inline=False
-            )
+        _add_event_fields(embed, events_data, conflicts)
         
         embed.set_footer(text="輸入 '!confirm' 建立所有事件，或 '!cancel' 取消")
         await ctx.send(embed=embed)
@@ -162,31 +233,27 @@ async def confirm_events(ctx):
     try:
         await ctx.send("🔄 正在建立事件到 Google Calendar...")
         
-        success_count = 0
-        failed_events = []
-        created_events = []
+        specs = [
+            {
+                "title": event["title"],
+                "date": event["date"],
+                "start": event["start"],
+                "end": event["end"]
+            }
+            for event in events_data
+        ]
         
-        for event in events_data:
-            try:
-                spec = {
-                    "title": event["title"],
-                    "date": event["date"],
-                    "start": event["start"],
-                    "end": event["end"]
-                }
-                
-                calendar_event = bot.calendar_service.create_event(bot.calendar_id, spec)
-                success_count += 1
-                created_events.append({
-                    "title": event["title"],
-                    "link": calendar_event['htmlLink']
-                })
-                
-            except Exception as e:
-                failed_events.append({
-                    "title": event["title"],
-                    "error": str(e)[:100]
-                })
+        # 一次批次請求建立所有事件
+        results = await bot.calendar_service.acreate_events_batch(bot.calendar_id, specs)
+        _refresh_mirror([spec for spec, r in zip(specs, results) if r["success"]])
+        
+        created_events = [
+            {"title": r["title"], "link": r["link"]} for r in results if r["success"]
+        ]
+        failed_events = [
+            {"title": r["title"], "error": r["error"]} for r in results if not r["success"]
+        ]
+        success_count = len(created_events)
         
         # 清除用戶狀態
         del bot.user_states[user_id]
@@ -253,7 +320,11 @@ async def list_events(ctx, count: int = 5):
         return
     
     try:
-        events = bot.calendar_service.list_events(bot.calendar_id, count)
+        if bot.calendar_mirror and bot.calendar_mirror.ready:
+            # 本地鏡像（不需要 API 往返）
+            events = await bot.calendar_mirror.aupcoming(count)
+        else:
+            events = await bot.calendar_service.alist_events(bot.calendar_id, count)
         
         if not events:
             embed = discord.Embed(
@@ -293,6 +364,151 @@ async def list_events(ctx, count: int = 5):
     except Exception as e:
         await ctx.send(f"❌ 錯誤: {str(e)}")
 
+async def _stream_attachment_lines(attachment):
+    """逐行下載附件（不把整個檔案讀進記憶體）"""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    async with aiohttp.ClientSession() as session:
+        async with session.get(attachment.url) as response:
+            response.raise_for_status()
+            async for line in response.content:
+                yield decoder.decode(line)
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+def _build_import_embed(filename, stats):
+    """匯入進度 embed"""
+    if stats.done:
+        title = "✅ 匯入完成"
+        color = discord.Color.green() if not stats.failed and not stats.invalid else discord.Color.orange()
+    else:
+        title = "📥 匯入中..."
+        color = discord.Color.blue()
+    
+    embed = discord.Embed(title=title, description=f"檔案：`{filename}`", color=color)
+    embed.add_field(
+        name="📊 進度",
+        value=f"已讀取: {stats.rows} 筆\n"
+              f"✅ 已建立: {stats.created} 個\n"
+              f"❌ 建立失敗: {stats.failed} 個\n"
+              f"⚠️ 無法匯入: {stats.invalid} 筆",
+        inline=True
+    )
+    embed.add_field(
+        name="🧭 解析方式",
+        value=f"欄位完整: {stats.structured}\n"
+              f"規則解析: {stats.rule_parsed}\n"
+              f"LLM 解析: {stats.llm_parsed}",
+        inline=True
+    )
+    if stats.errors:
+        embed.add_field(name="錯誤明細", value="\n".join(stats.errors[:5])[:1000], inline=False)
+    return embed
+
+@bot.command(name="import")
+async def import_events(ctx):
+    """匯入附件中的事件（.ics 或 .csv）
+    
+    CSV 表頭可用：標題/title、日期/date、開始/start、結束/end，
+    欄位不完整的列會以整列文字交給解析器。
+    """
+    if not bot.calendar_service:
+        await ctx.send("❌ 日曆服務不可用")
+        return
+    
+    attachment = next(
+        (a for a in ctx.message.attachments if a.filename.lower().endswith((".ics", ".csv"))),
+        None
+    )
+    if attachment is None:
+        await ctx.send("⚠️ 請在指令訊息中附上 .ics 或 .csv 檔案")
+        return
+    
+    stats_message = None
+    
+    async def update_progress(stats):
+        await stats_message.edit(embed=_build_import_embed(attachment.filename, stats))
+    
+    try:
+        importer = CalendarImporter(
+            bot.calendar_service,
+            bot.calendar_assistant,
+            bot.calendar_id,
+            progress=update_progress,
+            tenant=(ctx.guild.id if ctx.guild else None, ctx.author.id)
+        )
+        stats_message = await ctx.send(embed=_build_import_embed(attachment.filename, importer.stats))
+        
+        lines = _stream_attachment_lines(attachment)
+        if attachment.filename.lower().endswith(".ics"):
+            rows = iter_ics_rows(lines, bot.calendar_service.timezone)
+        else:
+            rows = iter_csv_rows(lines)
+        
+        await importer.run(rows)
+        _refresh_mirror()
+        
+    except Exception as e:
+        await ctx.send(f"❌ 匯入失敗: {str(e)}")
+
+def _format_duration(minutes):
+    hours, minutes = divmod(int(minutes), 60)
+    if hours and minutes:
+        return f"{hours} 小時 {minutes} 分"
+    return f"{hours} 小時" if hours else f"{minutes} 分"
+
+@bot.command(name="free")
+async def free_slots(ctx, *, description: str = "今天"):
+    """查詢空閒時段
+    
+    範例：
+    !free 明天下午 一小時
+    !free 週五 14:00-18:00 30分鐘
+    """
+    if not bot.calendar_service:
+        await ctx.send("❌ 日曆服務不可用")
+        return
+    
+    try:
+        duration, range_text = parse_duration(description)
+        duration = duration or 60
+        time_min, time_max = bot.calendar_assistant.rule_parser.parse_range(range_text)
+        
+        if time_max - time_min < dt.timedelta(minutes=duration):
+            await ctx.send("⚠️ 查詢的時段已經過去，或比需要的長度還短")
+            return
+        
+        # 一次 freebusy 查詢（可涵蓋多個日曆）
+        slots = await bot.calendar_service.afind_free_slots(
+            (time_min, time_max), duration, bot.freebusy_calendars
+        )
+        
+        embed = discord.Embed(
+            title="🕒 空閒時段",
+            description=f"{time_min.strftime('%m/%d %H:%M')} - {time_max.strftime('%H:%M')}，"
+                        f"需要 {_format_duration(duration)}",
+            color=discord.Color.green() if slots else discord.Color.red()
+        )
+        
+        if not slots:
+            embed.add_field(name="😢 沒有空檔", value="這個時段都已經有行程了", inline=False)
+        
+        for i, (start, end) in enumerate(slots[:MAX_FREE_SLOTS], 1):
+            embed.add_field(
+                name=f"{i}. {start.strftime('%m/%d %H:%M')} - {end.strftime('%H:%M')}",
+                value=f"可用 {_format_duration((end - start).total_seconds() // 60)}",
+                inline=False
+            )
+        
+        if len(slots) > MAX_FREE_SLOTS:
+            embed.set_footer(text=f"...還有 {len(slots) - MAX_FREE_SLOTS} 個空檔")
+        
+        await ctx.send(embed=embed)
+        
+    except Exception as e:
+        await ctx.send(f"❌ 查詢空閒時段失敗: {str(e)}")
+
+
 # # ============================
 # # 虛擬沙盒命令
 # # ============================
@@ -31,6 +31,8 @@ async def help_command(ctx):
         value="""```
 !add [描述] - 添加事件
 !events [數量] - 列出事件
+!free [時段] - 查詢空閒時段
+!import - 匯入附件 (.ics/.csv)
 !confirm - 確認建立事件
 !cancel - 取消事件```""",
         inline=True
@@ -51,7 +53,7 @@ async def help_command(ctx):
     
     embed.add_field(
         name="🛠️ 系統指令",
-        value="```!ping - 測試連線\n!stop - 結束對話\n!custom - 儀表板\n!initialize - 初始化```",
+        value="```!ping - 測試連線\n!llmstats - LLM 排程統計\n!stop - 結束對話\n!custom - 儀表板\n!initialize - 初始化```",
         inline=True
     )
     await ctx.send(embed=embed)
@@ -62,6 +64,64 @@ async def ping(ctx):
     latency = round(bot.latency * 1000)
     await ctx.send(f"🏓 Pong! LangChain 系統延遲: {latency}ms")
 
+@bot.command(name="llmstats")
+async def llm_stats(ctx):
+    """顯示 LLM 排程器統計"""
+    metrics = bot.llm_scheduler.get_metrics()
+    
+    embed = discord.Embed(
+        title="📊 LLM 排程器統計",
+        color=discord.Color.blue()
+    )
+    
+    embed.add_field(
+        name="⚙️ 目前狀態",
+        value=f"執行中: {metrics['in_flight']}/{metrics['max_concurrency']}\n"
+              f"排隊中: {metrics['queue_depth']}\n"
+              f"剩餘請求額度: {metrics['requests_available']}\n"
+              f"剩餘 token 額度: {metrics['tokens_available']}",
+        inline=False
+    )
+    
+    for name, stats in metrics["priorities"].items():
+        embed.add_field(
+            name=f"🔹 {name}",
+            value=f"排隊: {stats['queue_depth']}\n"
+                  f"已處理: {stats['served']}\n"
+                  f"平均等待: {stats['avg_wait_ms']}ms\n"
+                  f"最長等待: {stats['max_wait_ms']}ms",
+            inline=True
+        )
+    
+    cache_stats = bot.calendar_assistant.parse_cache.get_stats()
+    embed.add_field(
+        name="📦 日曆解析快取",
+        value=f"命中: {cache_stats['hits']}\n"
+              f"未命中: {cache_stats['misses']}\n"
+              f"命中率: {cache_stats['hit_rate']:.0%}\n"
+              f"項目: {cache_stats['size']}/{cache_stats['max_size']}",
+        inline=False
+    )
+    
+    rule_stats = bot.calendar_assistant.rule_stats
+    embed.add_field(
+        name="⚡ 規則解析快速通道",
+        value=f"直接解析: {rule_stats['hits']}\n"
+              f"交給 LLM: {rule_stats['fallbacks']}",
+        inline=False
+    )
+    
+    repair_stats = bot.calendar_assistant.repair_stats
+    embed.add_field(
+        name="🩹 模型輸出修復",
+        value=f"直接可用: {repair_stats['clean']}\n"
+              f"本地修復: {repair_stats['repaired']}\n"
+              f"修復失敗: {repair_stats['failed']}",
+        inline=False
+    )
+    
+    await ctx.send(embed=embed)
+
 @bot.command(name="initialize")
 @commands.has_permissions(administrator=True)  # 僅管理員可使用
 async def initialize_system(ctx, reset_type: str = None):
@@ -8,8 +8,11 @@ from dotenv import load_dotenv
 from calendar_service import CalendarService
 from Langchain_Calendar import CalendarAssistant
 from character_system import VirtualSandboxSociety, CharacterTrait, SceneSetting
+from session_store import make_session_key
+from burst_coalescer import BurstCoalescer
 from groq import Groq
 import asyncio
+import contextlib
 from discord_bot_langchain import bot
 
 load_dotenv()
@@ -92,7 +95,7 @@ async def sandbox_command(ctx):
     view = View()
     
     # 預設角色按鈕
-    default_chars = {k: v for k, v in all_characters.items() if not k.startswith('custom_')}
+    default_chars = [k for k in all_characters if not k.startswith('custom_')]
     if default_chars:
         default_button = Button(
             label="📦 預設角色",
@@ -103,7 +106,7 @@ async def sandbox_command(ctx):
         view.add_item(default_button)
     
     # 自定義角色按鈕
-    custom_chars = {k: v for k, v in all_characters.items() if k.startswith('custom_')}
+    custom_chars = [k for k in all_characters if k.startswith('custom_')]
     if custom_chars:
         custom_button = Button(
             label="🎨 自定義角色",
@@ -123,7 +126,7 @@ async def sandbox_command(ctx):
         elif interaction.data.get('custom_id') == 'custom_chars':
             await show_role_selection(interaction, custom_chars, "🎨 自定義角色")
     
-    async def show_role_selection(interaction, characters_dict, category_name):
+    async def show_role_selection(interaction, role_keys, category_name):
         """顯示角色選擇"""
         embed = discord.Embed(
             title=f"🎭 {category_name}",
@@ -133,9 +136,9 @@ async def sandbox_command(ctx):
         
         view = View()
         
-        # 添加角色按鈕
-        for role_key, character in list(characters_dict.items())[:12]:  # 限制最多12個
-            button = RoleButton(role_key, character)
+        # 添加角色按鈕（只載入顯示的角色）
+        for role_key in role_keys[:12]:  # 限制最多12個
+            button = RoleButton(role_key, all_characters[role_key])
             view.add_item(button)
         
         await interaction.response.edit_message(embed=embed, view=view)
@@ -292,6 +295,81 @@ async def mode_command(ctx):
 # 訊息處理
 # ============================
 
+# 串流回覆設定（編輯間隔需符合 Discord 頻率限制）
+SANDBOX_STREAMING = os.getenv('SANDBOX_STREAMING', '1') == '1'
+SANDBOX_STREAM_EDIT_INTERVAL = float(os.getenv('SANDBOX_STREAM_EDIT_INTERVAL', '0.7'))
+
+async def respond_to_burst(session_key, messages):
+    """將同一對話短時間內的多則訊息合併為一輪回應"""
+    last_message = messages[-1]
+    user_id = last_message.author.id
+    
+    # 等待期間對話可能已結束或換了角色
+    conversation = bot.active_conversations.get(user_id)
+    if not conversation or conversation["role_key"] != session_key[3]:
+        return
+    
+    character = conversation["character"]
+    user_input = "\n".join(m.content for m in messages)
+    
+    try:
+        if SANDBOX_STREAMING:
+            response = await stream_reply(last_message.channel, character, conversation["role_key"],
+                                          user_input, session_key)
+        else:
+            # 使用增強的角色回應生成（非同步，不阻塞其他訊息）
+            response = await bot.virtual_society.agenerate_role_response(
+                conversation["role_key"], 
+                user_input,
+                session_key=session_key
+            )
+            await last_message.channel.send(f"**{character.name}** ({character.profession}): {response}")
+        
+        # 更新對話歷史（包含背景發展）
+        bot.virtual_society.update_conversation_with_background(
+            conversation["role_key"],
+            user_input,
+            response
+        )
+    except Exception as e:
+        await last_message.channel.send(f"❌ 對話錯誤: {str(e)}")
+
+async def stream_reply(channel, character, role_key, user_input, session_key) -> str:
+    """先送出佔位訊息，再隨串流內容節流編輯（符合 Discord 編輯頻率限制）"""
+    prefix = f"**{character.name}** ({character.profession}): "
+    placeholder = await channel.send(prefix + "💭 ...")
+    
+    loop = asyncio.get_running_loop()
+    last_edit = float("-inf")  # 第一個 token 立即顯示
+    shown = ""
+    response = ""
+    
+    # aclosing：中途失敗（例如編輯訊息出錯）時立即關閉產生器，釋放排程器名額與 HTTP 串流
+    try:
+        async with contextlib.aclosing(bot.virtual_society.astream_role_response(
+            role_key, user_input, session_key=session_key
+        )) as stream:
+            async for response in stream:
+                now = loop.time()
+                if now - last_edit >= SANDBOX_STREAM_EDIT_INTERVAL and response != shown:
+                    await placeholder.edit(content=prefix + response + " ▌")
+                    shown = response
+                    last_edit = loop.time()
+    except Exception:
+        # 保留已顯示的部分內容並標示中斷
+        with contextlib.suppress(discord.HTTPException):
+            await placeholder.edit(content=prefix + (response or shown) + " ⚠️（回應中斷）")
+        raise
+    
+    await placeholder.edit(content=prefix + response)
+    return response
+
+# 連續訊息合併（同一對話同時只有一個生成請求）
+sandbox_coalescer = BurstCoalescer(
+    respond_to_burst,
+    debounce_seconds=float(os.getenv('SANDBOX_DEBOUNCE_SECONDS', '0.8'))
+)
+
 @bot.event
 async def on_message(message):
     """處理訊息"""
@@ -309,29 +387,16 @@ async def on_message(message):
             await message.channel.send("✅ 對話已結束，返回一般模式")
             return
         
-        # 如果不是指令，視為對話
+        # 如果不是指令，視為對話（交給合併器，短時間內的連續訊息合併為一輪）
         if not message.content.startswith("!"):
             conversation = bot.active_conversations[user_id]
-            character = conversation["character"]
-            
-            try:
-                # 使用增強的角色回應生成
-                response = bot.virtual_society.generate_role_response(
-                    conversation["role_key"], 
-                    message.content
-                )
-                
-                # 更新對話歷史（包含背景發展）
-                bot.virtual_society.update_conversation_with_background(
-                    conversation["role_key"],
-                    message.content,
-                    response
-                )
-                
-                await message.channel.send(f"**{character.name}** ({character.profession}): {response}")
-            except Exception as e:
-                await message.channel.send(f"❌ 對話錯誤: {str(e)}")
-            
+            session_key = make_session_key(
+                message.guild.id if message.guild else None,
+                message.channel.id,
+                user_id,
+                conversation["role_key"]
+            )
+            sandbox_coalescer.submit(session_key, message)
             return
     
     # 處理指令
@@ -684,7 +749,8 @@ async def list_command(ctx, item_type: str = None):
     """
     
     if item_type == "characters":
-        characters = bot.virtual_society.get_all_characters()
+        # 只讀摘要，不必載入每個自定義角色
+        characters = bot.virtual_society.list_characters()
         
         if not characters:
             await ctx.send("📭 還沒有任何角色")
@@ -700,18 +766,18 @@ async def list_command(ctx, item_type: str = None):
         default_chars = []
         custom_chars = []
         
-        for key, char in characters.items():
-            if key.startswith('custom_'):
+        for char in characters:
+            if char["custom"]:
                 custom_chars.append(char)
             else:
                 default_chars.append(char)
         
         if default_chars:
-            default_text = "\n".join([f"• **{char.name}** ({char.profession})" for char in default_chars[:5]])
+            default_text = "\n".join([f"• **{char['name']}** ({char['profession']})" for char in default_chars[:5]])
             embed.add_field(name="📦 預設角色", value=default_text, inline=False)
         
         if custom_chars:
-            custom_text = "\n".join([f"• **{char.name}** ({char.profession})" for char in custom_chars[:5]])
+            custom_text = "\n".join([f"• **{char['name']}** ({char['profession']})" for char in custom_chars[:5]])
             embed.add_field(name="🎨 自定義角色", value=custom_text, inline=False)
             
             if len(custom_chars) > 5:
@@ -720,7 +786,7 @@ async def list_command(ctx, item_type: str = None):
         await ctx.send(embed=embed)
         
     elif item_type == "scenes":
-        scenes = bot.virtual_society.get_all_scenes()
+        scenes = bot.virtual_society.list_scenes()
         
         if not scenes:
             await ctx.send("📭 還沒有任何場景")
@@ -735,18 +801,18 @@ async def list_command(ctx, item_type: str = None):
         default_scenes = []
         custom_scenes = []
         
-        for name, scene in scenes.items():
-            if name in ["辦公室", "咖啡廳", "公園", "虛擬對話空間"]:
+        for scene in scenes:
+            if scene["name"] in ["辦公室", "咖啡廳", "公園", "虛擬對話空間"]:
                 default_scenes.append(scene)
             else:
                 custom_scenes.append(scene)
         
         if default_scenes:
-            default_text = "\n".join([f"• **{scene.name}** - {scene.location}" for scene in default_scenes])
+            default_text = "\n".join([f"• **{scene['name']}** - {scene['location']}" for scene in default_scenes])
             embed.add_field(name="📦 預設場景", value=default_text, inline=False)
         
         if custom_scenes:
-            custom_text = "\n".join([f"• **{scene.name}** - {scene.location}" for scene in custom_scenes[:5]])
+            custom_text = "\n".join([f"• **{scene['name']}** - {scene['location']}" for scene in custom_scenes[:5]])
             embed.add_field(name="🎨 自定義場景", value=custom_text, inline=False)
             
             if len(custom_scenes) > 5:
@@ -929,8 +995,8 @@ async def custom_dashboard(ctx):
     backgrounds = bot.virtual_society.get_all_backgrounds()
     
     # 計算自定義數量
-    custom_char_count = len([c for c in characters.values() if c.name.startswith('custom_')])
-    custom_scene_count = len([s for s in scenes.values() if s.name not in ["辦公室", "咖啡廳", "公園", "虛擬對話空間"]])
+    custom_char_count = len([key for key in characters if key.startswith('custom_')])
+    custom_scene_count = len([name for name in scenes if name not in ["辦公室", "咖啡廳", "公園", "虛擬對話空間"]])
     
     embed.add_field(
         name="📊 內容統計",
@@ -1028,14 +1094,7 @@ async def bind_command(ctx, action: str = None, target_name: str = None, target_
             await ctx.send("📭 還沒有創建任何背景故事，請先使用 `!create background` 創建")
             return
         
-        all_characters = bot.virtual_society.get_all_characters()
-        character_exists = False
-        for char in all_characters.values():
-            if char.name == target_name:
-                character_exists = True
-                break
-        
-        if not character_exists:
+        if bot.virtual_society.find_character_key(target_name) is None:
             await ctx.send(f"❌ 角色 '{target_name}' 不存在")
             return
         
@@ -1190,15 +1249,8 @@ async def character_detail_command(ctx, character_name: str = None):
         return
     
     # 查找角色
-    all_characters = bot.virtual_society.get_all_characters()
-    target_character = None
-    character_key = None
-    
-    for key, char in all_characters.items():
-        if char.name == character_name:
-            target_character = char
-            character_key = key
-            break
+    character_key = bot.virtual_society.find_character_key(character_name)
+    target_character = bot.virtual_society.characters[character_key] if character_key else None
     
     if not target_character:
         await ctx.send(f"❌ 找不到角色: {character_name}")
@@ -0,0 +1,76 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, List
+
+
+class BurstCoalescer:
+    """連續訊息合併器
+
+    同一個 key（例如同一個對話）在短時間內連續送來的訊息，
+    會在安靜 debounce_seconds 秒後合併成一批交給 handler 處理。
+    每個 key 同一時間只會有一個 handler 在執行；
+    執行期間到達的訊息會累積起來，作為下一批處理。
+    """
+
+    def __init__(self, handler: Callable[[Hashable, List[Any]], Awaitable[None]],
+                 debounce_seconds: float = 0.8, max_delay: float = 3.0,
+                 max_batch: int = 5):
+        self.handler = handler
+        self.debounce_seconds = debounce_seconds
+        self.max_delay = max_delay  # 第一則訊息最多等待多久
+        self.max_batch = max_batch  # 累積到這個數量就立即處理
+
+        self._pending: Dict[Hashable, List[Any]] = {}
+        self._first_arrival: Dict[Hashable, float] = {}
+        self._last_arrival: Dict[Hashable, float] = {}
+        self._workers: Dict[Hashable, asyncio.Task] = {}
+
+    def submit(self, key: Hashable, item: Any):
+        """加入一則訊息"""
+        now = asyncio.get_running_loop().time()
+
+        pending = self._pending.setdefault(key, [])
+        if not pending:
+            self._first_arrival[key] = now
+        pending.append(item)
+        self._last_arrival[key] = now
+
+        if key not in self._workers:
+            self._workers[key] = asyncio.create_task(self._run(key))
+
+    def pending_count(self, key: Hashable) -> int:
+        """尚未處理的訊息數"""
+        return len(self._pending.get(key, []))
+
+    def is_busy(self, key: Hashable) -> bool:
+        """該 key 是否有訊息正在等待或處理中"""
+        return key in self._workers
+
+    async def _run(self, key: Hashable):
+        """單一 key 的處理迴圈"""
+        loop = asyncio.get_running_loop()
+
+        try:
+            while self._pending.get(key):
+                # 等待訊息停止湧入（或等太久 / 累積太多）
+                while len(self._pending[key]) < self.max_batch:
+                    now = loop.time()
+                    quiet_at = self._last_arrival[key] + self.debounce_seconds
+                    deadline = self._first_arrival[key] + self.max_delay
+                    wait = min(quiet_at, deadline) - now
+                    if wait <= 0:
+                        break
+                    await asyncio.sleep(wait)
+
+                batch = self._pending.pop(key)
+                self._first_arrival.pop(key, None)
+
+                try:
+                    await self.handler(key, batch)
+                except Exception as e:
+                    print(f"❌ 合併訊息處理失敗: {e}")
+        finally:
+            self._workers.pop(key, None)
+            if not self._pending.get(key):
+                self._pending.pop(key, None)
+                self._first_arrival.pop(key, None)
+                self._last_arrival.pop(key, None)
@@ -0,0 +1,384 @@
+import csv
+import datetime as dt
+import re
+import time
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+import pytz
+from jsonschema import ValidationError, validate
+
+from calendar_service import BATCH_LIMIT, CALENDAR_SCHEMA
+
+# 一次送去解析的自由文字列數
+TEXT_BATCH_SIZE = 10
+# 進度更新的最短間隔（秒）
+PROGRESS_INTERVAL = 1.5
+# 最多保留幾筆錯誤訊息
+MAX_ERRORS = 10
+# 引號內跨行的 CSV 欄位最多累積幾行／幾個字元；超過視為引號未成對
+MAX_CSV_RECORD_LINES = 50
+MAX_CSV_RECORD_CHARS = 8192
+
+# CSV 欄位別名
+CSV_COLUMNS = {
+    "title": ("title", "summary", "subject", "標題", "事件", "名稱", "活動"),
+    "date": ("date", "day", "日期"),
+    "start": ("start", "start time", "begin", "開始", "開始時間"),
+    "end": ("end", "end time", "finish", "結束", "結束時間"),
+    "text": ("text", "description", "描述", "內容", "行程", "備註"),
+}
+
+DATE_FORMATS = ("%Y-%m-%d", "%Y/%m/%d", "%Y.%m.%d", "%Y%m%d")
+TIME_RE = re.compile(r"^(\d{1,2})[:：](\d{2})(?::\d{2})?$")
+ICS_DATETIME_RE = re.compile(r"^(\d{8})(?:T(\d{6})(Z)?)?$")
+
+
+@dataclass
+class ImportStats:
+    """匯入進度與結果統計"""
+    rows: int = 0  # 已讀取的列（事件）數
+    structured: int = 0  # 欄位完整、直接驗證的列
+    rule_parsed: int = 0  # 以規則解析的自由文字
+    llm_parsed: int = 0  # 交給 LLM 的自由文字
+    invalid: int = 0  # 無法解析或驗證失敗
+    created: int = 0  # 已建立的事件
+    failed: int = 0  # 建立失敗的事件
+    done: bool = False
+    errors: List[str] = field(default_factory=list)
+
+    def add_error(self, message: str):
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append(message)
+
+
+# =========================
+# 1️⃣ 逐行讀取
+# =========================
+
+def normalize_date(value: str) -> Optional[str]:
+    """各種日期寫法 → YYYY-MM-DD"""
+    value = value.strip()
+    for fmt in DATE_FORMATS:
+        try:
+            return dt.datetime.strptime(value, fmt).strftime("%Y-%m-%d")
+        except ValueError:
+            continue
+    return None
+
+
+def normalize_time(value: str) -> Optional[str]:
+    """9:00 / 09:00:00 → HH:MM"""
+    match = TIME_RE.match(value.strip())
+    if not match:
+        return None
+    hour, minute = int(match.group(1)), int(match.group(2))
+    if hour > 23 or minute > 59:
+        return None
+    return f"{hour:02d}:{minute:02d}"
+
+
+async def iter_csv_rows(lines: AsyncIterator[str]) -> AsyncIterator[Dict]:
+    """逐行讀取 CSV，產生 {"line", "spec"} 或 {"line", "text"}
+
+    引號內含換行的欄位會累積到引號成對為止，不需要把整個檔案讀進記憶體；
+    累積超過 MAX_CSV_RECORD_LINES 行或 MAX_CSV_RECORD_CHARS 字元時，該列回報為錯誤並從下一行重新開始。
+    """
+    header: Optional[Dict[str, int]] = None
+    buffer = ""
+    buffer_start = 0
+    line_no = 0
+
+    async for line in lines:
+        line_no += 1
+        if not buffer:
+            buffer_start = line_no
+        buffer += line
+        if buffer.count('"') % 2:
+            if line_no - buffer_start + 1 >= MAX_CSV_RECORD_LINES or len(buffer) >= MAX_CSV_RECORD_CHARS:
+                buffer = ""
+                yield {"line": buffer_start, "error": "引號未成對，已略過這一列"}
+            continue
+
+        record, buffer = buffer, ""
+        if not record.strip():
+            continue
+        values = next(csv.reader([record]))
+
+        if header is None:
+            header = _map_csv_header(values)
+            if not header:
+                # 沒有可辨識的表頭 → 每一列都當作自由文字
+                header = {}
+                yield {"line": line_no, "text": " ".join(v.strip() for v in values if v.strip())}
+            continue
+
+        yield _csv_row(line_no, header, values)
+
+
+def _map_csv_header(values: List[str]) -> Dict[str, int]:
+    """表頭欄位名稱 → 欄位索引"""
+    mapping = {}
+    for index, name in enumerate(values):
+        name = name.strip().lstrip("﻿").lower()
+        for key, aliases in CSV_COLUMNS.items():
+            if name in aliases and key not in mapping:
+                mapping[key] = index
+    return mapping
+
+
+def _csv_row(line_no: int, header: Dict[str, int], values: List[str]) -> Dict:
+    def cell(key):
+        index = header.get(key)
+        return values[index].strip() if index is not None and index < len(values) else ""
+
+    if not header:
+        return {"line": line_no, "text": " ".join(v.strip() for v in values if v.strip())}
+
+    spec = {
+        "title": cell("title"),
+        "date": normalize_date(cell("date")) or cell("date"),
+        "start": normalize_time(cell("start")) or cell("start"),
+        "end": normalize_time(cell("end")) or cell("end"),
+    }
+    if all(spec.values()):
+        return {"line": line_no, "spec": spec}
+
+    # 欄位不完整 → 以整列文字交給解析器
+    text = cell("text") or " ".join(v.strip() for v in values if v.strip())
+    return {"line": line_no, "text": text}
+
+
+async def iter_ics_rows(lines: AsyncIterator[str], timezone: str) -> AsyncIterator[Dict]:
+    """逐行讀取 iCalendar，每個 VEVENT 產生一筆 {"line", "spec"}
+
+    處理折行（以空白開頭的續行）、TZID、UTC（Z 結尾）與整天事件。
+    重複規則（RRULE）只匯入第一次。
+    """
+    tz = pytz.timezone(timezone)
+    event: Optional[Dict[str, tuple]] = None
+    pending = ""
+    start_line = 0
+    line_no = 0
+
+    async def unfolded():
+        nonlocal pending, line_no
+        async for raw in lines:
+            line_no += 1
+            raw = raw.rstrip("\r\n")
+            if raw[:1] in (" ", "\t"):
+                pending += raw[1:]
+                continue
+            if pending:
+                yield pending
+            pending = raw
+        if pending:
+            yield pending
+
+    async for content in unfolded():
+        name, params, value = _split_ics_line(content)
+
+        if name == "BEGIN" and value == "VEVENT":
+            event = {}
+            start_line = line_no
+        elif name == "END" and value == "VEVENT" and event is not None:
+            yield _ics_event(start_line, event, tz)
+            event = None
+        elif event is not None and name in ("SUMMARY", "DTSTART", "DTEND"):
+            event[name] = (params, value)
+
+
+def _split_ics_line(content: str):
+    """NAME;PARAM=...:VALUE → (NAME, {PARAM: ...}, VALUE)"""
+    head, _, value = content.partition(":")
+    name, *raw_params = head.split(";")
+    params = {}
+    for raw in raw_params:
+        key, _, param_value = raw.partition("=")
+        params[key.upper()] = param_value.strip('"')
+    return name.upper(), params, value
+
+
+def _ics_datetime(params: Dict[str, str], value: str, tz) -> Optional[dt.datetime]:
+    match = ICS_DATETIME_RE.match(value.strip())
+    if not match:
+        return None
+
+    date_part, time_part, utc = match.groups()
+    if time_part is None:
+        return tz.localize(dt.datetime.strptime(date_part, "%Y%m%d"))
+
+    naive = dt.datetime.strptime(date_part + time_part, "%Y%m%d%H%M%S")
+    if utc:
+        return pytz.utc.localize(naive).astimezone(tz)
+    if "TZID" in params:
+        try:
+            return pytz.timezone(params["TZID"]).localize(naive).astimezone(tz)
+        except pytz.UnknownTimeZoneError:
+            pass
+    return tz.localize(naive)
+
+
+def _ics_event(line_no: int, event: Dict[str, tuple], tz) -> Dict:
+    title = event.get("SUMMARY", ({}, ""))[1]
+    title = title.replace("\\n", " ").replace("\\,", ",").replace("\\;", ";").replace("\\\\", "\\").strip()
+
+    start_params, start_value = event.get("DTSTART", ({}, ""))
+    start = _ics_datetime(start_params, start_value, tz)
+    if start is None:
+        return {"line": line_no, "error": f"無法辨識的開始時間：{start_value or '（缺少）'}"}
+
+    all_day = start_params.get("VALUE") == "DATE" or "T" not in start_value
+    end = _ics_datetime(*event["DTEND"], tz) if "DTEND" in event else None
+
+    if all_day:
+        start_time, end_time = "00:00", "23:59"
+    else:
+        start_time = start.strftime("%H:%M")
+        if end is None:
+            # 沒有結束時間 → 預設一小時（不跨日）
+            end = min(start + dt.timedelta(hours=1), start.replace(hour=23, minute=59))
+        # 跨日事件 → 結束於當天
+        end_time = end.strftime("%H:%M") if end.date() == start.date() else "23:59"
+
+    return {
+        "line": line_no,
+        "spec": {
+            "title": title or "未命名",
+            "date": start.strftime("%Y-%m-%d"),
+            "start": start_time,
+            "end": end_time,
+        }
+    }
+
+
+# =========================
+# 2️⃣ 匯入流程
+# =========================
+
+class CalendarImporter:
+    """串流匯入：逐行讀取 → 驗證 → 每 50 筆批次寫入 Google Calendar
+
+    欄位完整的列直接驗證；只有自由文字才交給 CalendarAssistant
+    （先規則解析，信心不足才呼叫 LLM）。
+    """
+
+    def __init__(self, calendar_service, calendar_assistant, calendar_id: str,
+                 progress: Optional[Callable[[ImportStats], Awaitable[None]]] = None,
+                 tenant=None):
+        self.calendar_service = calendar_service
+        self.calendar_assistant = calendar_assistant
+        self.calendar_id = calendar_id
+        self.progress = progress
+        self.tenant = tenant
+
+        self.stats = ImportStats()
+        self._specs: List[Dict] = []
+        self._texts: List[Dict] = []
+        self._last_progress = 0.0
+
+    async def run(self, rows: AsyncIterator[Dict]) -> ImportStats:
+        """處理所有列並回傳統計"""
+        async for row in rows:
+            if not (row.get("spec") or row.get("text") or row.get("error")):
+                continue
+            self.stats.rows += 1
+
+            if "error" in row:
+                self._reject(row["line"], row["error"])
+            elif "spec" in row:
+                self._accept_spec(row["line"], row["spec"])
+                self.stats.structured += 1
+            else:
+                self._texts.append(row)
+                if len(self._texts) >= TEXT_BATCH_SIZE:
+                    await self._flush_texts()
+
+            if len(self._specs) >= BATCH_LIMIT:
+                await self._flush_specs()
+            await self._report()
+
+        await self._flush_texts()
+        await self._flush_specs()
+
+        self.stats.done = True
+        await self._report(force=True)
+        return self.stats
+
+    def _accept_spec(self, line_no: int, spec: Dict):
+        try:
+            validate(instance=spec, schema=CALENDAR_SCHEMA)
+        except ValidationError as e:
+            self._reject(line_no, e.message)
+            return
+        try:
+            dt.date.fromisoformat(spec["date"])
+        except ValueError:
+            self._reject(line_no, f"日期不合法：{spec['date']}")
+            return
+        if spec["end"] <= spec["start"]:
+            self._reject(line_no, "結束時間早於開始時間")
+            return
+        self._specs.append(spec)
+
+    def _reject(self, line_no: int, reason: str):
+        self.stats.invalid += 1
+        self.stats.add_error(f"第 {line_no} 行：{reason[:80]}")
+
+    async def _flush_texts(self):
+        """解析累積的自由文字（規則優先，其餘批次交給 LLM）"""
+        if not self._texts:
+            return
+
+        rows, self._texts = self._texts, []
+        # 匯入的文字多半只出現一次，不寫入解析快取，以免擠掉互動查詢的常用項目
+        results = await self.calendar_assistant.aparse_many(
+            [row["text"] for row in rows], tenant=self.tenant, populate_cache=False
+        )
+
+        for row, result in zip(rows, results):
+            if not result["success"]:
+                self._reject(row["line"], result.get("error", "解析失敗"))
+                continue
+
+            if result.get("source") == "rule":
+                self.stats.rule_parsed += 1
+            else:
+                self.stats.llm_parsed += 1
+
+            for event in result["events"]:
+                spec = {key: event[key] for key in ("title", "date", "start", "end")}
+                self._accept_spec(row["line"], spec)
+
+            if len(self._specs) >= BATCH_LIMIT:
+                await self._flush_specs()
+
+    async def _flush_specs(self):
+        """以 batch 請求寫入（每次最多 50 筆）"""
+        while self._specs:
+            batch, self._specs = self._specs[:BATCH_LIMIT], self._specs[BATCH_LIMIT:]
+            results = await self.calendar_service.acreate_events_batch(self.calendar_id, batch)
+
+            for result in results:
+                if result["success"]:
+                    self.stats.created += 1
+                else:
+                    self.stats.failed += 1
+                    self.stats.add_error(f"{result['title']}：{result['error']}")
+
+            await self._report()
+
+    async def _report(self, force: bool = False):
+        """回報進度（節流）"""
+        if self.progress is None:
+            return
+
+        now = time.monotonic()
+        if not force and now - self._last_progress < PROGRESS_INTERVAL:
+            return
+
+        self._last_progress = now
+        try:
+            await self.progress(self.stats)
+        except Exception as e:
+            print(f"⚠️ 匯入進度更新失敗: {e}")
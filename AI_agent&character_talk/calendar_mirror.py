@@ -0,0 +1,226 @@
+import asyncio
+import datetime as dt
+import json
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import pytz
+
+from calendar_service import SyncTokenExpired
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    calendar_id TEXT NOT NULL,
+    id TEXT NOT NULL,
+    summary TEXT,
+    start_ts REAL NOT NULL,
+    end_ts REAL NOT NULL,
+    raw TEXT NOT NULL,
+    PRIMARY KEY (calendar_id, id)
+);
+CREATE INDEX IF NOT EXISTS idx_events_start ON events (calendar_id, start_ts);
+CREATE TABLE IF NOT EXISTS sync_state (
+    calendar_id TEXT PRIMARY KEY,
+    sync_token TEXT,
+    synced_at REAL
+);
+"""
+
+
+def event_span(item: Dict, timezone: str) -> Optional[Tuple[float, float]]:
+    """API 事件的 (開始, 結束) epoch 秒數；整天事件以日曆時區的午夜計算"""
+    def to_timestamp(value: Dict) -> float:
+        if "dateTime" in value:
+            return dt.datetime.fromisoformat(value["dateTime"].replace("Z", "+00:00")).timestamp()
+        date = dt.date.fromisoformat(value["date"])
+        return pytz.timezone(timezone).localize(dt.datetime.combine(date, dt.time())).timestamp()
+
+    try:
+        return to_timestamp(item["start"]), to_timestamp(item["end"])
+    except (KeyError, ValueError):
+        return None
+
+
+class CalendarMirror:
+    """Google Calendar 的本地 SQLite 鏡像
+
+    - 事件依開始時間建索引，查詢不需要呼叫 API
+    - 背景工作以 syncToken 增量同步，只有 token 失效（410）才完整重新同步
+    - 本地建立事件後可呼叫 request_sync() 立即同步
+    - 完整同步時寫入交易會持有鎖，事件迴圈上請使用 a 開頭的查詢（在執行緒中執行）
+    """
+
+    def __init__(self, calendar_service, calendar_id: str, db_path: str = "calendar_mirror.db",
+                 sync_interval: float = 60):
+        self.calendar_service = calendar_service
+        self.calendar_id = calendar_id
+        self.timezone = calendar_service.timezone
+        self.sync_interval = sync_interval
+
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        # 本次執行是否已成功同步過（記憶體旗標，不查資料庫）
+        self._ready = False
+
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self.stats = {"syncs": 0, "full_syncs": 0, "changes": 0, "errors": 0, "last_sync": None}
+
+    # --------------------------
+    # 背景同步
+    # --------------------------
+    def start(self):
+        """啟動背景同步（需在事件迴圈中呼叫）"""
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._conn.close()
+
+    def request_sync(self):
+        """要求盡快同步一次（例如剛建立事件後）"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            try:
+                await self.sync()
+            except Exception as e:
+                self.stats["errors"] += 1
+                print(f"⚠️ 日曆鏡像同步失敗: {e}")
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.sync_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def sync(self) -> int:
+        """同步一次，回傳變更的事件數"""
+        sync_token = await asyncio.to_thread(self._get_sync_token)
+        full = sync_token is None
+
+        try:
+            items, next_token = await self.calendar_service.afetch_changes(self.calendar_id, sync_token)
+        except SyncTokenExpired:
+            print("🔁 syncToken 已失效，重新完整同步日曆")
+            full = True
+            items, next_token = await self.calendar_service.afetch_changes(self.calendar_id, None)
+
+        await asyncio.to_thread(self._apply, items, next_token, full)
+        self._ready = True
+
+        self.stats["syncs"] += 1
+        self.stats["full_syncs"] += full
+        self.stats["changes"] += len(items)
+        self.stats["last_sync"] = time.time()
+        return len(items)
+
+    # --------------------------
+    # 寫入
+    # --------------------------
+    def _apply(self, items: List[Dict], sync_token: Optional[str], full: bool):
+        """在單一交易中套用變更"""
+        upserts = []
+        deletes = []
+        for item in items:
+            if item.get("status") == "cancelled":
+                deletes.append((self.calendar_id, item["id"]))
+                continue
+            span = event_span(item, self.timezone)
+            if span is None:
+                continue
+            upserts.append((
+                self.calendar_id, item["id"], item.get("summary", ""),
+                span[0], span[1], json.dumps(item, ensure_ascii=False)
+            ))
+
+        with self._lock, self._conn:
+            if full:
+                self._conn.execute("DELETE FROM events WHERE calendar_id = ?", (self.calendar_id,))
+            self._conn.executemany("DELETE FROM events WHERE calendar_id = ? AND id = ?", deletes)
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO events (calendar_id, id, summary, start_ts, end_ts, raw) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                upserts
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sync_state (calendar_id, sync_token, synced_at) VALUES (?, ?, ?)",
+                (self.calendar_id, sync_token, time.time())
+            )
+
+    # --------------------------
+    # 查詢
+    # --------------------------
+    def _get_sync_token(self) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT sync_token FROM sync_state WHERE calendar_id = ?", (self.calendar_id,)
+            ).fetchone()
+        return row[0] if row else None
+
+    @property
+    def ready(self) -> bool:
+        """本次執行是否已完成至少一次同步"""
+        return self._ready
+
+    def upcoming(self, limit: int = 10, now: Optional[dt.datetime] = None) -> List[Dict]:
+        """近期事件（尚未結束的事件，依開始時間排序），格式與 API 回傳的 items 相同"""
+        now_ts = (now or dt.datetime.now(dt.timezone.utc)).timestamp()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT raw FROM events WHERE calendar_id = ? AND end_ts > ? "
+                "ORDER BY start_ts LIMIT ?",
+                (self.calendar_id, now_ts, limit)
+            ).fetchall()
+        return [json.loads(raw) for raw, in rows]
+
+    def between(self, start: dt.datetime, end: dt.datetime) -> List[Dict]:
+        """與 [start, end) 時段重疊的事件"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT raw FROM events WHERE calendar_id = ? AND start_ts < ? AND end_ts > ? "
+                "ORDER BY start_ts",
+                (self.calendar_id, end.timestamp(), start.timestamp())
+            ).fetchall()
+        return [json.loads(raw) for raw, in rows]
+
+    def spans_between(self, start_ts: float, end_ts: float) -> List[Tuple[float, float, str, str]]:
+        """與時段重疊的事件 (開始, 結束, 標題, id)，不解析 JSON"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT start_ts, end_ts, summary, id FROM events "
+                "WHERE calendar_id = ? AND start_ts < ? AND end_ts > ?",
+                (self.calendar_id, end_ts, start_ts)
+            ).fetchall()
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM events WHERE calendar_id = ?", (self.calendar_id,)
+            ).fetchone()[0]
+
+    # --------------------------
+    # 非同步查詢（不阻塞事件迴圈）
+    # --------------------------
+    async def aupcoming(self, limit: int = 10, now: Optional[dt.datetime] = None) -> List[Dict]:
+        return await asyncio.to_thread(self.upcoming, limit, now)
+
+    async def abetween(self, start: dt.datetime, end: dt.datetime) -> List[Dict]:
+        return await asyncio.to_thread(self.between, start, end)
+
+    async def aspans_between(self, start_ts: float, end_ts: float) -> List[Tuple[float, float, str, str]]:
+        return await asyncio.to_thread(self.spans_between, start_ts, end_ts)
@@ -1,9 +1,19 @@
 # calendar_service.py
 import os
 import json
+import asyncio
+import functools
+import threading
+import tempfile
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import httplib2
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
+from google_auth_httplib2 import AuthorizedHttp
+from googleapiclient import discovery_cache
+from googleapiclient.discovery import build, build_from_document
+from googleapiclient.errors import HttpError
 from google.auth.transport.requests import Request
 import datetime as dt
 import pytz
@@ -11,6 +21,26 @@ from jsonschema import validate
 
 SCOPES = ['https://www.googleapis.com/auth/calendar']
 
+TOKEN_PATH = "token.json"
+# 套件沒有內建 discovery 文件時的本地快取
+DISCOVERY_CACHE_PATH = "calendar_discovery.json"
+# 在 token 到期前多久主動刷新（秒）
+TOKEN_REFRESH_MARGIN = 300
+# 刷新失敗後多久重試（秒）
+TOKEN_RETRY_SECONDS = 60
+
+# Google batch 請求單次上限
+BATCH_LIMIT = 50
+# 同步時每頁事件數
+SYNC_PAGE_SIZE = 250
+
+# 讀取事件時的欄位遮罩（partial response），只下載實際用到的欄位
+EVENT_LIST_FIELDS = "etag,nextPageToken,items(id,summary,start,end,htmlLink)"
+# 增量同步另外需要 status（cancelled 表示刪除）與 nextSyncToken
+SYNC_FIELDS = "nextPageToken,nextSyncToken,items(id,status,summary,start,end,htmlLink)"
+# 保留幾組列表回應供 ETag 條件式請求使用
+ETAG_CACHE_SIZE = 64
+
 
 # JSON Schema 驗證
 CALENDAR_SCHEMA = {
@@ -25,11 +55,103 @@ CALENDAR_SCHEMA = {
 }
 
 
+def atomic_write(path, text):
+    """先寫入同目錄的暫存檔、fsync 後再取代，避免寫到一半的檔案"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def load_discovery_document():
+    """取得 Calendar v3 的 discovery 文件（不需要網路）
+
+    依序使用：套件內建的靜態文件 → 本地快取 → 下載一次並寫入本地快取
+    """
+    document = discovery_cache.get_static_doc("calendar", "v3")
+    if document:
+        return document
+
+    if os.path.exists(DISCOVERY_CACHE_PATH):
+        with open(DISCOVERY_CACHE_PATH, "r", encoding="utf-8") as f:
+            return f.read()
+
+    service = build("calendar", "v3", http=httplib2.Http(), static_discovery=False)
+    document = json.dumps(service._rootDesc)
+    atomic_write(DISCOVERY_CACHE_PATH, document)
+    print("💾 Calendar discovery 文件已快取。")
+    return document
+
+
+def find_gaps(busy, time_min, time_max, duration):
+    """掃描線合併忙碌區間，回傳長度至少 duration 的空檔 [(開始, 結束), ...]
+
+    busy 可以來自多個日曆、彼此重疊；相接的區間（一個結束即另一個開始）不留空檔。
+    """
+    points = []
+    for start, end in busy:
+        start, end = max(start, time_min), min(end, time_max)
+        if start < end:
+            points.append((start, 1))
+            points.append((end, -1))
+    # 同一時間點先處理開始，避免相接的區間之間出現長度為 0 的空檔
+    points.sort(key=lambda point: (point[0], -point[1]))
+
+    gaps = []
+    depth = 0
+    free_since = time_min
+    for moment, delta in points:
+        if depth == 0 and delta == 1 and moment - free_since >= duration:
+            gaps.append((free_since, moment))
+        depth += delta
+        if depth == 0:
+            free_since = moment
+
+    if depth == 0 and time_max - free_since >= duration:
+        gaps.append((free_since, time_max))
+    return gaps
+
+
+def with_paging_fields(fields):
+    """確保欄位遮罩保留翻頁與 ETag 需要的欄位（None 表示完整資源）"""
+    if fields is None:
+        return None
+    required = [name for name in ("etag", "nextPageToken") if name not in fields]
+    return ",".join(required + [fields])
+
+
+class SyncTokenExpired(Exception):
+    """syncToken 已失效（HTTP 410），需要完整重新同步"""
+
+
 class CalendarService:
-    def __init__(self, credentials_path, timezone="Asia/Taipei"):
+    def __init__(self, credentials_path, timezone="Asia/Taipei", max_workers=4):
         self.credentials_path = credentials_path
         self.timezone = timezone
-        self.service = self._authenticate()
+        self.creds = self._authenticate()
+        # 只讀取一次，各執行緒建立客戶端時共用
+        self._discovery_document = load_discovery_document()
+        self._refresh_lock = threading.Lock()
+        self._refresh_task = None
+        # 列表查詢 → (etag, 回應)；未變更時伺服器回傳 304，直接使用快取
+        self._etag_cache = OrderedDict()
+        self._etag_lock = threading.Lock()
+
+        # httplib2 不是執行緒安全的 → 每個執行緒各自持有一個 service
+        self._local = threading.local()
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix="calendar-api"
+        )
+        self.service = self._get_service()
 
     # --------------------------
     # Google Calendar 認證流程
@@ -40,9 +162,9 @@ class CalendarService:
         creds = None
 
         # ① 若已有 token.json → 讀入
-        if os.path.exists("token.json"):
+        if os.path.exists(TOKEN_PATH):
             try:
-                with open("token.json", "r") as token:
+                with open(TOKEN_PATH, "r") as token:
                     creds = Credentials.from_authorized_user_info(
                         json.load(token), SCOPES
                     )
@@ -71,14 +193,107 @@ class CalendarService:
                 print("✅ Google Calendar 授權完成！")
 
             # ④ 儲存 token.json
-            with open("token.json", "w") as token:
-                token.write(creds.to_json())
-                print("💾 新 token.json 已儲存。")
+            self._save_token(creds)
+            print("💾 新 token.json 已儲存。")
+
+        return creds
+
+    def _save_token(self, creds):
+        atomic_write(TOKEN_PATH, creds.to_json())
+
+    # --------------------------
+    # 主動刷新 token
+    # --------------------------
+    def refresh_token(self):
+        """立即刷新 token 並寫回 token.json"""
+        with self._refresh_lock:
+            self.creds.refresh(Request())
+            self._save_token(self.creds)
+
+    def _seconds_until_refresh(self):
+        """距離需要主動刷新還有幾秒（沒有到期時間則回傳 None）"""
+        if self.creds.expiry is None:
+            return None
+        # google-auth 的 expiry 為不帶時區的 UTC 時間
+        remaining = (self.creds.expiry - dt.datetime.utcnow()).total_seconds()
+        return max(0.0, remaining - TOKEN_REFRESH_MARGIN)
+
+    def start_token_refresher(self):
+        """啟動背景刷新（需在事件迴圈中呼叫）：到期前先刷新，第一個請求不必等待"""
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._refresh_loop())
+
+    async def _refresh_loop(self):
+        while True:
+            delay = self._seconds_until_refresh()
+            if delay is None or not self.creds.refresh_token:
+                return
+
+            await asyncio.sleep(delay)
+            try:
+                await self._run_in_pool(self.refresh_token)
+                print("🔁 Google Token 已主動刷新。")
+            except Exception as e:
+                print(f"⚠️ Token 主動刷新失敗，{TOKEN_RETRY_SECONDS} 秒後重試：{e}")
+                await asyncio.sleep(TOKEN_RETRY_SECONDS)
 
-        # ⑤ 建立 Google Calendar API 客戶端
-        service = build("calendar", "v3", credentials=creds)
+    # --------------------------
+    # 每執行緒 API 客戶端
+    # --------------------------
+    def _get_service(self):
+        """取得目前執行緒專屬的 Google Calendar 客戶端（重用 keep-alive 連線）"""
+        service = getattr(self._local, "service", None)
+        if service is None:
+            http = AuthorizedHttp(self.creds, http=httplib2.Http())
+            service = build_from_document(self._discovery_document, http=http)
+            self._local.service = service
         return service
 
+    def _execute_list(self, params):
+        """執行 events.list：要求 gzip 壓縮，並以 If-None-Match 帶上次的 ETag
+
+        回應未變更（304）時回傳快取的結果，不必重新下載與解析。
+        """
+        key = tuple(sorted(params.items()))
+        with self._etag_lock:
+            cached = self._etag_cache.get(key)
+
+        request = self._get_service().events().list(**params)
+        request.headers["accept-encoding"] = "gzip"
+        if cached is not None:
+            request.headers["if-none-match"] = cached[0]
+
+        try:
+            response = request.execute()
+        except HttpError as e:
+            if e.resp.status == 304 and cached is not None:
+                with self._etag_lock:
+                    self._etag_cache.move_to_end(key)
+                return cached[1]
+            raise
+
+        etag = response.get("etag")
+        if etag:
+            with self._etag_lock:
+                self._etag_cache[key] = (etag, response)
+                self._etag_cache.move_to_end(key)
+                while len(self._etag_cache) > ETAG_CACHE_SIZE:
+                    self._etag_cache.popitem(last=False)
+        return response
+
+    async def _run_in_pool(self, func, *args, **kwargs):
+        """在執行緒池中執行阻塞的 API 呼叫"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, functools.partial(func, *args, **kwargs)
+        )
+
+    def close(self):
+        """停止背景刷新並關閉執行緒池"""
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+        self._executor.shutdown(wait=False)
+
     # --------------------------
     # 時間格式
     # --------------------------
@@ -95,13 +310,13 @@ class CalendarService:
     # --------------------------
     # 建立事件
     # --------------------------
-    def create_event(self, calendar_id, spec):
-        """建立日曆事件"""
+    def _build_event_body(self, spec):
+        """驗證 spec 並轉換為 Google Calendar 事件內容"""
 
         # 驗證 spec 是否符合 Schema
         validate(instance=spec, schema=CALENDAR_SCHEMA)
 
-        event = {
+        return {
             "summary": spec["title"],
             "start": {
                 "dateTime": self._to_rfc3339(spec["date"], spec["start"]),
@@ -113,8 +328,13 @@ class CalendarService:
             },
         }
 
+    def create_event(self, calendar_id, spec):
+        """建立日曆事件"""
+
+        event = self._build_event_body(spec)
+
         # 寫入 Google Calendar
-        created = self.service.events().insert(
+        created = self._get_service().events().insert(
             calendarId=calendar_id,
             body=event
         ).execute()
@@ -126,20 +346,221 @@ class CalendarService:
             "end": created["end"]
         }
 
+    # --------------------------
+    # 批次建立事件
+    # --------------------------
+    def create_events_batch(self, calendar_id, specs):
+        """以 Google batch 請求一次建立多個事件
+
+        回傳與 specs 順序一致的結果列表：
+        成功 → {"success": True, "title": ..., "link": ...}
+        失敗 → {"success": False, "title": ..., "error": ...}
+        """
+
+        results = [None] * len(specs)
+        service = self._get_service()
+
+        def make_callback(index, title):
+            def callback(request_id, response, exception):
+                if exception is not None:
+                    results[index] = {
+                        "success": False,
+                        "title": title,
+                        "error": str(exception)[:100]
+                    }
+                else:
+                    results[index] = {
+                        "success": True,
+                        "title": title,
+                        "link": response["htmlLink"]
+                    }
+            return callback
+
+        # 先在本地驗證，只把合法的事件放進批次
+        pending = []
+        for index, spec in enumerate(specs):
+            title = spec.get("title", "未命名")
+            try:
+                pending.append((index, title, self._build_event_body(spec)))
+            except Exception as e:
+                results[index] = {
+                    "success": False,
+                    "title": title,
+                    "error": str(e)[:100]
+                }
+
+        # Google batch 每次最多 50 個請求
+        for offset in range(0, len(pending), BATCH_LIMIT):
+            batch = service.new_batch_http_request()
+            for index, title, body in pending[offset:offset + BATCH_LIMIT]:
+                batch.add(
+                    service.events().insert(calendarId=calendar_id, body=body),
+                    callback=make_callback(index, title)
+                )
+            try:
+                batch.execute()
+            except Exception as e:
+                # 整個批次失敗 → 標記尚未回報的事件
+                for index, title, _ in pending[offset:offset + BATCH_LIMIT]:
+                    if results[index] is None:
+                        results[index] = {
+                            "success": False,
+                            "title": title,
+                            "error": str(e)[:100]
+                        }
+
+        return results
+
     # --------------------------
     # 列出事件
     # --------------------------
-    def list_events(self, calendar_id, max_results=10):
-        """列出近期事件"""
+    def list_events(self, calendar_id, max_results=10, fields=EVENT_LIST_FIELDS):
+        """列出近期事件
 
-        now = dt.datetime.utcnow().isoformat() + "Z"
+        fields：欄位遮罩（None 表示下載完整資源）
+        """
 
-        results = self.service.events().list(
-            calendarId=calendar_id,
-            timeMin=now,
-            maxResults=max_results,
-            singleEvents=True,
-            orderBy="startTime"
-        ).execute()
+        # 取整到分鐘，一分鐘內重複查詢可以命中 ETag
+        now = dt.datetime.utcnow().replace(second=0, microsecond=0).isoformat() + "Z"
+
+        params = {
+            "calendarId": calendar_id,
+            "timeMin": now,
+            "maxResults": max_results,
+            "singleEvents": True,
+            "orderBy": "startTime",
+        }
+        fields = with_paging_fields(fields)
+        if fields:
+            params["fields"] = fields
+
+        return self._execute_list(params).get("items", [])
+
+    def list_events_range(self, calendar_id, time_min, time_max, fields=EVENT_LIST_FIELDS):
+        """列出時段內的所有事件（單次查詢，必要時翻頁）"""
+
+        items = []
+        page_token = None
+        fields = with_paging_fields(fields)
+
+        while True:
+            params = {
+                "calendarId": calendar_id,
+                "timeMin": time_min.isoformat(),
+                "timeMax": time_max.isoformat(),
+                "singleEvents": True,
+                "maxResults": SYNC_PAGE_SIZE,
+            }
+            if fields:
+                params["fields"] = fields
+            if page_token:
+                params["pageToken"] = page_token
+
+            response = self._execute_list(params)
+            items.extend(response.get("items", []))
+            page_token = response.get("nextPageToken")
+            if not page_token:
+                return items
+
+    # --------------------------
+    # 空閒時段
+    # --------------------------
+    def find_free_slots(self, time_range, duration_minutes=60, calendars=None):
+        """以一次 freebusy 查詢找出所有日曆都空閒的時段
+
+        time_range: (開始, 結束)，需帶時區
+        回傳 [(開始, 結束), ...]，每段至少 duration_minutes 分鐘
+        """
+
+        time_min, time_max = time_range
+        calendars = calendars or ["primary"]
+
+        response = self._get_service().freebusy().query(body={
+            "timeMin": time_min.isoformat(),
+            "timeMax": time_max.isoformat(),
+            "timeZone": self.timezone,
+            "items": [{"id": calendar_id} for calendar_id in calendars],
+        }).execute()
+
+        tz = pytz.timezone(self.timezone)
+        busy = []
+        for calendar_id, info in response.get("calendars", {}).items():
+            if info.get("errors"):
+                print(f"⚠️ 無法取得 {calendar_id} 的忙碌時段: {info['errors']}")
+            for period in info.get("busy", []):
+                busy.append((
+                    dt.datetime.fromisoformat(period["start"].replace("Z", "+00:00")).astimezone(tz),
+                    dt.datetime.fromisoformat(period["end"].replace("Z", "+00:00")).astimezone(tz),
+                ))
+
+        return find_gaps(busy, time_min, time_max, dt.timedelta(minutes=duration_minutes))
+
+    # --------------------------
+    # 增量同步
+    # --------------------------
+    def fetch_changes(self, calendar_id, sync_token=None, fields=SYNC_FIELDS):
+        """取得事件變更
+
+        沒有 sync_token → 完整列出所有事件；
+        有 sync_token → 只列出之後變更的事件（刪除的事件 status 為 cancelled）。
+        回傳 (事件列表, nextSyncToken)；token 失效時拋出 SyncTokenExpired。
+        fields 需保留 nextPageToken、nextSyncToken 與 items 的 status。
+        """
+
+        service = self._get_service()
+        items = []
+        page_token = None
+
+        while True:
+            params = {
+                "calendarId": calendar_id,
+                "singleEvents": True,
+                "maxResults": SYNC_PAGE_SIZE,
+            }
+            if fields:
+                params["fields"] = fields
+            if sync_token:
+                params["syncToken"] = sync_token
+            if page_token:
+                params["pageToken"] = page_token
+
+            try:
+                request = service.events().list(**params)
+                request.headers["accept-encoding"] = "gzip"
+                response = request.execute()
+            except HttpError as e:
+                if e.resp.status == 410:
+                    raise SyncTokenExpired(str(e)) from e
+                raise
+
+            items.extend(response.get("items", []))
+            page_token = response.get("nextPageToken")
+            if not page_token:
+                return items, response.get("nextSyncToken")
+
+    # --------------------------
+    # 非同步介面（執行緒池）
+    # --------------------------
+    async def acreate_event(self, calendar_id, spec):
+        """非同步建立日曆事件"""
+        return await self._run_in_pool(self.create_event, calendar_id, spec)
+
+    async def acreate_events_batch(self, calendar_id, specs):
+        """非同步批次建立日曆事件"""
+        return await self._run_in_pool(self.create_events_batch, calendar_id, specs)
+
+    async def alist_events(self, calendar_id, max_results=10, fields=EVENT_LIST_FIELDS):
+        """非同步列出近期事件"""
+        return await self._run_in_pool(self.list_events, calendar_id, max_results, fields)
+
+    async def afetch_changes(self, calendar_id, sync_token=None, fields=SYNC_FIELDS):
+        """非同步取得事件變更"""
+        return await self._run_in_pool(self.fetch_changes, calendar_id, sync_token, fields)
+
+    async def alist_events_range(self, calendar_id, time_min, time_max, fields=EVENT_LIST_FIELDS):
+        """非同步列出時段內的所有事件"""
+        return await self._run_in_pool(self.list_events_range, calendar_id, time_min, time_max, fields)
 
-        return results.get("items", [])
+    async def afind_free_slots(self, time_range, duration_minutes=60, calendars=None):
+        """非同步查詢空閒時段"""
+        return await self._run_in_pool(self.find_free_slots, time_range, duration_minutes, calendars)
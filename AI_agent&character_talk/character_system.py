@@ -1,10 +1,23 @@
+import asyncio
 import json
 import os
 import uuid
 import shutil
+from collections import ChainMap
+from contextlib import asynccontextmanager
 from typing import Dict, List, Any, Optional
 from dataclasses import dataclass, asdict, field
 import datetime as dt
+from session_store import SessionStore, SessionKey, make_session_key
+from llm_scheduler import PRIORITY_CHAT, estimate_tokens
+from content_store import ContentStore, LazyRecords, PrefixedView
+from content_manifest import ContentManifest, ManifestRecords
+from content_writer import ContentWriter
+from binding_journal import BindingJournal
+
+# 自定義內容的儲存方式：json（custom/ 下每個項目一個檔案）或 sqlite（單一資料庫）
+CONTENT_BACKEND_JSON = "json"
+CONTENT_BACKEND_SQLITE = "sqlite"
 
 @dataclass
 class CharacterTrait:
@@ -106,79 +119,70 @@ class StoryEvent:
 class CustomizationManager:
     """自定義管理系統"""
     
-    def __init__(self):
-        self.custom_characters = {}
-        self.custom_scenes = {}
-        self.custom_events = {}
-        self.custom_backgrounds = {}  # 保留背景故事記憶，但不保存檔案
+    def __init__(self, backend: str = CONTENT_BACKEND_JSON, db_path: str = "custom/content.db",
+                 cache_size: int = 256):
+        self.backend = backend
+        self.db_path = db_path
+        self.cache_size = cache_size
+        self.store = None
+        self.manifest = None
+        self.writer = None
+        self.custom_backgrounds = {}  # 背景故事（記憶中；設定日誌時變更會寫入 BindingJournal）
+        self.journal = None
         
         self._ensure_directories()
-        self._load_custom_content()
+        if backend == CONTENT_BACKEND_SQLITE:
+            # 第一次啟動時匯入既有的 custom/*.json；之後只讀主鍵，內容用到才解析
+            self.store = ContentStore(db_path)
+            self.store.migrate_json_tree('custom')
+            self.custom_characters = LazyRecords(self.store, "characters", CharacterTrait)
+            self.custom_scenes = LazyRecords(self.store, "scenes", SceneSetting)
+            self.custom_events = LazyRecords(self.store, "events", StoryEvent)
+            print(f"✅ 自定義內容資料庫已開啟: {len(self.custom_characters)} 個角色、"
+                  f"{len(self.custom_scenes)} 個場景、{len(self.custom_events)} 個事件")
+            print("✅ 背景故事系統初始化完成（記憶中）")
+        else:
+            # 只讀清單（名稱 → 檔案與摘要）；完整物件第一次使用時才讀檔，並以 LRU 限制數量
+            # 檔案與清單都交給背景執行緒寫出，指令處理不必等待磁碟
+            self.writer = ContentWriter()
+            self.manifest = ContentManifest('custom', writer=self.writer)
+            parsed = self.manifest.load()
+            self.custom_characters = ManifestRecords(self.manifest, "characters", CharacterTrait, cache_size)
+            self.custom_scenes = ManifestRecords(self.manifest, "scenes", SceneSetting, cache_size)
+            self.custom_events = ManifestRecords(self.manifest, "events", StoryEvent, cache_size)
+            print(f"✅ 自定義內容清單: {len(self.custom_characters)} 個角色、"
+                  f"{len(self.custom_scenes)} 個場景、{len(self.custom_events)} 個事件"
+                  f"（重新讀取 {sum(parsed.values())} 個檔案）")
+            # 背景故事由 VirtualSandboxSociety 從綁定日誌還原
+            print("✅ 背景故事系統初始化完成（記憶中）")
+    
+    def close(self):
+        """寫出尚未落盤的內容並關閉資料庫連線"""
+        if self.writer is not None:
+            self.writer.close()
+        if self.store is not None:
+            self.store.close()
+            self.store = None
+    
+    def _write_file(self, kind: str, filename: str, data: Dict):
+        """排入背景寫入（暫存檔 + fsync + rename）；清單先記錄為寫入中，寫完再補上 mtime"""
+        basename = os.path.basename(filename)
+        key, entry = self.manifest.update(kind, basename, data, pending=True)
+        self.writer.write(filename, data, on_done=lambda stat: self.manifest.touch(kind, key, entry, stat))
     
     def _ensure_directories(self):
         directories = ['custom/characters', 'custom/scenes', 'custom/events']
         for directory in directories:
             os.makedirs(directory, exist_ok=True)
     
-    def _load_custom_content(self):
-        self._load_custom_characters()
-        self._load_custom_scenes()
-        self._load_custom_events()
-        
-        # 背景故事不從檔案載入，僅在記憶中
-        print("✅ 背景故事系統初始化完成（記憶中）")
-    
-    def _load_custom_characters(self):
-        """載入自定義角色"""
-        character_dir = 'custom/characters'
-        if os.path.exists(character_dir):
-            for filename in os.listdir(character_dir):
-                if filename.endswith('.json'):
-                    try:
-                        with open(os.path.join(character_dir, filename), 'r', encoding='utf-8') as f:
-                            data = json.load(f)
-                            character = CharacterTrait(**data)
-                            self.custom_characters[character.name] = character
-                            print(f"✅ 載入自定義角色: {character.name}")
-                    except Exception as e:
-                        print(f"❌ 載入角色 {filename} 失敗: {e}")
-    
-    def _load_custom_scenes(self):
-        """載入自定義場景"""
-        scene_dir = 'custom/scenes'
-        if os.path.exists(scene_dir):
-            for filename in os.listdir(scene_dir):
-                if filename.endswith('.json'):
-                    try:
-                        with open(os.path.join(scene_dir, filename), 'r', encoding='utf-8') as f:
-                            data = json.load(f)
-                            scene = SceneSetting(**data)
-                            self.custom_scenes[scene.name] = scene
-                            print(f"✅ 載入自定義場景: {scene.name}")
-                    except Exception as e:
-                        print(f"❌ 載入場景 {filename} 失敗: {e}")
-    
-    def _load_custom_events(self):
-        """載入自定義事件"""
-        event_dir = 'custom/events'
-        if os.path.exists(event_dir):
-            for filename in os.listdir(event_dir):
-                if filename.endswith('.json'):
-                    try:
-                        with open(os.path.join(event_dir, filename), 'r', encoding='utf-8') as f:
-                            data = json.load(f)
-                            event = StoryEvent(**data)
-                            self.custom_events[event.id] = event
-                            print(f"✅ 載入自定義事件: {event.title}")
-                    except Exception as e:
-                        print(f"❌ 載入事件 {filename} 失敗: {e}")
-    
     def save_custom_character(self, character: CharacterTrait) -> bool:
         """保存自定義角色"""
         try:
-            filename = f"custom/characters/{character.name.replace(' ', '_')}.json"
-            with open(filename, 'w', encoding='utf-8') as f:
-                json.dump(character.to_dict(), f, ensure_ascii=False, indent=2)
+            if self.store is not None:
+                self.store.put("characters", character.name, character.to_dict())
+            else:
+                filename = f"custom/characters/{character.name.replace(' ', '_')}.json"
+                self._write_file("characters", filename, character.to_dict())
             
             self.custom_characters[character.name] = character
             print(f"✅ 保存自定義角色: {character.name}")
@@ -190,9 +194,11 @@ class CustomizationManager:
     def save_custom_scene(self, scene: SceneSetting) -> bool:
         """保存自定義場景"""
         try:
-            filename = f"custom/scenes/{scene.name.replace(' ', '_')}.json"
-            with open(filename, 'w', encoding='utf-8') as f:
-                json.dump(scene.to_dict(), f, ensure_ascii=False, indent=2)
+            if self.store is not None:
+                self.store.put("scenes", scene.name, scene.to_dict())
+            else:
+                filename = f"custom/scenes/{scene.name.replace(' ', '_')}.json"
+                self._write_file("scenes", filename, scene.to_dict())
             
             self.custom_scenes[scene.name] = scene
             print(f"✅ 保存自定義場景: {scene.name}")
@@ -204,9 +210,11 @@ class CustomizationManager:
     def save_custom_event(self, event: StoryEvent) -> bool:
         """保存自定義事件"""
         try:
-            filename = f"custom/events/{event.id}.json"
-            with open(filename, 'w', encoding='utf-8') as f:
-                json.dump(event.to_dict(), f, ensure_ascii=False, indent=2)
+            if self.store is not None:
+                self.store.put("events", event.id, event.to_dict())
+            else:
+                filename = f"custom/events/{event.id}.json"
+                self._write_file("events", filename, event.to_dict())
             
             self.custom_events[event.id] = event
             print(f"✅ 保存自定義事件: {event.title}")
@@ -220,7 +228,7 @@ class CustomizationManager:
         try:
             background_id = background.get('id', str(uuid.uuid4())[:8])
             background['id'] = background_id
-            self.custom_backgrounds[background_id] = background
+            self._record_background({"op": "add_background", "background": background})
             print(f"✅ 添加自定義背景到記憶: {background.get('title', '未命名')}")
             return True
         except Exception as e:
@@ -231,8 +239,7 @@ class CustomizationManager:
         """刪除自定義角色"""
         try:
             filename = f"custom/characters/{character_name.replace(' ', '_')}.json"
-            if os.path.exists(filename):
-                os.remove(filename)
+            if self._delete_stored("characters", character_name, filename):
                 if character_name in self.custom_characters:
                     del self.custom_characters[character_name]
                 print(f"✅ 刪除自定義角色: {character_name}")
@@ -246,8 +253,7 @@ class CustomizationManager:
         """刪除自定義場景"""
         try:
             filename = f"custom/scenes/{scene_name.replace(' ', '_')}.json"
-            if os.path.exists(filename):
-                os.remove(filename)
+            if self._delete_stored("scenes", scene_name, filename):
                 if scene_name in self.custom_scenes:
                     del self.custom_scenes[scene_name]
                 print(f"✅ 刪除自定義場景: {scene_name}")
@@ -261,8 +267,7 @@ class CustomizationManager:
         """刪除自定義事件"""
         try:
             filename = f"custom/events/{event_id}.json"
-            if os.path.exists(filename):
-                os.remove(filename)
+            if self._delete_stored("events", event_id, filename):
                 if event_id in self.custom_events:
                     del self.custom_events[event_id]
                 print(f"✅ 刪除自定義事件: {event_id}")
@@ -272,6 +277,33 @@ class CustomizationManager:
             print(f"❌ 刪除事件失敗: {e}")
             return False
     
+    def apply_background_op(self, op: Dict):
+        """套用一筆背景故事變更（新增或日誌重播共用）"""
+        if op["op"] == "add_background":
+            self.custom_backgrounds[op["background"]["id"]] = op["background"]
+        elif op["op"] == "clear_backgrounds":
+            self.custom_backgrounds.clear()
+    
+    def _record_background(self, op: Dict):
+        self.apply_background_op(op)
+        if self.journal is not None:
+            self.journal.append(op)
+    
+    def _delete_stored(self, kind: str, key: str, filename: str) -> bool:
+        """從資料庫或檔案刪除一筆內容，回傳是否存在"""
+        if self.store is not None:
+            return self.store.delete(kind, key)
+        if key in self.manifest.entries[kind]:
+            # 清單記錄的實際檔名（手動放入的檔案不一定符合命名規則；也可能還在寫入佇列中）
+            filename = self.manifest.path_of(kind, key)
+        elif not os.path.exists(filename):
+            return False
+        # 刪除寫出前，熱重載不能把還在磁碟上的檔案當成新增的內容
+        basename = os.path.basename(filename)
+        self.manifest.mark_deleting(kind, basename)
+        self.writer.delete(filename, on_done=lambda: self.manifest.finish_deleting(kind, basename))
+        return True
+    
     def clear_all_custom_content(self) -> Dict[str, int]:
         """清除所有自定義內容"""
         results = {
@@ -283,25 +315,19 @@ class CustomizationManager:
         try:
             # 清空記憶中的背景故事
             results["backgrounds_cleared"] = len(self.custom_backgrounds)
-            self.custom_backgrounds.clear()
+            self._record_background({"op": "clear_backgrounds"})
             print(f"✅ 清空記憶中的背景故事: {results['backgrounds_cleared']}個")
             
-            # 清空自定義角色檔案
-            character_dir = 'custom/characters'
-            if os.path.exists(character_dir):
-                files = [f for f in os.listdir(character_dir) if f.endswith('.json')]
-                results["characters_cleared"] = len(files)
-                for filename in files:
-                    os.remove(os.path.join(character_dir, filename))
+            if self.store is not None:
+                results["characters_cleared"] = self.store.clear("characters")
+                results["scenes_cleared"] = self.store.clear("scenes")
+                print(f"✅ 清空自定義角色: {results['characters_cleared']}個、"
+                      f"場景: {results['scenes_cleared']}個")
+            else:
+                # 清空自定義角色與場景檔案：排入背景刪除（佇列中還沒寫出的儲存會被刪除取代）
+                results["characters_cleared"] = self._queue_delete_all("characters")
                 print(f"✅ 清空自定義角色檔案: {results['characters_cleared']}個")
-            
-            # 清空自定義場景檔案
-            scene_dir = 'custom/scenes'
-            if os.path.exists(scene_dir):
-                files = [f for f in os.listdir(scene_dir) if f.endswith('.json')]
-                results["scenes_cleared"] = len(files)
-                for filename in files:
-                    os.remove(os.path.join(scene_dir, filename))
+                results["scenes_cleared"] = self._queue_delete_all("scenes")
                 print(f"✅ 清空自定義場景檔案: {results['scenes_cleared']}個")
             
             # 清空記憶中的自定義內容
@@ -315,20 +341,37 @@ class CustomizationManager:
             print(f"❌ 清除自定義內容失敗: {e}")
             return results
     
+    def _queue_delete_all(self, kind: str) -> int:
+        """把某種類的所有檔案排入背景刪除，回傳檔案數"""
+        directory = os.path.join('custom', kind)
+        filenames = {entry["file"] for entry in self.manifest.entries[kind].values()}
+        if os.path.isdir(directory):
+            filenames.update(f for f in os.listdir(directory) if f.endswith('.json'))
+        
+        for filename in filenames:
+            self.manifest.mark_deleting(kind, filename)
+            self.writer.delete(os.path.join(directory, filename),
+                               on_done=lambda filename=filename: self.manifest.finish_deleting(kind, filename))
+        return len(filenames)
+    
     def get_all_custom_characters(self) -> Dict[str, CharacterTrait]:
-        """獲取所有自定義角色"""
-        return self.custom_characters.copy()
+        """獲取所有自定義角色（延遲載入的字典，取值時才建立物件）"""
+        return self.custom_characters
     
     def get_all_custom_scenes(self) -> Dict[str, SceneSetting]:
-        """獲取所有自定義場景"""
-        return self.custom_scenes.copy()
+        """獲取所有自定義場景（延遲載入的字典，取值時才建立物件）"""
+        return self.custom_scenes
+    
+    def get_custom_summaries(self, kind: str) -> Dict[str, Dict]:
+        """列表用的摘要欄位（characters / scenes / events），不載入完整物件"""
+        return getattr(self, f"custom_{kind}").summaries()
     
     def get_all_custom_backgrounds(self) -> Dict[str, Dict]:
         """獲取所有自定義背景"""
         return self.custom_backgrounds.copy()
 
 class CharacterBackground:
-    """角色背景故事綁定（記憶中）"""
+    """角色背景故事綁定"""
     
     def __init__(self, character_name: str):
         self.character_name = character_name
@@ -434,7 +477,7 @@ class CharacterBackground:
         return enhanced_prompt
     
     def to_dict(self) -> Dict:
-        """轉換為字典（僅用於記憶，不保存檔案）"""
+        """轉換為字典（綁定日誌的快照使用）"""
         return {
             "character_name": self.character_name,
             "stories": self.stories,
@@ -467,42 +510,99 @@ class CharacterBackground:
         return background
 
 class CharacterBindingSystem:
-    """角色綁定系統（記憶中，無檔案儲存）"""
+    """角色綁定系統（記憶中；設定日誌時每次變更都會寫入 BindingJournal）"""
+    
+    # 由這個類別處理的日誌變更
+    JOURNAL_OPS = ("bind_story", "bind_event", "add_development",
+                   "clear_all", "clear_character", "remove_story")
     
-    def __init__(self):
+    def __init__(self, journal: Optional[BindingJournal] = None):
         self.character_backgrounds = {}  # {character_name: CharacterBackground}
+        self.journal = journal
         print("✅ 角色綁定系統初始化完成（記憶中）")
     
-    def bind_background_to_character(self, character_name: str, background_data: Dict) -> str:
-        """綁定背景故事到角色（僅記憶中）"""
-        if character_name not in self.character_backgrounds:
-            self.character_backgrounds[character_name] = CharacterBackground(character_name)
+    def _record(self, op: Dict):
+        """套用變更並寫入日誌"""
+        self.apply(op)
+        if self.journal is not None:
+            self.journal.append(op)
+    
+    def apply(self, op: Dict):
+        """套用一筆變更（即時操作與日誌重播共用）"""
+        kind = op["op"]
+        if kind == "clear_all":
+            for background in self.character_backgrounds.values():
+                background.clear_all_background_data()
+            return
         
-        story_id = self.character_backgrounds[character_name].add_story(
-            background_data.get("title", "未命名背景"),
-            background_data.get("content", ""),
-            background_data.get("id")
-        )
+        character_name = op["character"]
+        background = self.character_backgrounds.get(character_name)
+        if kind == "clear_character":
+            if background:
+                background.clear_all_background_data()
+            return
+        if kind == "remove_story":
+            if background:
+                for i, story in enumerate(background.stories):
+                    if story["id"] == op["story_id"]:
+                        background.stories.pop(i)
+                        break
+            return
         
-        print(f"✅ 背景故事綁定完成（記憶中）: {character_name} -> {background_data.get('title', '未命名')}")
-        return story_id
+        if background is None:
+            background = self.character_backgrounds[character_name] = CharacterBackground(character_name)
+        if kind == "bind_story":
+            background.stories.append(op["story"])
+        elif kind == "bind_event":
+            background.personal_events.append({
+                "event": StoryEvent(**op["event"]),
+                "added_at": op["added_at"]
+            })
+        elif kind == "add_development":
+            background.character_arc.append(op["arc"])
     
-    def bind_event_to_character(self, character_name: str, event: StoryEvent) -> bool:
-        """綁定事件到角色（僅記憶中）"""
-        if character_name not in self.character_backgrounds:
-            self.character_backgrounds[character_name] = CharacterBackground(character_name)
+    def to_dict(self) -> Dict:
+        """所有角色背景（快照用）"""
+        return {name: background.to_dict() for name, background in self.character_backgrounds.items()}
+    
+    def restore(self, data: Dict):
+        """從快照還原"""
+        self.character_backgrounds = {
+            name: CharacterBackground.from_dict(background) for name, background in data.items()
+        }
+    
+    def bind_background_to_character(self, character_name: str, background_data: Dict) -> str:
+        """綁定背景故事到角色"""
+        story = {
+            "id": background_data.get("id") or str(uuid.uuid4())[:8],
+            "title": background_data.get("title", "未命名背景"),
+            "content": background_data.get("content", ""),
+            "added_at": dt.datetime.now().isoformat()
+        }
+        self._record({"op": "bind_story", "character": character_name, "story": story})
         
-        self.character_backgrounds[character_name].add_event(event)
-        print(f"✅ 事件綁定完成（記憶中）: {character_name} -> {event.title}")
+        print(f"✅ 背景故事綁定完成: {character_name} -> {background_data.get('title', '未命名')}")
+        return story["id"]
+    
+    def bind_event_to_character(self, character_name: str, event: StoryEvent) -> bool:
+        """綁定事件到角色"""
+        self._record({
+            "op": "bind_event",
+            "character": character_name,
+            "event": event.to_dict(),
+            "added_at": dt.datetime.now().isoformat()
+        })
+        print(f"✅ 事件綁定完成: {character_name} -> {event.title}")
         return True
     
     def add_character_development(self, character_name: str, development: str) -> bool:
-        """添加角色發展（僅記憶中）"""
-        if character_name not in self.character_backgrounds:
-            self.character_backgrounds[character_name] = CharacterBackground(character_name)
-        
-        self.character_backgrounds[character_name].add_to_character_arc(development)
-        print(f"✅ 角色發展記錄完成（記憶中）: {character_name}")
+        """添加角色發展"""
+        self._record({
+            "op": "add_development",
+            "character": character_name,
+            "arc": {"development": development, "timestamp": dt.datetime.now().isoformat()}
+        })
+        print(f"✅ 角色發展記錄完成: {character_name}")
         return True
     
     def clear_all_backgrounds(self) -> Dict[str, int]:
@@ -515,19 +615,25 @@ class CharacterBindingSystem:
         }
         
         for character_name, background in self.character_backgrounds.items():
-            cleared_data = background.clear_all_background_data()
             results["characters_cleared"] += 1
-            results["stories_cleared"] += cleared_data["stories_cleared"]
-            results["events_cleared"] += cleared_data["events_cleared"]
-            results["arc_cleared"] += cleared_data["arc_cleared"]
+            results["stories_cleared"] += len(background.stories)
+            results["events_cleared"] += len(background.personal_events)
+            results["arc_cleared"] += len(background.character_arc)
             print(f"✅ 清除角色背景資料: {character_name}")
         
+        self._record({"op": "clear_all"})
         return results
     
     def clear_character_background(self, character_name: str) -> Dict[str, int]:
         """清除特定角色的背景資料"""
         if character_name in self.character_backgrounds:
-            cleared_data = self.character_backgrounds[character_name].clear_all_background_data()
+            background = self.character_backgrounds[character_name]
+            cleared_data = {
+                "stories_cleared": len(background.stories),
+                "events_cleared": len(background.personal_events),
+                "arc_cleared": len(background.character_arc)
+            }
+            self._record({"op": "clear_character", "character": character_name})
             print(f"✅ 清除角色背景資料: {character_name}")
             return {
                 "character_cleared": character_name,
@@ -541,7 +647,7 @@ class CharacterBindingSystem:
         }
     
     def get_character_background(self, character_name: str) -> Optional[CharacterBackground]:
-        """獲取角色背景（從記憶中）"""
+        """獲取角色背景"""
         return self.character_backgrounds.get(character_name)
     
     def get_characters_with_backgrounds(self) -> List[str]:
@@ -553,11 +659,10 @@ class CharacterBindingSystem:
         if character_name in self.character_backgrounds:
             backgrounds = self.character_backgrounds[character_name]
             # 找到並移除指定ID的故事
-            for i, story in enumerate(backgrounds.stories):
-                if story["id"] == story_id:
-                    backgrounds.stories.pop(i)
-                    print(f"✅ 移除背景故事: {character_name} -> {story_id}")
-                    return True
+            if any(story["id"] == story_id for story in backgrounds.stories):
+                self._record({"op": "remove_story", "character": character_name, "story_id": story_id})
+                print(f"✅ 移除背景故事: {character_name} -> {story_id}")
+                return True
         return False
     
     def get_enhanced_prompt_for_character(self, character_name: str) -> str:
@@ -570,11 +675,27 @@ class CharacterBindingSystem:
 class VirtualSandboxSociety:
     """模擬系統 - 完整自定義版本"""
     
-    def __init__(self, groq_client):
+    def __init__(self, groq_client, async_groq_client=None, max_concurrency: int = 4,
+                 scheduler=None, content_backend: str = CONTENT_BACKEND_JSON,
+                 content_db_path: str = "custom/content.db", content_cache_size: int = 256,
+                 journal_dir: Optional[str] = "custom/state", journal_compact_every: int = 500):
         self.groq_client = groq_client
-        self.customization = CustomizationManager()
+        # 非同步客戶端（AsyncGroq），供 Discord 事件迴圈使用
+        self.async_groq_client = async_groq_client
+        # 全域 LLM 排程器（LLMScheduler）；未提供時使用本地並發限制
+        self.scheduler = scheduler
+        # 同時進行的生成請求上限
+        self.max_concurrency = max(1, max_concurrency)
+        self._generation_semaphore = None
+        self.customization = CustomizationManager(content_backend, content_db_path, content_cache_size)
         self.binding_system = CharacterBindingSystem()
         
+        # 綁定與背景故事的持久化日誌（journal_dir 為空時只保留在記憶中）
+        self.journal_dir = journal_dir
+        self.journal_compact_every = journal_compact_every
+        self.journal = None
+        self._open_journal()
+        
         # 合併預設和自定義角色
         self.characters = self._merge_characters()
         
@@ -585,9 +706,51 @@ class VirtualSandboxSociety:
         self.current_scene = self.scenes.get("虛擬對話空間", 
             SceneSetting(name="虛擬對話空間", location="虛擬空間", atmosphere="中性", time_period="現代"))
         
-        self.conversation_history = []
+        # 每個 (伺服器, 頻道, 用戶, 角色) 各自的對話紀錄
+        self.sessions = SessionStore()
         self.active_events = {}
     
+    def _open_journal(self):
+        """讀取快照並重播日誌，之後的變更都寫入日誌"""
+        if not self.journal_dir:
+            return
+        
+        journal = BindingJournal(self.journal_dir, self.journal_compact_every)
+        state, ops = journal.load()
+        self.binding_system.restore(state.get("character_backgrounds", {}))
+        self.customization.custom_backgrounds = dict(state.get("custom_backgrounds", {}))
+        for op in ops:
+            if op["op"] in CharacterBindingSystem.JOURNAL_OPS:
+                self.binding_system.apply(op)
+            else:
+                self.customization.apply_background_op(op)
+        
+        journal.snapshot = self._journal_snapshot
+        self.binding_system.journal = journal
+        self.customization.journal = journal
+        self.journal = journal
+        
+        if ops:
+            # 啟動時就壓縮，下次重播只需要讀快照
+            journal.compact()
+        if self.binding_system.character_backgrounds or self.customization.custom_backgrounds:
+            print(f"✅ 已還原角色綁定: {len(self.binding_system.character_backgrounds)} 個角色、"
+                  f"{len(self.customization.custom_backgrounds)} 個背景故事（重播 {len(ops)} 筆變更）")
+    
+    def _journal_snapshot(self) -> Dict:
+        return {
+            "character_backgrounds": self.binding_system.to_dict(),
+            "custom_backgrounds": self.customization.custom_backgrounds,
+        }
+    
+    def close(self):
+        """寫出尚未落盤的內容並關閉日誌"""
+        if self.journal is not None:
+            self.journal.compact()
+            self.journal.close()
+            self.journal = None
+        self.customization.close()
+    
     def _merge_characters(self) -> Dict[str, CharacterTrait]:
         """合併預設和自定義角色"""
         characters = {}
@@ -633,12 +796,9 @@ class VirtualSandboxSociety:
         for key, character in default_characters.items():
             characters[key] = character
         
-        # 添加自定義角色
-        custom_chars = self.customization.get_all_custom_characters()
-        for name, character in custom_chars.items():
-            characters[f"custom_{name}"] = character
-        
-        return characters
+        # 自定義角色以 custom_ 前綴接在預設角色之後（不逐一複製，內容用到才載入）
+        # ChainMap 從最後一個字典開始迭代：預設角色放最後才會先列出；新增的角色寫入最前面的字典
+        return ChainMap({}, PrefixedView(self.customization.custom_characters, "custom_"), characters)
     
     def _merge_scenes(self) -> Dict[str, SceneSetting]:
         """合併預設和自定義場景"""
@@ -680,12 +840,8 @@ class VirtualSandboxSociety:
         for name, scene in default_scenes.items():
             scenes[name] = scene
         
-        # 添加自定義場景
-        custom_scenes = self.customization.get_all_custom_scenes()
-        for name, scene in custom_scenes.items():
-            scenes[name] = scene
-        
-        return scenes
+        # 自定義場景優先（同名時覆蓋預設場景）；新增的場景寫入最前面的字典
+        return ChainMap({}, self.customization.custom_scenes, scenes)
     
     def setup_scene(self, scene_name: str = None):
         """設定場景"""
@@ -724,8 +880,7 @@ class VirtualSandboxSociety:
         try:
             if reset_type == "soft":
                 # 軟重置：僅清除記憶中的資料
-                results["details"]["conversation_history"] = len(self.conversation_history)
-                self.conversation_history.clear()
+                results["details"]["conversation_history"] = self.sessions.clear()
                 
                 results["details"]["active_events"] = len(self.active_events)
                 self.active_events.clear()
@@ -739,10 +894,9 @@ class VirtualSandboxSociety:
             elif reset_type == "hard":
                 # 硬重置：清除所有自定義內容
                 results["details"]["soft_reset"] = {
-                    "conversation_history": len(self.conversation_history),
+                    "conversation_history": self.sessions.clear(),
                     "active_events": len(self.active_events)
                 }
-                self.conversation_history.clear()
                 self.active_events.clear()
                 
                 # 清除綁定系統
@@ -762,17 +916,17 @@ class VirtualSandboxSociety:
             elif reset_type == "full":
                 # 完全重置：包含刪除整個 custom 目錄
                 results["details"]["soft_reset"] = {
-                    "conversation_history": len(self.conversation_history),
+                    "conversation_history": self.sessions.clear(),
                     "active_events": len(self.active_events)
                 }
-                self.conversation_history.clear()
                 self.active_events.clear()
                 
                 # 清除綁定系統
                 bg_results = self.binding_system.clear_all_backgrounds()
                 results["details"]["backgrounds"] = bg_results
                 
-                # 刪除整個 custom 目錄
+                # 刪除整個 custom 目錄（先關閉其中的資料庫與日誌）
+                self.close()
                 if os.path.exists('custom'):
                     shutil.rmtree('custom')
                     results["details"]["custom_directory"] = "已刪除"
@@ -849,13 +1003,18 @@ class VirtualSandboxSociety:
                     )
                 }
                 
-                # 重置角色和場景
-                self.characters = default_characters
-                self.scenes = default_scenes
-                self.current_scene = self.scenes["虛擬對話空間"]
-                
                 # 重置自定義管理器
-                self.customization = CustomizationManager()
+                self.customization = CustomizationManager(
+                    self.customization.backend, self.customization.db_path, self.customization.cache_size
+                )
+                self.binding_system = CharacterBindingSystem()
+                self._open_journal()
+                
+                # 重置角色和場景（之後新增的自定義內容仍由管理器提供）
+                self.characters = ChainMap({}, PrefixedView(self.customization.custom_characters, "custom_"),
+                                           default_characters)
+                self.scenes = ChainMap({}, self.customization.custom_scenes, default_scenes)
+                self.current_scene = self.scenes["虛擬對話空間"]
                 
                 print("✅ 完全重置完成：系統恢復到出廠狀態")
             else:
@@ -875,18 +1034,152 @@ class VirtualSandboxSociety:
             results["error"] = str(e)
             return results
     
-    def generate_role_response(self, role_key: str, user_input: str) -> str:
+    def generate_role_response(self, role_key: str, user_input: str,
+                               session_key: Optional[SessionKey] = None) -> str:
         """生成角色回應（整合增強提示詞）"""
         if role_key not in self.characters:
             return "抱歉，我不認識這個角色。"
         
         character = self.characters[role_key]
+        session_key = session_key or make_session_key(None, None, None, role_key)
+        messages = self._build_role_messages(character, user_input, session_key)
+        
+        try:
+            response = self.groq_client.chat.completions.create(
+                messages=messages,
+                model="llama-3.1-8b-instant",
+                temperature=0.7,
+                max_tokens=300
+            )
+            
+            response_text = response.choices[0].message.content.strip()
+            self._record_exchange(session_key, character, user_input, response_text)
+            return response_text
+            
+        except Exception as e:
+            print(f"❌ 生成回應失敗: {e}")
+            return f"抱歉，我暫時無法回應。請稍後再試。"
+    
+    async def agenerate_role_response(self, role_key: str, user_input: str,
+                                      session_key: Optional[SessionKey] = None) -> str:
+        """非同步生成角色回應（不阻塞事件迴圈，受並發上限控制）"""
+        if role_key not in self.characters:
+            return "抱歉，我不認識這個角色。"
+        
+        character = self.characters[role_key]
+        session_key = session_key or make_session_key(None, None, None, role_key)
+        messages = self._build_role_messages(character, user_input, session_key)
+        
+        try:
+            async with self._generation_slot(session_key, messages) as usage:
+                if self.async_groq_client is not None:
+                    response = await self.async_groq_client.chat.completions.create(
+                        messages=messages,
+                        model="llama-3.1-8b-instant",
+                        temperature=0.7,
+                        max_tokens=300
+                    )
+                else:
+                    # 沒有非同步客戶端時，改在執行緒中呼叫同步客戶端
+                    response = await asyncio.to_thread(
+                        self.groq_client.chat.completions.create,
+                        messages=messages,
+                        model="llama-3.1-8b-instant",
+                        temperature=0.7,
+                        max_tokens=300
+                    )
+                
+                # 以實際用量修正排程器的 token 額度
+                response_usage = getattr(response, "usage", None)
+                usage["actual_tokens"] = getattr(response_usage, "total_tokens", None)
+            
+            response_text = response.choices[0].message.content.strip()
+            self._record_exchange(session_key, character, user_input, response_text)
+            return response_text
+            
+        except Exception as e:
+            print(f"❌ 生成回應失敗: {e}")
+            return f"抱歉，我暫時無法回應。請稍後再試。"
+    
+    async def astream_role_response(self, role_key: str, user_input: str,
+                                    session_key: Optional[SessionKey] = None):
+        """串流生成角色回應，逐步產生目前為止的完整文字
+
+        完整回應結束後才寫入對話紀錄；沒有非同步客戶端時退回一次性生成。
+        已產生部分內容後才失敗時重新拋出例外，呼叫端不應把截斷的回應當成完整回覆。
+        """
+        if role_key not in self.characters:
+            yield "抱歉，我不認識這個角色。"
+            return
+        
+        if self.async_groq_client is None:
+            yield await self.agenerate_role_response(role_key, user_input, session_key)
+            return
+        
+        character = self.characters[role_key]
+        session_key = session_key or make_session_key(None, None, None, role_key)
+        messages = self._build_role_messages(character, user_input, session_key)
         
+        response_text = ""
+        try:
+            async with self._generation_slot(session_key, messages) as usage:
+                stream = await self.async_groq_client.chat.completions.create(
+                    messages=messages,
+                    model="llama-3.1-8b-instant",
+                    temperature=0.7,
+                    max_tokens=300,
+                    stream=True
+                )
+                
+                async for chunk in stream:
+                    if chunk.choices:
+                        delta = chunk.choices[0].delta.content
+                        if delta:
+                            response_text += delta
+                            yield response_text
+                    
+                    # 最後一個 chunk 會附上用量
+                    chunk_usage = getattr(getattr(chunk, "x_groq", None), "usage", None)
+                    if chunk_usage is not None:
+                        usage["actual_tokens"] = getattr(chunk_usage, "total_tokens", None)
+            
+            response_text = response_text.strip()
+            self._record_exchange(session_key, character, user_input, response_text)
+            yield response_text
+            
+        except Exception as e:
+            print(f"❌ 生成回應失敗: {e}")
+            if response_text:
+                # 已送出部分內容 → 交給呼叫端標示中斷，且不寫入對話紀錄
+                raise
+            yield f"抱歉，我暫時無法回應。請稍後再試。"
+    
+    @asynccontextmanager
+    async def _generation_slot(self, session_key: SessionKey, messages: List[Dict[str, str]]):
+        """取得生成許可（有排程器時經由排程器排隊，否則使用本地並發限制）"""
+        if self.scheduler is not None:
+            estimated = estimate_tokens("".join(m["content"] for m in messages), 300)
+            tenant = (session_key[0], session_key[2])
+            async with self.scheduler.slot(PRIORITY_CHAT, tenant, estimated) as usage:
+                yield usage
+        else:
+            async with self._get_generation_semaphore():
+                yield {"actual_tokens": None}
+    
+    def _get_generation_semaphore(self) -> asyncio.Semaphore:
+        """取得生成並發限制（延遲建立，確保綁定到執行中的事件迴圈）"""
+        if self._generation_semaphore is None:
+            self._generation_semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._generation_semaphore
+    
+    def _build_role_messages(self, character: CharacterTrait, user_input: str,
+                             session_key: SessionKey) -> List[Dict[str, str]]:
+        """構建送給模型的訊息"""
         # 構建完整的系統提示（包含綁定的背景故事）
         system_prompt = self._build_enhanced_system_prompt(character)
         
         # 格式化對話歷史
-        history_text = self._format_conversation_history()
+        history_text = self._format_conversation_history(session_key)
         
         # 完整提示
         full_prompt = f"""{system_prompt}
@@ -899,45 +1192,30 @@ class VirtualSandboxSociety:
 
 請以{character.profession}的身份回應，保持角色一致性:"""
         
-        try:
-            response = self.groq_client.chat.completions.create(
-                messages=[
-                    {"role": "system", "content": full_prompt},
-                    {"role": "user", "content": user_input}
-                ],
-                model="llama-3.1-8b-instant",
-                temperature=0.7,
-                max_tokens=300
-            )
-            
-            response_text = response.choices[0].message.content.strip()
-            
-            # 記錄對話
-            self.conversation_history.append({
-                "role": "user",
-                "content": user_input,
-                "timestamp": dt.datetime.now().isoformat(),
-                "character": character.name,
-                "scene": self.current_scene.name
-            })
-            
-            self.conversation_history.append({
-                "role": "character",
-                "content": response_text,
-                "timestamp": dt.datetime.now().isoformat(),
-                "character": character.name,
-                "scene": self.current_scene.name
-            })
-            
-            # 限制歷史長度
-            if len(self.conversation_history) > 20:
-                self.conversation_history = self.conversation_history[-20:]
-            
-            return response_text
-            
-        except Exception as e:
-            print(f"❌ 生成回應失敗: {e}")
-            return f"抱歉，我暫時無法回應。請稍後再試。"
+        return [
+            {"role": "system", "content": full_prompt},
+            {"role": "user", "content": user_input}
+        ]
+    
+    def _record_exchange(self, session_key: SessionKey, character: CharacterTrait,
+                         user_input: str, response_text: str):
+        """記錄一輪對話到該對話的環狀緩衝（容量固定，自動丟棄舊紀錄）"""
+        session = self.sessions.get(session_key)
+        session.append({
+            "role": "user",
+            "content": user_input,
+            "timestamp": dt.datetime.now().isoformat(),
+            "character": character.name,
+            "scene": self.current_scene.name
+        })
+        
+        session.append({
+            "role": "character",
+            "content": response_text,
+            "timestamp": dt.datetime.now().isoformat(),
+            "character": character.name,
+            "scene": self.current_scene.name
+        })
     
     def _build_enhanced_system_prompt(self, character: CharacterTrait) -> str:
         """構建增強系統提示（包含綁定的背景故事）"""
@@ -966,13 +1244,14 @@ class VirtualSandboxSociety:
         
         return base_prompt
     
-    def _format_conversation_history(self) -> str:
-        """格式化對話歷史"""
-        if not self.conversation_history:
+    def _format_conversation_history(self, session_key: SessionKey) -> str:
+        """格式化對話歷史（僅限同一個對話）"""
+        recent_entries = self.sessions.recent(session_key, 5)
+        if not recent_entries:
             return "這是對話的開始。"
         
         history_text = "之前的對話:\n"
-        for entry in self.conversation_history[-5:]:
+        for entry in recent_entries:
             role = "用戶" if entry["role"] == "user" else "角色"
             history_text += f"{role}: {entry['content']}\n"
         
@@ -1006,7 +1285,7 @@ class VirtualSandboxSociety:
             return None
     
     def create_custom_background(self, title: str, content: str, character_name: str = "") -> Dict:
-        """創建自定義背景故事（僅記憶中）"""
+        """創建自定義背景故事"""
         try:
             background = {
                 "id": str(uuid.uuid4())[:8],
@@ -1015,7 +1294,7 @@ class VirtualSandboxSociety:
                 "character_name": character_name,
                 "created_at": dt.datetime.now().isoformat()
             }
-            # 直接添加到記憶中，不保存檔案
+            # 添加到記憶中（有綁定日誌時同時寫入日誌）
             self.customization.add_custom_background(background)
             return background
         except Exception as e:
@@ -1030,6 +1309,67 @@ class VirtualSandboxSociety:
         """獲取所有場景（包含自定義）"""
         return self.scenes
     
+    def apply_custom_changes(self, changes: Dict[str, tuple]) -> Dict[str, int]:
+        """套用 custom/ 目錄的變更（ContentManifest.diff() 的結果），只處理有變化的項目
+        
+        自定義角色與場景是透過清單延遲載入的，所以只需要更新清單、丟棄快取，
+        並移除本次執行中建立、會遮住新內容的舊物件。
+        """
+        applied = {}
+        for kind, (entries, updated, removed) in changes.items():
+            self.customization.manifest.replace(kind, entries)
+            records = getattr(self.customization, f"custom_{kind}")
+            changed = set(updated) | set(removed)
+            records.invalidate(changed)
+            
+            if kind == "characters" and isinstance(self.characters, ChainMap):
+                for name in changed:
+                    self.characters.maps[0].pop(f"custom_{name}", None)
+            elif kind == "scenes" and isinstance(self.scenes, ChainMap):
+                for name in changed:
+                    self.scenes.maps[0].pop(name, None)
+                # 目前場景被修改或刪除 → 重新取得
+                if self.current_scene.name in changed:
+                    self.current_scene = self.scenes.get(self.current_scene.name) or self.scenes.get("虛擬對話空間",
+                        SceneSetting(name="虛擬對話空間", location="虛擬空間", atmosphere="中性", time_period="現代"))
+            
+            applied[kind] = len(changed)
+        return applied
+    
+    def list_characters(self) -> List[Dict]:
+        """角色列表（key、名稱、職業、是否自定義）；自定義角色只讀摘要，不載入完整物件"""
+        summaries = self.customization.get_custom_summaries("characters")
+        listing = []
+        for key in self.characters:
+            name = key[len("custom_"):] if key.startswith("custom_") else None
+            if name in summaries:
+                listing.append({"key": key, "name": name,
+                                "profession": summaries[name].get("profession") or "", "custom": True})
+            else:
+                character = self.characters[key]
+                listing.append({"key": key, "name": character.name,
+                                "profession": character.profession, "custom": name is not None})
+        return listing
+    
+    def list_scenes(self) -> List[Dict]:
+        """場景列表（名稱、地點、是否自定義）；自定義場景只讀摘要"""
+        summaries = self.customization.get_custom_summaries("scenes")
+        listing = []
+        for name in self.scenes:
+            if name in summaries:
+                listing.append({"name": name, "location": summaries[name].get("location") or "", "custom": True})
+            else:
+                listing.append({"name": name, "location": self.scenes[name].location, "custom": False})
+        return listing
+    
+    def find_character_key(self, character_name: str) -> Optional[str]:
+        """依角色名稱找出 key（預設角色優先），不必載入所有自定義角色"""
+        for key in self.characters:
+            if not key.startswith("custom_") and self.characters[key].name == character_name:
+                return key
+        custom_key = f"custom_{character_name}"
+        return custom_key if custom_key in self.characters else None
+    
     def get_all_backgrounds(self) -> Dict[str, Dict]:
         """獲取所有背景故事（從記憶中）"""
         return self.customization.get_all_custom_backgrounds()
@@ -1039,9 +1379,7 @@ class VirtualSandboxSociety:
         success = self.customization.delete_custom_character(character_name)
         if success:
             # 從當前列表移除
-            custom_key = f"custom_{character_name}"
-            if custom_key in self.characters:
-                del self.characters[custom_key]
+            self.characters.pop(f"custom_{character_name}", None)
         return success
     
     def delete_custom_scene(self, scene_name: str) -> bool:
@@ -1049,16 +1387,15 @@ class VirtualSandboxSociety:
         success = self.customization.delete_custom_scene(scene_name)
         if success:
             # 從當前列表移除
-            if scene_name in self.scenes:
-                del self.scenes[scene_name]
+            self.scenes.pop(scene_name, None)
         return success
     
     def bind_background_to_character(self, character_name: str, background_data: Dict) -> str:
-        """綁定背景故事到角色（僅記憶中）"""
+        """綁定背景故事到角色"""
         return self.binding_system.bind_background_to_character(character_name, background_data)
     
     def bind_event_to_character(self, character_name: str, event_data: Dict) -> bool:
-        """綁定事件到角色（僅記憶中）"""
+        """綁定事件到角色"""
         try:
             event = StoryEvent(**event_data)
             return self.binding_system.bind_event_to_character(character_name, event)
@@ -1078,15 +1415,14 @@ class VirtualSandboxSociety:
         characters_with_bg = []
         for char_name in self.binding_system.get_characters_with_backgrounds():
             # 找到對應的角色對象
-            for key, char in self.characters.items():
-                if char.name == char_name:
-                    characters_with_bg.append({
-                        "character": char,
-                        "key": key,
-                        "background_count": len(self.binding_system.character_backgrounds[char_name].stories),
-                        "event_count": len(self.binding_system.character_backgrounds[char_name].personal_events)
-                    })
-                    break
+            key = self.find_character_key(char_name)
+            if key is not None:
+                characters_with_bg.append({
+                    "character": self.characters[key],
+                    "key": key,
+                    "background_count": len(self.binding_system.character_backgrounds[char_name].stories),
+                    "event_count": len(self.binding_system.character_backgrounds[char_name].personal_events)
+                })
         return characters_with_bg
     
     def _is_event_suitable_for_character(self, event: StoryEvent, character_name: str, background: CharacterBackground) -> bool:
@@ -1134,32 +1470,11 @@ class VirtualSandboxSociety:
         return basic_prompt
     
     def update_conversation_with_background(self, character_key: str, user_input: str, response: str):
-        """更新對話並記錄角色發展"""
+        """記錄角色發展（對話本身已由 generate_role_response 記錄到對話紀錄）"""
         character = self.characters.get(character_key)
         if not character:
             return
         
-        # 記錄對話
-        self.conversation_history.append({
-            "role": "user",
-            "content": user_input,
-            "timestamp": dt.datetime.now().isoformat(),
-            "character": character.name,
-            "scene": self.current_scene.name
-        })
-        
-        self.conversation_history.append({
-            "role": "character",
-            "content": response,
-            "timestamp": dt.datetime.now().isoformat(),
-            "character": character.name,
-            "scene": self.current_scene.name
-        })
-        
-        # 限制歷史長度
-        if len(self.conversation_history) > 20:
-            self.conversation_history = self.conversation_history[-20:]
-        
         # 檢查是否需要記錄角色發展（深層次對話）
         if len(user_input) > 50 and len(response) > 50:
             development = f"與用戶進行了深層次對話: {user_input[:30]}..."
@@ -1212,7 +1527,8 @@ if __name__ == "__main__":
     )
     
     # 添加對話歷史
-    society.conversation_history.append({
+    test_key = make_session_key(None, None, None, "executive")
+    society.sessions.append(test_key, {
         "role": "user",
         "content": "測試對話",
         "timestamp": dt.datetime.now().isoformat(),
@@ -1220,14 +1536,14 @@ if __name__ == "__main__":
         "scene": "辦公室"
     })
     
-    print(f"對話歷史長度: {len(society.conversation_history)}")
+    print(f"對話歷史長度: {society.sessions.total_entries()}")
     print(f"自定義角色數量: {len([c for c in society.characters.keys() if 'custom_' in c])}")
     
     print("\n3. 測試硬重置...")
     hard_result = society.initialize_system("hard")
     print(f"硬重置結果: {hard_result}")
     
-    print(f"重置後對話歷史長度: {len(society.conversation_history)}")
+    print(f"重置後對話歷史長度: {society.sessions.total_entries()}")
     print(f"重置後自定義角色數量: {len([c for c in society.characters.keys() if 'custom_' in c])}")
     
     print("\n✅ 初始化系統功能測試完成")
\ No newline at end of file
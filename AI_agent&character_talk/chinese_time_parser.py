@@ -0,0 +1,551 @@
+import re
+import datetime as dt
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import pytz
+
+# =========================
+# 1️⃣ 中文數字
+# =========================
+
+CHINESE_DIGITS = {
+    "零": 0, "〇": 0, "一": 1, "二": 2, "兩": 2, "两": 2, "三": 3, "四": 4,
+    "五": 5, "六": 6, "七": 7, "八": 8, "九": 9,
+}
+
+
+def chinese_to_int(text: str) -> Optional[int]:
+    """轉換阿拉伯數字或中文數字（支援到 99，及逐位年份如 二〇二五）"""
+    if not text:
+        return None
+    if text.isdigit():
+        return int(text)
+
+    if "十" not in text:
+        # 逐位讀法：二〇二五
+        value = 0
+        for char in text:
+            if char not in CHINESE_DIGITS:
+                return None
+            value = value * 10 + CHINESE_DIGITS[char]
+        return value
+
+    tens_text, _, ones_text = text.partition("十")
+    if tens_text and tens_text not in CHINESE_DIGITS:
+        return None
+    if ones_text and ones_text not in CHINESE_DIGITS:
+        return None
+
+    tens = CHINESE_DIGITS[tens_text] if tens_text else 1
+    ones = CHINESE_DIGITS[ones_text] if ones_text else 0
+    return tens * 10 + ones
+
+
+# =========================
+# 2️⃣ 文法規則
+# =========================
+
+NUM = r"(?:\d{1,2}|[零〇一二兩两三四五六七八九十]{1,3})"
+PERIOD = r"(?:凌晨|清晨|早上|早晨|上午|中午|下午|傍晚|晚上|今晚|夜晚|半夜|深夜)"
+CLOCK = rf"(?:\d{{1,2}}[:：]\d{{2}}|{NUM}[點点時时](?:半|一刻|三刻|{NUM}分?)?)"
+RANGE_SEP = r"(?:到|至|~|～|-|－|—)"
+
+ABSOLUTE_DATE_RE = re.compile(
+    rf"(?:(?P<year>\d{{4}}|[零〇一二三四五六七八九]{{4}})年)?"
+    rf"(?P<month>{NUM})月(?P<day>{NUM})[日號号]?"
+)
+SLASH_DATE_RE = re.compile(r"(?<![\d:：])(?P<month>\d{1,2})/(?P<day>\d{1,2})(?![\d:：])")
+WEEKDAY_RE = re.compile(r"(?P<prefix>下下|下|這|这|本|上)?個?(?:週|周|星期|禮拜|礼拜)(?P<day>[一二三四五六日天])")
+RELATIVE_DATE_RE = re.compile(r"大後天|大后天|今天|今日|明天|明日|後天|后天")
+
+TIME_RE = re.compile(
+    rf"(?P<p1>{PERIOD})?\s*(?P<c1>{CLOCK})"
+    rf"(?:\s*{RANGE_SEP}\s*(?P<p2>{PERIOD})?\s*(?P<c2>{CLOCK}))?"
+)
+# 寫在標題後面的結束時間：「3點開會到4點」
+RANGE_END_RE = re.compile(rf"{RANGE_SEP}\s*(?P<p2>{PERIOD})?\s*(?P<c2>{CLOCK})")
+CLOCK_RE = re.compile(CLOCK)
+PERIOD_RE = re.compile(PERIOD)
+CLOCK_PARTS_RE = re.compile(
+    rf"(?P<hour>{NUM})(?:[:：](?P<colon_min>\d{{2}})|[點点時时](?:(?P<half>半)|(?P<quarter>一刻)"
+    rf"|(?P<three_quarter>三刻)|(?P<minute>{NUM})分?)?)"
+)
+
+SEGMENT_SPLIT_RE = re.compile(r"[，,、；;。！!\n]+|然後|然后|接著|接着|之後|之后|再來|再来|隨後|随后|另外|還有|还有|以及")
+LEADING_WORDS_RE = re.compile(r"^(?:首先|其次|最後|最后|第[一二三四五六七八九十]個?|先)")
+FILLER_PREFIX_RE = re.compile(r"^(?:要|得|需要|必須|必须|會|会|去|有|想|準備|准备|打算|的|在)+")
+UNSUPPORTED_RE = re.compile(r"每天|每週|每周|每星期|每個|每月|每年|隔週|隔周|除了|不要|取消")
+
+RELATIVE_DAYS = {
+    "今天": 0, "今日": 0, "明天": 1, "明日": 1,
+    "後天": 2, "后天": 2, "大後天": 3, "大后天": 3,
+}
+WEEKDAYS = {"一": 0, "二": 1, "三": 2, "四": 3, "五": 4, "六": 5, "日": 6, "天": 6}
+WEEK_OFFSETS = {"上": -1, "這": 0, "这": 0, "本": 0, "下": 1, "下下": 2}
+
+# 只有時段、沒有鐘點時的預設時間
+PERIOD_DEFAULTS = {
+    "凌晨": ("05:00", "06:00"),
+    "清晨": ("06:00", "07:00"),
+    "早上": ("09:00", "11:00"),
+    "早晨": ("09:00", "11:00"),
+    "上午": ("09:00", "12:00"),
+    "中午": ("12:00", "13:00"),
+    "下午": ("14:00", "17:00"),
+    "傍晚": ("17:00", "19:00"),
+    "晚上": ("19:00", "21:00"),
+    "今晚": ("19:00", "21:00"),
+    "夜晚": ("19:00", "21:00"),
+    "半夜": ("23:00", "23:59"),
+    "深夜": ("23:00", "23:59"),
+}
+
+# 查詢空閒時段時，只有時段（「明天下午」）所涵蓋的範圍
+SEARCH_PERIODS = {
+    "早上": ("08:00", "12:00"),
+    "早晨": ("08:00", "12:00"),
+    "上午": ("08:00", "12:00"),
+    "中午": ("11:00", "14:00"),
+    "下午": ("12:00", "18:00"),
+    "傍晚": ("17:00", "19:00"),
+    "晚上": ("18:00", "23:00"),
+    "今晚": ("18:00", "23:00"),
+    "夜晚": ("18:00", "23:00"),
+}
+# 沒有指定時間時的查詢範圍
+SEARCH_DEFAULT_HOURS = ("09:00", "18:00")
+
+# 持續時間：「一小時」「90分鐘」「半小時」「1.5小時」
+# 只接受「分鐘」：單獨的「分」是鐘點的分（「兩點四十五分」）
+DURATION_RE = re.compile(
+    rf"(?P<half_hour>半個?(?:小時|鐘頭))"
+    rf"|(?P<hours>\d+(?:\.\d+)?|{NUM})個?半?(?:小時|鐘頭)(?P<plus_half>半)?"
+    rf"|(?P<minutes>\d+|{NUM})分鐘"
+)
+
+# 信心分數扣分
+PENALTY_DEFAULT_DATE = 0.85  # 沒有日期，自行推斷
+PENALTY_START_ONLY = 0.9  # 只有開始時間，套用預設長度
+PENALTY_PERIOD_ONLY = 0.8  # 只有時段
+PENALTY_AMBIGUOUS_HOUR = 0.6  # 鐘點沒有上下午（單獨扣分就低於 0.7 門檻，交給 LLM 判斷）
+PENALTY_LONG_TITLE = 0.85  # 標題偏長
+PENALTY_NO_TIME = 0.3  # 完全沒有時間
+PENALTY_BAD_TITLE = 0.2  # 沒有標題或標題過長
+PENALTY_INVALID = 0.1  # 日期不合法或結束早於開始
+PENALTY_UNSUPPORTED = 0.3  # 重複、否定等規則無法處理的語意
+PENALTY_MULTIPLE_DATES = 0.3  # 同一片段有多個日期（例如「週二和週四」）
+PENALTY_CLOCK_IN_TITLE = 0.5  # 標題裡還留有鐘點
+
+
+# =========================
+# 3️⃣ 解析結果
+# =========================
+
+@dataclass
+class ParsedEvent:
+    """規則解析出的事件"""
+    title: str  # 事件標題
+    date: str  # YYYY-MM-DD
+    start: str  # HH:MM
+    end: str  # HH:MM
+    confidence: float = 1.0  # 信心分數 0~1
+
+    def to_dict(self) -> Dict:
+        return {"title": self.title, "date": self.date, "start": self.start, "end": self.end}
+
+
+@dataclass
+class ParseResult:
+    """整段輸入的解析結果"""
+    events: List[ParsedEvent] = field(default_factory=list)
+
+    @property
+    def confidence(self) -> float:
+        """整體信心分數（取最低的事件）"""
+        if not self.events:
+            return 0.0
+        return min(event.confidence for event in self.events)
+
+
+@dataclass
+class _Segment:
+    """單一片段的中間結果"""
+    title: str = ""
+    date: Optional[dt.date] = None
+    start: Optional[Tuple[int, int]] = None
+    end: Optional[Tuple[int, int]] = None
+    confidence: float = 1.0
+    has_time: bool = False
+
+
+# =========================
+# 4️⃣ 規則解析器
+# =========================
+
+class ChineseScheduleParser:
+    """中文行程規則解析器（不需 LLM）
+
+    處理相對日期（今天、明天、後天）、星期（週一、下週三）、月日（12月25日、12/25）、
+    中文數字鐘點（三點、十點半）以及早上／下午／晚上等時段與時間範圍。
+    """
+
+    def __init__(self, timezone: str = "Asia/Taipei", default_duration_minutes: int = 60):
+        self.timezone = timezone
+        self.default_duration_minutes = default_duration_minutes
+
+    def parse(self, text: str, now: Optional[dt.datetime] = None) -> ParseResult:
+        """解析整段輸入（可能包含多個事件）"""
+        if now is None:
+            now = dt.datetime.now(pytz.timezone(self.timezone))
+
+        unsupported = UNSUPPORTED_RE.search(text) is not None
+
+        segments = [self._parse_segment(part, now.date()) for part in SEGMENT_SPLIT_RE.split(text)]
+        segments = self._merge_segments([s for s in segments if s is not None])
+
+        # 沒有日期的片段沿用前一個片段的日期
+        carry_date = None
+        for segment in segments:
+            if segment.date is not None:
+                carry_date = segment.date
+            elif carry_date is not None:
+                segment.date = carry_date
+
+        default_date = self._default_date(segments, now)
+
+        result = ParseResult()
+        for segment in segments:
+            event = self._finalize(segment, default_date)
+            if unsupported:
+                event.confidence *= PENALTY_UNSUPPORTED
+            result.events.append(event)
+
+        return result
+
+    def parse_range(self, text: str, now: Optional[dt.datetime] = None) -> Tuple[dt.datetime, dt.datetime]:
+        """解析查詢時段（「明天下午」「週五 14:00-18:00」），回傳有時區的 (開始, 結束)
+
+        沒有時間 → 09:00~18:00；只有開始時間 → 到 23:59；查詢今天時不早於現在。
+        """
+        tz = pytz.timezone(self.timezone)
+        if now is None:
+            now = dt.datetime.now(tz)
+
+        segment = self._parse_segment(text, now.date()) or _Segment()
+        date = segment.date or now.date()
+
+        period_match = PERIOD_RE.search(text)
+        if TIME_RE.search(text) is None and period_match and period_match.group(0) in SEARCH_PERIODS:
+            start, end = (_parse_hhmm(value) for value in SEARCH_PERIODS[period_match.group(0)])
+        elif segment.has_time and segment.start is not None:
+            start, end = segment.start, segment.end or (23, 59)
+        else:
+            start, end = (_parse_hhmm(value) for value in SEARCH_DEFAULT_HOURS)
+
+        if start[0] >= 24:
+            date += dt.timedelta(days=1)
+            start = (start[0] - 24, start[1])
+            end = (end[0] - 24, end[1]) if end[0] >= 24 else (23, 59)
+        elif end[0] >= 24:
+            end = (23, 59)
+
+        start_dt = tz.localize(dt.datetime.combine(date, dt.time(*start)))
+        end_dt = tz.localize(dt.datetime.combine(date, dt.time(*end)))
+        if date == now.date():
+            start_dt = max(start_dt, now.replace(second=0, microsecond=0))
+        return start_dt, end_dt
+
+    # --------------------------
+    # 片段解析
+    # --------------------------
+    def _parse_segment(self, text: str, today: dt.date) -> Optional[_Segment]:
+        text = text.strip()
+        if not text:
+            return None
+
+        segment = _Segment()
+        text = LEADING_WORDS_RE.sub("", text)
+
+        # 日期
+        text, segment.date, date_ok = self._extract_date(text, today)
+        if not date_ok:
+            segment.confidence *= PENALTY_INVALID
+        if self._has_date(text):
+            segment.confidence *= PENALTY_MULTIPLE_DATES
+
+        # 時間
+        period = None
+        time_match = TIME_RE.search(text)
+        if time_match:
+            segment.has_time = True
+            period = time_match.group("p1")
+            text = text[:time_match.start()] + text[time_match.end():]
+            end_match = None
+            if not time_match.group("c2"):
+                end_match = RANGE_END_RE.search(text)
+                if end_match:
+                    text = text[:end_match.start()] + text[end_match.end():]
+            self._apply_time(segment, time_match, end_match)
+        else:
+            period_match = PERIOD_RE.search(text)
+            if period_match:
+                segment.has_time = True
+                period = period_match.group(0)
+                segment.start = _parse_hhmm(PERIOD_DEFAULTS[period][0])
+                segment.end = _parse_hhmm(PERIOD_DEFAULTS[period][1])
+                segment.confidence *= PENALTY_PERIOD_ONLY
+                text = text[:period_match.start()] + text[period_match.end():]
+
+        # 「今晚」本身就帶有日期
+        if period == "今晚" and segment.date is None:
+            segment.date = today
+
+        segment.title = _clean_title(text)
+        if CLOCK_RE.search(segment.title):
+            segment.confidence *= PENALTY_CLOCK_IN_TITLE
+        return segment
+
+    def _extract_date(self, text: str, today: dt.date) -> Tuple[str, Optional[dt.date], bool]:
+        """取出日期，回傳 (剩餘文字, 日期, 是否合法)"""
+        match = ABSOLUTE_DATE_RE.search(text) or SLASH_DATE_RE.search(text)
+        if match:
+            month = chinese_to_int(match.group("month"))
+            day = chinese_to_int(match.group("day"))
+            year_text = match.groupdict().get("year")
+            year = chinese_to_int(year_text) if year_text else today.year
+            remaining = text[:match.start()] + text[match.end():]
+
+            try:
+                date = dt.date(year, month, day)
+            except (TypeError, ValueError):
+                return remaining, None, False
+
+            # 沒寫年份且日期已過 → 視為明年
+            if not year_text and date < today:
+                try:
+                    date = date.replace(year=today.year + 1)
+                except ValueError:
+                    return remaining, None, False
+            return remaining, date, True
+
+        match = WEEKDAY_RE.search(text)
+        if match:
+            target = WEEKDAYS[match.group("day")]
+            prefix = match.group("prefix")
+            if prefix is None:
+                # 未指定週次 → 最近的一個（含今天）
+                delta = (target - today.weekday()) % 7
+            else:
+                monday = today - dt.timedelta(days=today.weekday())
+                date = monday + dt.timedelta(days=7 * WEEK_OFFSETS[prefix] + target)
+                delta = (date - today).days
+                # 「本週一」在週六說 → 已經過了，視為下一個週一
+                if WEEK_OFFSETS[prefix] == 0 and delta < 0:
+                    delta += 7
+            return text[:match.start()] + text[match.end():], today + dt.timedelta(days=delta), True
+
+        match = RELATIVE_DATE_RE.search(text)
+        if match:
+            date = today + dt.timedelta(days=RELATIVE_DAYS[match.group(0)])
+            return text[:match.start()] + text[match.end():], date, True
+
+        return text, None, True
+
+    @staticmethod
+    def _has_date(text: str) -> bool:
+        """剩餘文字是否還有日期"""
+        return any(
+            pattern.search(text)
+            for pattern in (ABSOLUTE_DATE_RE, SLASH_DATE_RE, WEEKDAY_RE, RELATIVE_DATE_RE)
+        )
+
+    def _apply_time(self, segment: _Segment, match: re.Match, end_match: Optional[re.Match] = None):
+        """套用時間範圍；end_match 為標題後面的結束時間（見 RANGE_END_RE）"""
+        start_period = match.group("p1")
+        start, start_ambiguous = _parse_clock(match.group("c1"), start_period)
+        segment.start = start
+
+        if start_ambiguous:
+            segment.confidence *= PENALTY_AMBIGUOUS_HOUR
+
+        end_source = match if match.group("c2") else end_match
+        if end_source is not None:
+            # 結束時間沒寫時段 → 沿用開始的時段
+            end_period = end_source.group("p2") or start_period
+            end, _ = _parse_clock(end_source.group("c2"), end_period)
+            if end is not None and start is not None and end <= start and end[0] < 12:
+                end = (end[0] + 12, end[1])
+            segment.end = end
+        else:
+            segment.confidence *= PENALTY_START_ONLY
+
+    def _merge_segments(self, segments: List[_Segment]) -> List[_Segment]:
+        """合併被逗號拆開的同一事件（例如「明天下午三點，跟老師開會」）"""
+        merged: List[_Segment] = []
+        carry_date = None
+
+        for segment in segments:
+            if not segment.has_time:
+                # 只有日期 → 留給後面的片段使用
+                if segment.date is not None and not segment.title:
+                    carry_date = segment.date
+                    continue
+                # 只有標題 → 補到前一個還沒有標題的事件
+                if merged and not merged[-1].title and segment.title:
+                    merged[-1].title = segment.title
+                    continue
+
+            if segment.date is None and carry_date is not None:
+                segment.date = carry_date
+            carry_date = None
+            merged.append(segment)
+
+        return merged
+
+    def _default_date(self, segments: List[_Segment], now: dt.datetime) -> dt.date:
+        """完全沒寫日期時：第一個事件的時間還沒到就是今天，否則明天"""
+        for segment in segments:
+            if segment.date is None:
+                start = segment.start or (9, 0)
+                if start[0] * 60 + start[1] > now.hour * 60 + now.minute:
+                    return now.date()
+                return now.date() + dt.timedelta(days=1)
+        return now.date()
+
+    def _finalize(self, segment: _Segment, default_date: dt.date) -> ParsedEvent:
+        """補齊預設值並計算信心分數"""
+        confidence = segment.confidence
+
+        if not segment.has_time or segment.start is None:
+            confidence *= PENALTY_NO_TIME
+            segment.start = segment.start or (9, 0)
+
+        date = segment.date
+        if date is None:
+            confidence *= PENALTY_DEFAULT_DATE
+            date = default_date
+
+        start_minutes = segment.start[0] * 60 + segment.start[1]
+        end_minutes = segment.end[0] * 60 + segment.end[1] if segment.end is not None else None
+        if start_minutes >= 24 * 60:
+            # 「明天晚上十二點」→ 後天 00:00
+            date += dt.timedelta(days=1)
+            start_minutes -= 24 * 60
+            if end_minutes is not None:
+                end_minutes -= 24 * 60
+        elif end_minutes == 24 * 60:
+            # 「晚上十點到十二點」→ 結束於當天 23:59
+            end_minutes = 23 * 60 + 59
+
+        if end_minutes is None:
+            end_minutes = min(start_minutes + self.default_duration_minutes, 23 * 60 + 59)
+        if end_minutes <= start_minutes or start_minutes >= 24 * 60 or end_minutes >= 24 * 60:
+            confidence *= PENALTY_INVALID
+
+        title = segment.title
+        if not title or len(title) > 10:
+            confidence *= PENALTY_BAD_TITLE
+        elif len(title) > 6:
+            confidence *= PENALTY_LONG_TITLE
+
+        return ParsedEvent(
+            title=title or "未命名事件",
+            date=date.strftime("%Y-%m-%d"),
+            start=_format_minutes(start_minutes),
+            end=_format_minutes(end_minutes),
+            confidence=round(confidence, 3)
+        )
+
+
+# =========================
+# 5️⃣ 工具函式
+# =========================
+
+def _parse_hhmm(text: str) -> Tuple[int, int]:
+    hour, minute = text.split(":")
+    return int(hour), int(minute)
+
+
+def _format_minutes(minutes: int) -> str:
+    minutes = max(0, min(minutes, 23 * 60 + 59))
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def _parse_clock(text: str, period: Optional[str]) -> Tuple[Optional[Tuple[int, int]], bool]:
+    """解析鐘點並依時段換算成 24 小時制，回傳 ((時, 分), 是否模糊)"""
+    match = CLOCK_PARTS_RE.fullmatch(text)
+    if not match:
+        return None, True
+
+    hour = chinese_to_int(match.group("hour"))
+    if match.group("colon_min"):
+        minute = int(match.group("colon_min"))
+    elif match.group("half"):
+        minute = 30
+    elif match.group("quarter"):
+        minute = 15
+    elif match.group("three_quarter"):
+        minute = 45
+    elif match.group("minute"):
+        minute = chinese_to_int(match.group("minute"))
+    else:
+        minute = 0
+
+    if hour is None or minute is None or hour > 24 or minute > 59:
+        return None, True
+
+    ambiguous = False
+    if period in ("凌晨", "清晨"):
+        hour = 0 if hour == 12 else hour
+    elif period in ("早上", "早晨", "上午"):
+        pass
+    elif period == "中午":
+        hour = hour + 12 if hour <= 2 else hour
+    elif period in ("下午", "傍晚"):
+        hour = hour + 12 if hour < 12 else hour
+    elif period in ("晚上", "今晚", "夜晚"):
+        # 晚上十二點是當天結束的午夜（24:00），不是中午
+        hour = hour + 12 if hour <= 12 else hour
+    elif period in ("半夜", "深夜"):
+        if hour == 12:
+            hour = 0
+        elif hour >= 6:
+            hour = hour + 12 if hour < 12 else hour
+    elif 1 <= hour <= 6:
+        # 沒有時段的 1~6 點，多半是下午
+        hour += 12
+        ambiguous = True
+
+    return (hour, minute), ambiguous
+
+
+def _clean_title(text: str) -> str:
+    """去除日期時間後，整理剩下的文字作為標題"""
+    text = re.sub(r"[\s，,、；;。！!：:~～\-－—]+", "", text)
+    text = LEADING_WORDS_RE.sub("", text)
+    text = FILLER_PREFIX_RE.sub("", text)
+    return text
+
+
+def parse_duration(text: str) -> Tuple[Optional[int], str]:
+    """取出持續時間（分鐘），回傳 (分鐘數, 剩餘文字)；沒有寫則為 None"""
+    match = DURATION_RE.search(text)
+    if not match:
+        return None, text
+
+    remaining = text[:match.start()] + text[match.end():]
+    if match.group("half_hour"):
+        return 30, remaining
+    if match.group("minutes"):
+        minutes = chinese_to_int(match.group("minutes"))
+        return minutes, remaining
+
+    value = match.group("hours")
+    hours = float(value) if re.fullmatch(r"\d+(?:\.\d+)?", value) else chinese_to_int(value)
+    if hours is None:
+        return None, text
+    minutes = int(hours * 60)
+    if match.group("plus_half") or "半" in match.group(0)[len(value):]:
+        minutes += 30
+    return minutes, remaining
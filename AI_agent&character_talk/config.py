@@ -11,8 +11,28 @@ GUILD_IDS = [int(id) for id in os.getenv('GUILD_IDS', '').split(',') if id]
 # Groq API 配置
 GROQ_API_KEY = os.getenv('GROQ_API_KEY')
 GROQ_MODEL = os.getenv('GROQ_MODEL', 'llama-3.1-8b-instant')
+GROQ_MAX_CONCURRENCY = int(os.getenv('GROQ_MAX_CONCURRENCY', '4'))
+GROQ_RPM = int(os.getenv('GROQ_RPM', '30'))
+GROQ_TPM = int(os.getenv('GROQ_TPM', '6000'))
 
 # Google Calendar 配置
 GOOGLE_CREDENTIALS_PATH = os.getenv('GOOGLE_CREDENTIALS_PATH')
 CALENDAR_ID = os.getenv('CALENDAR_ID', 'primary')
-TIMEZONE = os.getenv('TIMEZONE', 'Asia/Taipei')
\ No newline at end of file
+FREEBUSY_CALENDAR_IDS = [c for c in os.getenv('FREEBUSY_CALENDAR_IDS', CALENDAR_ID).split(',') if c]
+CALENDAR_MAX_WORKERS = int(os.getenv('CALENDAR_MAX_WORKERS', '4'))
+CALENDAR_OUTPUT_MODE = os.getenv('CALENDAR_OUTPUT_MODE', 'json')  # json / tool
+CALENDAR_BULK_CONCURRENCY = int(os.getenv('CALENDAR_BULK_CONCURRENCY', '4'))
+CALENDAR_MIRROR_DB = os.getenv('CALENDAR_MIRROR_DB', 'calendar_mirror.db')
+CALENDAR_SYNC_INTERVAL = float(os.getenv('CALENDAR_SYNC_INTERVAL', '60'))
+CALENDAR_CONFLICT_WINDOW_DAYS = int(os.getenv('CALENDAR_CONFLICT_WINDOW_DAYS', '30'))
+TIMEZONE = os.getenv('TIMEZONE', 'Asia/Taipei')
+
+# 自定義內容儲存
+CUSTOM_CONTENT_BACKEND = os.getenv('CUSTOM_CONTENT_BACKEND', 'json')  # json / sqlite
+CUSTOM_CONTENT_DB = os.getenv('CUSTOM_CONTENT_DB', 'custom/content.db')
+CUSTOM_CONTENT_CACHE_SIZE = int(os.getenv('CUSTOM_CONTENT_CACHE_SIZE', '256'))
+CUSTOM_RELOAD_INTERVAL = float(os.getenv('CUSTOM_RELOAD_INTERVAL', '2'))  # 0 表示停用
+
+# 角色綁定日誌（留空表示只保留在記憶中）
+BINDING_JOURNAL_DIR = os.getenv('BINDING_JOURNAL_DIR', 'custom/state')
+BINDING_JOURNAL_COMPACT_EVERY = int(os.getenv('BINDING_JOURNAL_COMPACT_EVERY', '500'))
\ No newline at end of file
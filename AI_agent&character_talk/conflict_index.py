@@ -0,0 +1,203 @@
+import bisect
+import datetime as dt
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import pytz
+
+from calendar_mirror import event_span
+
+# (開始, 結束, 資料)
+Interval = Tuple[float, float, Any]
+
+
+class IntervalIndex:
+    """區間樹（依開始時間排序的隱式平衡樹，每個節點記錄子樹最大結束時間）
+
+    查詢與 [start, end) 重疊的區間：O(log n + k)
+    """
+
+    def __init__(self, intervals: Iterable[Interval] = ()):
+        self._items: List[Interval] = sorted(intervals, key=lambda item: (item[0], item[1]))
+        self._max_end: List[float] = []
+        self._build()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def _build(self):
+        self._max_end = [0.0] * len(self._items)
+
+        def build(lo: int, hi: int) -> float:
+            if lo > hi:
+                return float("-inf")
+            mid = (lo + hi) // 2
+            self._max_end[mid] = max(self._items[mid][1], build(lo, mid - 1), build(mid + 1, hi))
+            return self._max_end[mid]
+
+        build(0, len(self._items) - 1)
+
+    def add(self, start: float, end: float, data: Any = None):
+        """加入一個區間（重建最大結束時間，O(n)）"""
+        bisect.insort(self._items, (start, end, data), key=lambda item: (item[0], item[1]))
+        self._build()
+
+    def overlaps(self, start: float, end: float) -> List[Interval]:
+        """與 [start, end) 重疊的所有區間（依開始時間排序）"""
+        result = []
+        stack = [(0, len(self._items) - 1)]
+
+        while stack:
+            lo, hi = stack.pop()
+            if lo > hi:
+                continue
+            mid = (lo + hi) // 2
+            # 整棵子樹都在 start 之前結束
+            if self._max_end[mid] <= start:
+                continue
+
+            stack.append((lo, mid - 1))
+            item_start, item_end, _ = self._items[mid]
+            if item_start < end:
+                if item_end > start:
+                    result.append(self._items[mid])
+                stack.append((mid + 1, hi))
+
+        result.sort(key=lambda item: item[0])
+        return result
+
+
+class ConflictChecker:
+    """建立事件前的衝突檢查
+
+    索引來源：本地鏡像（已同步時），否則以單次時段查詢取得近期事件。
+    每個事件的檢查都在記憶體中完成，不會為每個事件額外呼叫 API。
+    """
+
+    def __init__(self, calendar_service, calendar_id: str, calendar_mirror=None,
+                 window_days: int = 30, ttl: float = 60):
+        self.calendar_service = calendar_service
+        self.calendar_id = calendar_id
+        self.calendar_mirror = calendar_mirror
+        self.timezone = calendar_service.timezone
+        self.window_days = window_days
+        self.ttl = ttl  # 沒有鏡像時，索引的有效秒數
+
+        self._index: Optional[IntervalIndex] = None
+        self._window: Tuple[float, float] = (0.0, 0.0)
+        self._built_at = 0.0
+        self._mirror_version = None
+
+    # --------------------------
+    # 索引
+    # --------------------------
+    def _stale(self, window: Tuple[float, float]) -> bool:
+        if self._index is None:
+            return True
+        if window[0] < self._window[0] or window[1] > self._window[1]:
+            return True
+        if self.calendar_mirror is not None and self.calendar_mirror.ready:
+            return self.calendar_mirror.stats["last_sync"] != self._mirror_version
+        return time.monotonic() - self._built_at > self.ttl
+
+    async def _ensure_index(self, window: Tuple[float, float]):
+        """必要時重建索引（鏡像查詢或單次時段查詢）"""
+        if not self._stale(window):
+            return
+
+        now = time.time()
+        start = min(now, window[0])
+        end = max(now + self.window_days * 86400, window[1])
+
+        if self.calendar_mirror is not None and self.calendar_mirror.ready:
+            spans = await self.calendar_mirror.aspans_between(start, end)
+            intervals = [
+                (span_start, span_end, {"title": summary, "id": event_id})
+                for span_start, span_end, summary, event_id in spans
+            ]
+            self._mirror_version = self.calendar_mirror.stats["last_sync"]
+        else:
+            items = await self.calendar_service.alist_events_range(
+                self.calendar_id,
+                dt.datetime.fromtimestamp(start, dt.timezone.utc),
+                dt.datetime.fromtimestamp(end, dt.timezone.utc)
+            )
+            intervals = []
+            for item in items:
+                span = event_span(item, self.timezone)
+                if span is not None:
+                    intervals.append((span[0], span[1], {"title": item.get("summary", "無標題"), "id": item.get("id")}))
+
+        self._index = IntervalIndex(intervals)
+        self._window = (start, end)
+        self._built_at = time.monotonic()
+
+    def _spec_span(self, event: Dict) -> Tuple[float, float]:
+        tz = pytz.timezone(self.timezone)
+        date = dt.date.fromisoformat(event["date"])
+
+        def at(value: str) -> float:
+            hour, minute = map(int, value.split(":"))
+            return tz.localize(dt.datetime.combine(date, dt.time(hour, minute))).timestamp()
+
+        return at(event["start"]), at(event["end"])
+
+    # --------------------------
+    # 檢查
+    # --------------------------
+    async def check(self, events: List[Dict]) -> List[List[Dict]]:
+        """檢查一批事件（dict，含 title/date/start/end）
+
+        回傳與 events 順序一致的衝突列表；每個衝突為
+        {"title", "start", "end", "source"}，source 為 "calendar"（既有事件）或 "batch"（同批其他事件）
+        """
+        spans = []
+        for event in events:
+            try:
+                spans.append(self._spec_span(event))
+            except (KeyError, ValueError):
+                spans.append(None)
+
+        valid = [span for span in spans if span is not None]
+        if not valid:
+            return [[] for _ in events]
+
+        await self._ensure_index((min(s for s, _ in valid), max(e for _, e in valid)))
+
+        # 同一批事件彼此之間
+        batch_index = IntervalIndex(
+            (span[0], span[1], index) for index, span in enumerate(spans) if span is not None
+        )
+
+        results = []
+        for index, span in enumerate(spans):
+            conflicts = []
+            if span is not None:
+                for start, end, data in self._index.overlaps(*span):
+                    conflicts.append(self._describe(start, end, data["title"], "calendar"))
+                for start, end, other in batch_index.overlaps(*span):
+                    if other != index:
+                        conflicts.append(self._describe(start, end, events[other]["title"], "batch"))
+            results.append(conflicts)
+
+        return results
+
+    def record(self, events: List[Dict]):
+        """把剛建立的事件加入索引（不必等待下一次同步）"""
+        if self._index is None:
+            return
+        for event in events:
+            try:
+                start, end = self._spec_span(event)
+            except (KeyError, ValueError):
+                continue
+            self._index.add(start, end, {"title": event["title"], "id": None})
+
+    def _describe(self, start: float, end: float, title: str, source: str) -> Dict:
+        tz = pytz.timezone(self.timezone)
+        return {
+            "title": title,
+            "start": dt.datetime.fromtimestamp(start, tz).strftime("%m/%d %H:%M"),
+            "end": dt.datetime.fromtimestamp(end, tz).strftime("%H:%M"),
+            "source": source,
+        }
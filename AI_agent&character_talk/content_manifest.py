@@ -0,0 +1,323 @@
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from content_store import KINDS, SUMMARY_FIELDS
+
+MANIFEST_VERSION = 1
+
+
+def atomic_write_json(path: str, data) -> None:
+    """寫入 JSON：先寫同目錄的暫存檔並 fsync，再以 os.replace 取代原檔"""
+    atomic_write_text(path, json.dumps(data, ensure_ascii=False, indent=2))
+
+
+def atomic_write_text(path: str, text: str) -> None:
+    """原子寫入已序列化的文字（見 atomic_write_json）"""
+    directory = os.path.dirname(path) or "."
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+class ContentManifest:
+    """custom/manifest.json：名稱 → 檔案、mtime、大小與摘要欄位
+
+    啟動時只 stat 檔案；mtime 與大小都沒變的項目直接沿用清單中的摘要，
+    只有新增或修改過的檔案才需要解析。
+    """
+
+    def __init__(self, base_dir: str = "custom", path: Optional[str] = None, writer=None):
+        self.base_dir = base_dir
+        self.path = path or os.path.join(base_dir, "manifest.json")
+        # ContentWriter：有的話清單也交給背景執行緒寫出
+        self.writer = writer
+        self.entries: Dict[str, Dict[str, Dict]] = {kind: {} for kind in KINDS}
+        self._dirty = False
+        # 每次修改清單都會遞增；熱重載用來判斷掃描結果是否已過期
+        self.version = 0
+        # 解析失敗的檔案 → (mtime, 大小)；沒有再修改前不重複嘗試
+        self._failed: Dict[str, Tuple[float, int]] = {}
+        # 已排入背景刪除、但檔案還在磁碟上的 (種類, 檔名)；掃描時略過
+        self._deleting: Set[Tuple[str, str]] = set()
+        # 事件迴圈（update/remove/replace）與寫入執行緒（touch）都會修改項目
+        self._lock = threading.RLock()
+
+    # --------------------------
+    # 掃描
+    # --------------------------
+    def load(self) -> Dict[str, int]:
+        """讀取既有清單並與目錄比對，回傳各種類重新解析的檔案數"""
+        previous = self._read()
+        parsed = {}
+
+        for kind in KINDS:
+            entries, updated = self._scan(kind, previous.get(kind, {}))
+            parsed[kind] = len(updated)
+            if entries != previous.get(kind, {}):
+                self._dirty = True
+            self.entries[kind] = entries
+
+        self.save()
+        return parsed
+
+    def _scan(self, kind: str, previous: Dict[str, Dict],
+              keep_pending: bool = False) -> Tuple[Dict[str, Dict], List[str]]:
+        """stat 目錄中的檔案，只解析新增或 mtime / 大小有變的檔案
+
+        keep_pending：保留還在背景寫入中的項目（mtime 為 None），不去讀它們的檔案；
+        等待背景刪除的檔案也一併略過，以免被當成新增的檔案載入回來。
+        回傳 (新的項目, 重新解析的主鍵)；不修改 self.entries。
+        """
+        pending = {key: entry for key, entry in previous.items() if entry["mtime"] is None} \
+            if keep_pending else {}
+        pending_files = {entry["file"] for entry in pending.values()}
+        if keep_pending:
+            # 背景執行緒可能同時修改集合，先複製
+            pending_files |= {filename for deleting_kind, filename in set(self._deleting) if deleting_kind == kind}
+        # 以檔名索引上一次的結果
+        by_file = {entry["file"]: (key, entry) for key, entry in previous.items()}
+        entries = {}
+        updated = []
+
+        directory = os.path.join(self.base_dir, kind)
+        filenames = sorted(f for f in os.listdir(directory) if f.endswith(".json")) \
+            if os.path.isdir(directory) else []
+
+        for filename in filenames:
+            if filename in pending_files:
+                continue
+            path = os.path.join(directory, filename)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+
+            key, entry = by_file.get(filename, (None, None))
+            if entry is None or entry["mtime"] != stat.st_mtime or entry["size"] != stat.st_size:
+                signature = (stat.st_mtime, stat.st_size)
+                if self._failed.get(path) == signature:
+                    continue
+                try:
+                    with open(path, "r", encoding="utf-8") as f:
+                        data = json.load(f)
+                    key, entry = self._entry(kind, filename, stat, data)
+                except Exception as e:
+                    self._failed[path] = signature
+                    print(f"❌ 讀取 {kind}/{filename} 失敗: {e}")
+                    continue
+                self._failed.pop(path, None)
+                updated.append(key)
+            entries[key] = entry
+
+        entries.update(pending)
+        return entries, updated
+
+    def diff(self) -> Tuple[int, Dict[str, Tuple[Dict[str, Dict], List[str], List[str]]]]:
+        """重新掃描目錄（可在背景執行緒呼叫，不修改清單）
+
+        回傳 (掃描開始時的版本, {種類: (新的項目, 新增或修改的主鍵, 移除的主鍵)})，只包含有變化的種類。
+        """
+        with self._lock:
+            version = self.version
+            snapshots = {kind: dict(self.entries[kind]) for kind in KINDS}
+        changes = {}
+        for kind in KINDS:
+            previous = snapshots[kind]
+            entries, updated = self._scan(kind, previous, keep_pending=True)
+            removed = [key for key in previous if key not in entries]
+            if updated or removed:
+                changes[kind] = (entries, updated, removed)
+        return version, changes
+
+    def replace(self, kind: str, entries: Dict[str, Dict]):
+        """套用 diff() 的掃描結果"""
+        with self._lock:
+            self.entries[kind] = entries
+            self.version += 1
+            self._dirty = True
+            self.save()
+
+    def _read(self) -> Dict:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == MANIFEST_VERSION:
+                return data.get("entries", {})
+        except (OSError, ValueError):
+            pass
+        return {}
+
+    def _entry(self, kind: str, filename: str, stat: Optional[os.stat_result], data: Dict):
+        entry = {"file": filename,
+                 "mtime": stat.st_mtime if stat else None,
+                 "size": stat.st_size if stat else None}
+        for name in SUMMARY_FIELDS[kind]:
+            entry[name] = data.get(name)
+        return data[KINDS[kind]], entry
+
+    def save(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            # 項目字典只會被整個替換、不會就地修改，淺層複製即可交給背景執行緒
+            snapshot = {"version": MANIFEST_VERSION,
+                        "entries": {kind: dict(entries) for kind, entries in self.entries.items()}}
+            self._dirty = False
+        if self.writer is not None:
+            self.writer.write(self.path, snapshot)
+            return
+        try:
+            atomic_write_json(self.path, snapshot)
+        except OSError as e:
+            print(f"⚠️ 無法寫入內容清單: {e}")
+
+    # --------------------------
+    # 更新
+    # --------------------------
+    def path_of(self, kind: str, key: str) -> str:
+        return os.path.join(self.base_dir, kind, self.entries[kind][key]["file"])
+
+    def update(self, kind: str, filename: str, data: Dict, pending: bool = False) -> Tuple[str, Dict]:
+        """更新對應的項目，回傳 (主鍵, 項目)
+
+        pending=True 表示檔案還在背景寫入中：先不 stat，寫完後由 touch() 補上。
+        """
+        stat = None if pending else os.stat(os.path.join(self.base_dir, kind, filename))
+        key, entry = self._entry(kind, filename, stat, data)
+        with self._lock:
+            # 刪除後又存回同一個檔案：寫入佇列會以寫入取代刪除
+            self._deleting.discard((kind, filename))
+            self.entries[kind][key] = entry
+            self.version += 1
+            self._dirty = True
+            self.save()
+        return key, entry
+
+    def touch(self, kind: str, key: str, entry: Dict, stat: os.stat_result):
+        """背景寫入完成後補上 mtime 與大小（項目已被更新的寫入取代時忽略）
+
+        在寫入執行緒呼叫；檢查與替換在同一個鎖內，不會蓋掉事件迴圈剛寫入的新項目。
+        """
+        with self._lock:
+            if self.entries[kind].get(key) is not entry:
+                return
+            self.entries[kind][key] = {**entry, "mtime": stat.st_mtime, "size": stat.st_size}
+            self.version += 1
+            self._dirty = True
+            self.save()
+
+    def mark_deleting(self, kind: str, filename: str):
+        """檔案已排入背景刪除；完成前掃描不會把它當成新增的檔案"""
+        self._deleting.add((kind, filename))
+
+    def finish_deleting(self, kind: str, filename: str):
+        """背景刪除完成（由寫入執行緒呼叫）"""
+        self._deleting.discard((kind, filename))
+
+    def remove(self, kind: str, key: str):
+        with self._lock:
+            if self.entries[kind].pop(key, None) is not None:
+                self.version += 1
+                self._dirty = True
+                self.save()
+
+    def clear(self, kind: str):
+        with self._lock:
+            if self.entries[kind]:
+                self.entries[kind].clear()
+                self.version += 1
+                self._dirty = True
+                self.save()
+
+
+class ManifestRecords(MutableMapping):
+    """以清單為索引、LRU 快取完整物件的字典
+
+    迭代與 summaries() 只讀清單；取值時才讀檔並建立物件，
+    快取超過 cache_size 時淘汰最久未使用的項目。
+    寫入只更新快取，檔案與清單由 CustomizationManager 負責。
+    """
+
+    def __init__(self, manifest: ContentManifest, kind: str, factory: Callable[..., object],
+                 cache_size: int = 256):
+        self.manifest = manifest
+        self.kind = kind
+        self.factory = factory
+        self.cache_size = max(1, cache_size)
+        self._cache: "OrderedDict[str, object]" = OrderedDict()
+
+    @property
+    def _entries(self) -> Dict[str, Dict]:
+        return self.manifest.entries[self.kind]
+
+    def __getitem__(self, key: str):
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return self._cache[key]
+        if key not in self._entries:
+            raise KeyError(key)
+
+        try:
+            with open(self.manifest.path_of(self.kind, key), "r", encoding="utf-8") as f:
+                value = self.factory(**json.load(f))
+        except Exception as e:
+            print(f"❌ 載入 {self.kind}/{key} 失敗: {e}")
+            raise KeyError(key) from e
+
+        self._remember(key, value)
+        return value
+
+    def __setitem__(self, key: str, value):
+        self._remember(key, value)
+
+    def __delitem__(self, key: str):
+        if key not in self._entries and key not in self._cache:
+            raise KeyError(key)
+        self._cache.pop(key, None)
+        self.manifest.remove(self.kind, key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self._entries))
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key) -> bool:
+        return key in self._entries
+
+    def _remember(self, key: str, value):
+        self._cache[key] = value
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def clear(self):
+        self._cache.clear()
+        self.manifest.clear(self.kind)
+
+    def invalidate(self, keys: Iterable[str]):
+        """丟棄快取中的物件（檔案已在外部修改），下次取值時重新讀檔"""
+        for key in keys:
+            self._cache.pop(key, None)
+
+    def summaries(self) -> Dict[str, Dict]:
+        """各項目的摘要欄位（不讀取檔案）"""
+        return {
+            key: {name: entry.get(name) for name in SUMMARY_FIELDS[self.kind]}
+            for key, entry in self._entries.items()
+        }
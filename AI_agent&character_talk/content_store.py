@@ -0,0 +1,246 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections.abc import Mapping, MutableMapping
+from typing import Callable, Dict, Iterator, List, Optional
+
+# 自定義內容種類 → 主鍵欄位
+KINDS = {
+    "characters": "name",
+    "scenes": "name",
+    "events": "id",
+}
+
+# 列表時需要的摘要欄位（不必載入完整物件）
+SUMMARY_FIELDS = {
+    "characters": ("profession", "age", "gender"),
+    "scenes": ("location", "atmosphere"),
+    "events": ("title", "event_type"),
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS characters (
+    name TEXT PRIMARY KEY,
+    data TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS scenes (
+    name TEXT PRIMARY KEY,
+    data TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS events (
+    id TEXT PRIMARY KEY,
+    title TEXT,
+    data TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_events_title ON events (title);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+class ContentStore:
+    """自定義角色、場景、事件的 SQLite 儲存（WAL 模式）
+
+    - 每種內容一張表，以名稱 / id 為主鍵
+    - 寫入在交易中完成，中途失敗不會留下半個檔案
+    - 啟動時只讀主鍵，內容在第一次使用時才解析（見 LazyRecords）
+    """
+
+    def __init__(self, db_path: str = "custom/content.db"):
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.db_path = db_path
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # --------------------------
+    # 讀取
+    # --------------------------
+    def keys(self, kind: str) -> List[str]:
+        key_column = KINDS[kind]
+        with self._lock:
+            rows = self._conn.execute(f"SELECT {key_column} FROM {kind} ORDER BY rowid").fetchall()
+        return [key for key, in rows]
+
+    def get(self, kind: str, key: str) -> Optional[Dict]:
+        key_column = KINDS[kind]
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT data FROM {kind} WHERE {key_column} = ?", (key,)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def summaries(self, kind: str) -> Dict[str, Dict]:
+        """各項目的摘要欄位（以 json_extract 取出，不解析整筆資料）"""
+        fields = SUMMARY_FIELDS[kind]
+        columns = ", ".join(f"json_extract(data, '$.{name}')" for name in fields)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {KINDS[kind]}, {columns} FROM {kind} ORDER BY rowid"
+            ).fetchall()
+        return {row[0]: dict(zip(fields, row[1:])) for row in rows}
+
+    def count(self, kind: str) -> int:
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM {kind}").fetchone()[0]
+
+    # --------------------------
+    # 寫入
+    # --------------------------
+    def put(self, kind: str, key: str, data: Dict):
+        self.put_many(kind, [(key, data)])
+
+    def put_many(self, kind: str, items: List[tuple]):
+        """在單一交易中寫入多筆 [(主鍵, 資料), ...]"""
+        now = time.time()
+        if kind == "events":
+            rows = [(key, data.get("title", ""), json.dumps(data, ensure_ascii=False), now)
+                    for key, data in items]
+            sql = "INSERT OR REPLACE INTO events (id, title, data, updated_at) VALUES (?, ?, ?, ?)"
+        else:
+            rows = [(key, json.dumps(data, ensure_ascii=False), now) for key, data in items]
+            sql = f"INSERT OR REPLACE INTO {kind} ({KINDS[kind]}, data, updated_at) VALUES (?, ?, ?)"
+
+        with self._lock, self._conn:
+            self._conn.executemany(sql, rows)
+
+    def delete(self, kind: str, key: str) -> bool:
+        with self._lock, self._conn:
+            cursor = self._conn.execute(f"DELETE FROM {kind} WHERE {KINDS[kind]} = ?", (key,))
+        return cursor.rowcount > 0
+
+    def clear(self, kind: str) -> int:
+        with self._lock, self._conn:
+            cursor = self._conn.execute(f"DELETE FROM {kind}")
+        return cursor.rowcount
+
+    # --------------------------
+    # 從 custom/*.json 遷移
+    # --------------------------
+    def migrate_json_tree(self, base_dir: str = "custom") -> Dict[str, int]:
+        """把 custom/{characters,scenes,events}/*.json 匯入資料庫（只執行一次）
+
+        原本的 JSON 檔案保留不動，可作為備份。
+        """
+        with self._lock:
+            done = self._conn.execute(
+                "SELECT value FROM meta WHERE key = 'json_migrated'"
+            ).fetchone()
+        if done:
+            return {}
+
+        results = {}
+        for kind, key_field in KINDS.items():
+            directory = os.path.join(base_dir, kind)
+            items = []
+            if os.path.isdir(directory):
+                for filename in sorted(os.listdir(directory)):
+                    if not filename.endswith(".json"):
+                        continue
+                    try:
+                        with open(os.path.join(directory, filename), "r", encoding="utf-8") as f:
+                            data = json.load(f)
+                        items.append((data[key_field], data))
+                    except Exception as e:
+                        print(f"❌ 遷移 {kind}/{filename} 失敗: {e}")
+            if items:
+                self.put_many(kind, items)
+            results[kind] = len(items)
+
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('json_migrated', ?)",
+                (str(time.time()),)
+            )
+
+        if any(results.values()):
+            print(f"✅ 已將 custom/*.json 遷移到 {self.db_path}: {results}")
+        return results
+
+
+class LazyRecords(MutableMapping):
+    """以主鍵為索引的延遲載入字典
+
+    建立時只讀取主鍵列表；值在第一次存取時才從資料庫解析並快取。
+    寫入只更新記憶體，持久化由呼叫端（CustomizationManager.save_*）負責。
+    """
+
+    def __init__(self, store: ContentStore, kind: str, factory: Callable[..., object]):
+        self.store = store
+        self.kind = kind
+        self.factory = factory
+        # dict 保留插入順序；None 表示尚未載入
+        self._values: Dict[str, object] = dict.fromkeys(store.keys(kind))
+
+    def __getitem__(self, key: str):
+        if key not in self._values:
+            raise KeyError(key)
+        value = self._values[key]
+        if value is None:
+            data = self.store.get(self.kind, key)
+            if data is None:
+                del self._values[key]
+                raise KeyError(key)
+            value = self.factory(**data)
+            self._values[key] = value
+        return value
+
+    def __setitem__(self, key: str, value):
+        self._values[key] = value
+
+    def __delitem__(self, key: str):
+        del self._values[key]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self._values))
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def __contains__(self, key) -> bool:
+        return key in self._values
+
+    def clear(self):
+        self._values.clear()
+
+    def summaries(self) -> Dict[str, Dict]:
+        """各項目的摘要欄位（只含記憶體中仍存在的項目）"""
+        return {key: value for key, value in self.store.summaries(self.kind).items() if key in self._values}
+
+
+class PrefixedView(Mapping):
+    """唯讀檢視：在另一個字典的鍵前加上前綴（例如 custom_角色名稱）"""
+
+    def __init__(self, records: Mapping, prefix: str):
+        self.records = records
+        self.prefix = prefix
+
+    def __getitem__(self, key: str):
+        if not key.startswith(self.prefix):
+            raise KeyError(key)
+        return self.records[key[len(self.prefix):]]
+
+    def __iter__(self) -> Iterator[str]:
+        return (self.prefix + key for key in self.records)
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def __contains__(self, key) -> bool:
+        return isinstance(key, str) and key.startswith(self.prefix) and key[len(self.prefix):] in self.records
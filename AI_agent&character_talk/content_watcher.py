@@ -0,0 +1,66 @@
+import asyncio
+from typing import Dict, Optional
+
+KIND_LABELS = {"characters": "角色", "scenes": "場景", "events": "事件"}
+
+
+class ContentWatcher:
+    """custom/ 目錄熱重載
+
+    定期比對各檔案的 mtime 與大小（ContentManifest.diff），只有變更的檔案會被解析，
+    再以 VirtualSandboxSociety.apply_custom_changes 就地套用，不重建整個角色 / 場景列表。
+    sqlite 模式沒有檔案可監看，不會啟動。
+    """
+
+    def __init__(self, society, interval: float = 2.0):
+        self.society = society
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"polls": 0, "reloads": 0, "changes": 0, "errors": 0}
+
+    def start(self):
+        """啟動背景監看（需在事件迴圈中呼叫）"""
+        if self.interval <= 0 or self.society.customization.manifest is None:
+            return
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.poll()
+            except Exception as e:
+                self.stats["errors"] += 1
+                print(f"⚠️ 自定義內容熱重載失敗: {e}")
+
+    async def poll(self) -> Dict[str, int]:
+        """檢查一次，回傳各種類套用的變更數"""
+        manifest = self.society.customization.manifest
+        if manifest is None:
+            return {}
+
+        self.stats["polls"] += 1
+        version, changes = await asyncio.to_thread(manifest.diff)
+        if not changes:
+            return {}
+
+        # 掃描期間清單被修改（例如剛用指令建立角色）→ 結果已過期，下一輪再掃描
+        if manifest is not self.society.customization.manifest or manifest.version != version:
+            return {}
+
+        applied = self.society.apply_custom_changes(changes)
+        self.stats["reloads"] += 1
+        self.stats["changes"] += sum(applied.values())
+        summary = "、".join(f"{KIND_LABELS[kind]} {count} 個" for kind, count in applied.items())
+        print(f"🔄 已重新載入自定義內容: {summary}")
+        return applied
@@ -0,0 +1,147 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+
+from content_manifest import atomic_write_json
+
+# 第一筆寫入排入後等多久再開始寫（秒），讓連續的儲存合併成一批
+FLUSH_DELAY = 0.2
+
+_DELETE = object()
+
+
+class ContentWriter:
+    """背景寫入佇列（write-behind）
+
+    - write()/delete() 只把工作放進佇列就回傳，檔案 I/O 在背景執行緒進行
+    - 同一路徑尚未寫出的多次儲存只保留最後一次
+    - 每個檔案先寫暫存檔並 fsync，再以 os.replace 原子取代；每批結束後 fsync 所在目錄
+    - 刪除與寫入共用佇列，順序一致（先存後刪不會留下檔案）
+    """
+
+    def __init__(self, flush_delay: float = FLUSH_DELAY):
+        self.flush_delay = flush_delay
+        # 路徑 → (資料或 _DELETE, 完成後的回呼)
+        self._pending: "OrderedDict[str, Tuple[object, Optional[Callable]]]" = OrderedDict()
+        self._cond = threading.Condition()
+        self._busy = False
+        self._closed = False
+        self._flush_requested = False
+        self.stats = {"queued": 0, "coalesced": 0, "written": 0, "deleted": 0, "batches": 0, "errors": 0}
+
+        self._thread = threading.Thread(target=self._run, name="content-writer", daemon=True)
+        self._thread.start()
+
+    # --------------------------
+    # 排入工作
+    # --------------------------
+    def write(self, path: str, data, on_done: Optional[Callable[[os.stat_result], None]] = None):
+        """排入一次 JSON 寫入；on_done(stat) 在檔案寫完後於背景執行緒呼叫"""
+        self._enqueue(path, data, on_done)
+
+    def delete(self, path: str, on_done: Optional[Callable[[], None]] = None):
+        """排入一次刪除（檔案不存在時忽略）；on_done() 在刪除後於背景執行緒呼叫
+
+        之後又排入同一路徑的寫入時，刪除與其回呼會被取代。
+        """
+        self._enqueue(path, _DELETE, on_done)
+
+    def _enqueue(self, path: str, data, on_done):
+        with self._cond:
+            closed = self._closed
+            if not closed:
+                if path in self._pending:
+                    self.stats["coalesced"] += 1
+                    del self._pending[path]
+                self._pending[path] = (data, on_done)
+                self.stats["queued"] += 1
+                self._cond.notify_all()
+
+        if closed:
+            # 已關閉（例如重置後的最後幾次寫入）→ 直接同步寫出
+            self._write_batch({path: (data, on_done)})
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """立即寫出並等待佇列清空（阻塞），回傳是否在時限內完成"""
+        with self._cond:
+            self._flush_requested = True
+            self._cond.notify_all()
+            done = self._cond.wait_for(lambda: not self._pending and not self._busy, timeout)
+            self._flush_requested = False
+            return done
+
+    def close(self, timeout: Optional[float] = 10):
+        """寫出剩餘的工作並停止背景執行緒"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+
+    # --------------------------
+    # 背景執行緒
+    # --------------------------
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending or self._closed)
+                if not self._pending:
+                    return
+                # 等一小段時間，讓同一批儲存合併（關閉或 flush 時立即寫出）
+                deadline = time.monotonic() + self.flush_delay
+                while not (self._closed or self._flush_requested):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                self._flush_requested = False
+                batch, self._pending = self._pending, OrderedDict()
+                self._busy = True
+
+            try:
+                self._write_batch(batch)
+            finally:
+                with self._cond:
+                    self._busy = False
+                    self._cond.notify_all()
+
+    def _write_batch(self, batch: Dict[str, Tuple[object, Optional[Callable]]]):
+        directories = set()
+        for path, (data, on_done) in batch.items():
+            try:
+                if data is _DELETE:
+                    try:
+                        os.remove(path)
+                        self.stats["deleted"] += 1
+                    except FileNotFoundError:
+                        pass
+                    if on_done is not None:
+                        on_done()
+                else:
+                    atomic_write_json(path, data)
+                    self.stats["written"] += 1
+                    if on_done is not None:
+                        on_done(os.stat(path))
+                directories.add(os.path.dirname(path) or ".")
+            except Exception as e:
+                self.stats["errors"] += 1
+                print(f"❌ 寫入 {path} 失敗: {e}")
+
+        # rename / 刪除本身也要落盤
+        for directory in directories:
+            _fsync_directory(directory)
+        self.stats["batches"] += 1
+
+
+def _fsync_directory(directory: str):
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
@@ -6,9 +6,13 @@ import os
 import datetime as dt
 from dotenv import load_dotenv
 from calendar_service import CalendarService
+from calendar_mirror import CalendarMirror
+from conflict_index import ConflictChecker
 from Langchain_Calendar import CalendarAssistant
 from character_system import VirtualSandboxSociety, CharacterTrait, SceneSetting
-from groq import Groq
+from content_watcher import ContentWatcher
+from groq import Groq, AsyncGroq
+from llm_scheduler import LLMScheduler
 import asyncio
 
 load_dotenv()
@@ -22,17 +26,30 @@ class LangChainCalendarBot(commands.Bot):
         # 初始化
         groq_key = os.getenv('GROQ_API_KEY')
         
+        # 全域 LLM 排程器（日曆解析與沙盒對話共用同一個 Groq 帳號額度）
+        self.llm_scheduler = LLMScheduler(
+            requests_per_minute=int(os.getenv('GROQ_RPM', '30')),
+            tokens_per_minute=int(os.getenv('GROQ_TPM', '6000')),
+            max_concurrency=int(os.getenv('GROQ_MAX_CONCURRENCY', '4'))
+        )
+        
         # LangChain 日曆助理
         self.calendar_assistant = CalendarAssistant(
             groq_api_key=groq_key,
-            timezone=os.getenv('TIMEZONE', 'Asia/Taipei')
+            timezone=os.getenv('TIMEZONE', 'Asia/Taipei'),
+            scheduler=self.llm_scheduler,
+            cache_size=int(os.getenv('CALENDAR_PARSE_CACHE_SIZE', '256')),
+            rule_confidence_threshold=float(os.getenv('CALENDAR_RULE_CONFIDENCE', '0.7')),
+            output_mode=os.getenv('CALENDAR_OUTPUT_MODE', 'json'),
+            bulk_concurrency=int(os.getenv('CALENDAR_BULK_CONCURRENCY', '4'))
         )
         
         # Google Calendar 
         try:
             self.calendar_service = CalendarService(
                 os.getenv('GOOGLE_CREDENTIALS_PATH', 'credentials.json'),
-                os.getenv('TIMEZONE', 'Asia/Taipei')
+                os.getenv('TIMEZONE', 'Asia/Taipei'),
+                max_workers=int(os.getenv('CALENDAR_MAX_WORKERS', '4'))
             )
             print("✅ Google Calendar 服務初始化成功")
         except Exception as e:
@@ -40,17 +57,81 @@ class LangChainCalendarBot(commands.Bot):
             self.calendar_service = None
         
         self.calendar_id = os.getenv('CALENDAR_ID', 'primary')
-        self.virtual_society = VirtualSandboxSociety(Groq(api_key=groq_key))
+        # !free 查詢的日曆（逗號分隔，預設為主要日曆）
+        self.freebusy_calendars = [
+            calendar_id.strip()
+            for calendar_id in os.getenv('FREEBUSY_CALENDAR_IDS', self.calendar_id).split(',')
+            if calendar_id.strip()
+        ]
+        
+        # 本地日曆鏡像（SQLite，背景增量同步）
+        self.calendar_mirror = None
+        if self.calendar_service:
+            try:
+                self.calendar_mirror = CalendarMirror(
+                    self.calendar_service,
+                    self.calendar_id,
+                    db_path=os.getenv('CALENDAR_MIRROR_DB', 'calendar_mirror.db'),
+                    sync_interval=float(os.getenv('CALENDAR_SYNC_INTERVAL', '60'))
+                )
+            except Exception as e:
+                print(f"⚠️  日曆鏡像初始化失敗: {e}")
+        
+        # 建立事件前的衝突檢查（區間索引）
+        self.conflict_checker = None
+        if self.calendar_service:
+            self.conflict_checker = ConflictChecker(
+                self.calendar_service,
+                self.calendar_id,
+                self.calendar_mirror,
+                window_days=int(os.getenv('CALENDAR_CONFLICT_WINDOW_DAYS', '30'))
+            )
+        
+        self.virtual_society = VirtualSandboxSociety(
+            Groq(api_key=groq_key),
+            AsyncGroq(api_key=groq_key),
+            max_concurrency=int(os.getenv('GROQ_MAX_CONCURRENCY', '4')),
+            scheduler=self.llm_scheduler,
+            content_backend=os.getenv('CUSTOM_CONTENT_BACKEND', 'json'),
+            content_db_path=os.getenv('CUSTOM_CONTENT_DB', 'custom/content.db'),
+            content_cache_size=int(os.getenv('CUSTOM_CONTENT_CACHE_SIZE', '256')),
+            journal_dir=os.getenv('BINDING_JOURNAL_DIR', 'custom/state'),
+            journal_compact_every=int(os.getenv('BINDING_JOURNAL_COMPACT_EVERY', '500'))
+        )
+        # custom/ 熱重載（0 表示停用）
+        self.content_watcher = ContentWatcher(
+            self.virtual_society,
+            interval=float(os.getenv('CUSTOM_RELOAD_INTERVAL', '2'))
+        )
         self.current_mode = "normal"
         self.current_role = None
         self.active_conversations = {}
         self.user_states = {}
     
+    async def setup_hook(self):
+        """啟動背景工作"""
+        if self.calendar_service:
+            self.calendar_service.start_token_refresher()
+        if self.calendar_mirror:
+            self.calendar_mirror.start()
+        self.content_watcher.start()
+    
     async def on_ready(self):
         """當機器人準備好時"""
         print(f'✅ {self.user} 已成功登入！ (LangChain 版本)')
         print(f'🤖 LangChain 系統已初始化')
         await self.change_presence(activity=discord.Game(name="LangChain 助理 | !help"))
 
+    async def close(self):
+        """關閉機器人並釋放日曆執行緒池"""
+        await self.content_watcher.stop()
+        # 寫出尚未落盤的自定義內容與綁定日誌
+        await asyncio.to_thread(self.virtual_society.close)
+        if self.calendar_mirror:
+            await self.calendar_mirror.stop()
+        if self.calendar_service:
+            self.calendar_service.close()
+        await super().close()
+
 # 創建bot
 bot = LangChainCalendarBot()
\ No newline at end of file
@@ -0,0 +1,146 @@
+import re
+from dataclasses import dataclass
+from typing import List
+
+from chinese_time_parser import CLOCK, PERIOD, RANGE_SEP, NUM
+
+# =========================
+# 1️⃣ 掃描用規則（單一 regex，一次掃描）
+# =========================
+
+# 時間提及：時間範圍算一次（下午兩點到四點）、只有時段也算（上午）
+TIME_MENTION = rf"(?:{PERIOD})?\s*{CLOCK}(?:\s*{RANGE_SEP}\s*(?:{PERIOD})?\s*{CLOCK})?|{PERIOD}"
+DATE_MENTION = (
+    rf"(?:\d{{4}}年)?{NUM}月{NUM}[日號号]?"
+    r"|(?:下下|下|這|这|本|上)?個?(?:週|周|星期|禮拜|礼拜)[一二三四五六日天]"
+    r"|(?<![\d:：])\d{1,2}/\d{1,2}(?![\d:：])"
+    r"|大後天|大后天|今天|今日|明天|明日|後天|后天"
+)
+BOUNDARY = r"[，,、；;。！!\n]+"
+SEQUENCE = r"然後|然后|接著|接着|之後|之后|再來|再来|隨後|随后|另外|還有|还有|以及"
+ORDINAL = r"首先|其次|最後|最后|第[二三四五]"
+
+SCAN_RE = re.compile(
+    rf"(?P<time>{TIME_MENTION})"
+    rf"|(?P<date>{DATE_MENTION})"
+    rf"|(?P<boundary>{BOUNDARY})"
+    rf"|(?P<sequence>{SEQUENCE})"
+    rf"|(?P<ordinal>{ORDINAL})"
+)
+
+# 分數權重
+WEIGHT_TIME_GROUP = 1.0  # 被分隔開的另一組時間
+WEIGHT_DATE = 1.0  # 另一個不同的日期
+WEIGHT_SEQUENCE = 0.25  # 序列詞（然後、接著……）
+WEIGHT_ORDINAL = 0.25  # 序數詞（首先、其次……）
+MULTI_THRESHOLD = 1.0
+
+
+@dataclass
+class RoutingScore:
+    """多事件判斷的掃描結果"""
+    time_groups: int = 0  # 彼此被文字或分隔符隔開的時間組數
+    distinct_dates: int = 0  # 不同的日期數
+    sequence_words: int = 0  # 序列詞數
+    ordinal_words: int = 0  # 序數詞數
+
+    @property
+    def score(self) -> float:
+        score = 0.0
+        score += max(0, self.time_groups - 1) * WEIGHT_TIME_GROUP
+        score += max(0, self.distinct_dates - 1) * WEIGHT_DATE
+        # 序列詞只有在出現多個時間或日期時才有意義
+        if self.time_groups + self.distinct_dates >= 2:
+            score += self.sequence_words * WEIGHT_SEQUENCE
+            score += self.ordinal_words * WEIGHT_ORDINAL
+        return score
+
+    @property
+    def is_multi(self) -> bool:
+        return self.score >= MULTI_THRESHOLD
+
+
+class MultiEventClassifier:
+    """判斷輸入是否包含多個事件
+
+    單次掃描：統計「被分隔符或其他文字隔開的時間組」與不同日期，
+    單純的逗號、空白或「早上」一詞不再直接判定為多事件。
+    """
+
+    def scan(self, text: str) -> RoutingScore:
+        result = RoutingScore()
+        dates = set()
+        last_time_end = None
+        separated = False
+
+        for match in SCAN_RE.finditer(text):
+            kind = match.lastgroup
+
+            if kind == "time":
+                # 與前一組時間之間有分隔符或其他文字 → 新的一組
+                if last_time_end is None:
+                    result.time_groups = 1
+                elif separated or text[last_time_end:match.start()].strip():
+                    result.time_groups += 1
+                last_time_end = match.end()
+                separated = False
+            elif kind == "date":
+                dates.add(match.group(0))
+                separated = True
+            elif kind == "boundary":
+                separated = True
+            elif kind == "sequence":
+                result.sequence_words += 1
+                separated = True
+            elif kind == "ordinal":
+                result.ordinal_words += 1
+                separated = True
+
+        result.distinct_dates = len(dates)
+        return result
+
+    def is_multi(self, text: str) -> bool:
+        return self.scan(text).is_multi
+
+
+# =========================
+# 2️⃣ 長輸入拆分
+# =========================
+
+TIME_RE = re.compile(TIME_MENTION)
+DATE_RE = re.compile(DATE_MENTION)
+# 日期標題行去掉日期後剩下的標點
+HEADER_REST_RE = re.compile(r"[\s:：、，,（）()\-－]*")
+
+
+def split_schedule(text: str) -> List[str]:
+    """把貼上的長行程（週課表、行程表）拆成彼此獨立的片段
+
+    - 每一行是一個片段
+    - 只有日期的行（例如「週一：」）視為標題，套用到下面沒有日期的行
+    - 沒有日期也沒有時間的行，視為上一個片段的補充說明
+    """
+    segments: List[str] = []
+    header = ""
+
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+
+        has_date = DATE_RE.search(line) is not None
+        has_time = TIME_RE.search(line) is not None
+
+        if has_date and not has_time and HEADER_REST_RE.fullmatch(DATE_RE.sub("", line)):
+            header = DATE_RE.search(line).group(0)
+            continue
+
+        if not has_date and not has_time and segments:
+            segments[-1] = f"{segments[-1]}，{line}"
+            continue
+
+        if header and not has_date:
+            line = f"{header} {line}"
+        segments.append(line)
+
+    return segments
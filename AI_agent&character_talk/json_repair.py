@@ -0,0 +1,79 @@
+import json
+import re
+from typing import Dict, List, Tuple
+
+# ```json ... ``` 程式碼區塊
+CODE_FENCE_RE = re.compile(r"```(?:json|JSON)?\s*(.*?)```", re.DOTALL)
+# 物件或陣列結尾前多餘的逗號
+TRAILING_COMMA_RE = re.compile(r",\s*([}\]])")
+
+_decoder = json.JSONDecoder()
+
+
+class JSONRepairError(ValueError):
+    """無法從模型輸出中還原出事件列表"""
+
+
+def _decode_first(text: str):
+    """解析文字中第一個 JSON 值（忽略前後多餘文字）"""
+    for index, char in enumerate(text):
+        if char not in "{[":
+            continue
+        try:
+            value, _ = _decoder.raw_decode(text, index)
+            return value
+        except json.JSONDecodeError:
+            # 常見的小錯誤：結尾多一個逗號
+            candidate = TRAILING_COMMA_RE.sub(r"\1", text[index:])
+            try:
+                value, _ = _decoder.raw_decode(candidate)
+                return value
+            except json.JSONDecodeError:
+                continue
+    raise JSONRepairError("輸出中找不到合法的 JSON")
+
+
+def repair_events_json(text: str) -> Tuple[List[Dict], bool]:
+    """將模型輸出還原為事件列表，回傳 (事件列表, 是否經過修復)
+
+    可處理：
+    - ```json 程式碼區塊
+    - JSON 前後的說明文字
+    - 結尾多餘的逗號
+    - 單一事件物件、事件陣列、{"events": [...]} 三種形狀
+    """
+    text = text.strip()
+    repaired = False
+
+    try:
+        value = json.loads(text)
+    except json.JSONDecodeError:
+        repaired = True
+        fence = CODE_FENCE_RE.search(text)
+        value = _decode_first(fence.group(1) if fence else text)
+
+    if isinstance(value, dict) and isinstance(value.get("events"), list):
+        events = value["events"]
+    elif isinstance(value, dict):
+        # 只回傳一個事件物件
+        events = [value]
+    elif isinstance(value, list):
+        events = value
+    else:
+        raise JSONRepairError(f"無法辨識的 JSON 結構：{type(value).__name__}")
+
+    events = [event for event in events if isinstance(event, dict)]
+    if not events:
+        raise JSONRepairError("輸出中沒有任何事件")
+
+    return events, repaired
+
+
+def failed_generation(error: Exception) -> str:
+    """取出 Groq JSON 模式驗證失敗時附帶的原始輸出（沒有則回傳空字串）"""
+    body = getattr(error, "body", None)
+    if isinstance(body, dict):
+        detail = body.get("error", body)
+        if isinstance(detail, dict):
+            return detail.get("failed_generation") or ""
+    return ""
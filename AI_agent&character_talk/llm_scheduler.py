@@ -0,0 +1,277 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Dict, Hashable, Optional, Tuple
+
+# 優先等級（數字越小越優先）
+PRIORITY_CALENDAR = 0  # 日曆解析：用戶正在等待結果
+PRIORITY_CHAT = 1  # 沙盒閒聊
+
+PRIORITY_NAMES = {
+    PRIORITY_CALENDAR: "calendar",
+    PRIORITY_CHAT: "chat",
+}
+
+# 租戶：(guild_id, user_id)
+Tenant = Tuple[Optional[Hashable], Optional[Hashable]]
+
+
+def estimate_tokens(text: str, max_output_tokens: int = 0) -> int:
+    """粗估 token 數（中文約一字一 token，保守估計）"""
+    return len(text) + max_output_tokens
+
+
+class TokenBucket:
+    """令牌桶（可透支：實際用量超過預估時，餘額可以是負數）"""
+
+    def __init__(self, capacity: float, refill_per_second: float):
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self.level = capacity
+        self._updated_at = time.monotonic()
+
+    def _refill(self, now: float):
+        elapsed = now - self._updated_at
+        if elapsed > 0:
+            self.level = min(self.capacity, self.level + elapsed * self.refill_per_second)
+            self._updated_at = now
+
+    def time_until(self, amount: float, now: float) -> float:
+        """距離可取出 amount 還需要幾秒"""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.refill_per_second
+
+    def consume(self, amount: float, now: float):
+        """取出 amount（不檢查餘額；負數代表退還）"""
+        self._refill(now)
+        self.level = min(self.capacity, self.level - amount)
+
+
+@dataclass
+class Ticket:
+    """已取得的執行許可"""
+    priority: int
+    tenant: Tenant
+    estimated_tokens: int
+    enqueued_at: float
+    granted_at: float = 0.0
+
+
+@dataclass
+class _Waiter:
+    ticket: Ticket
+    future: asyncio.Future
+
+
+class _FairQueue:
+    """兩層輪詢佇列：先在伺服器之間輪流，再在同一伺服器的用戶之間輪流"""
+
+    def __init__(self):
+        self._groups: "OrderedDict[Hashable, OrderedDict[Hashable, deque]]" = OrderedDict()
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def push(self, tenant: Tenant, waiter: _Waiter):
+        guild_id, user_id = tenant
+        users = self._groups.setdefault(guild_id, OrderedDict())
+        users.setdefault(user_id, deque()).append(waiter)
+        self._size += 1
+
+    def peek(self) -> Optional[_Waiter]:
+        if not self._groups:
+            return None
+        users = next(iter(self._groups.values()))
+        return next(iter(users.values()))[0]
+
+    def pop(self) -> _Waiter:
+        """取出下一個，並把該用戶、該伺服器移到輪詢尾端"""
+        guild_id, users = next(iter(self._groups.items()))
+        user_id, waiters = next(iter(users.items()))
+        waiter = waiters.popleft()
+        self._size -= 1
+
+        if waiters:
+            users.move_to_end(user_id)
+        else:
+            del users[user_id]
+
+        if users:
+            self._groups.move_to_end(guild_id)
+        else:
+            del self._groups[guild_id]
+
+        return waiter
+
+
+class LLMScheduler:
+    """全域 LLM 排程器
+
+    - 每分鐘請求數（RPM）與每分鐘 token 數（TPM）兩個令牌桶
+    - 日曆解析優先於沙盒閒聊
+    - 同一優先等級內，伺服器之間、用戶之間輪流分配
+    - 提供佇列長度與等待時間統計
+    """
+
+    def __init__(self, requests_per_minute: int = 30, tokens_per_minute: int = 6000,
+                 max_concurrency: int = 4):
+        self.request_bucket = TokenBucket(requests_per_minute, requests_per_minute / 60)
+        self.token_bucket = TokenBucket(tokens_per_minute, tokens_per_minute / 60)
+        self.max_concurrency = max(1, max_concurrency)
+
+        self._queues: Dict[int, _FairQueue] = {p: _FairQueue() for p in sorted(PRIORITY_NAMES)}
+        self._in_flight = 0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+
+        # 等待時間統計
+        self._wait_stats = {
+            p: {"count": 0, "total": 0.0, "max": 0.0, "last": 0.0} for p in PRIORITY_NAMES
+        }
+
+    # --------------------------
+    # 對外介面
+    # --------------------------
+    async def acquire(self, priority: int = PRIORITY_CHAT, tenant: Optional[Tenant] = None,
+                      estimated_tokens: int = 500) -> Ticket:
+        """排隊取得執行許可"""
+        self._ensure_dispatcher()
+
+        tenant = tenant or (None, None)
+        loop = asyncio.get_running_loop()
+        ticket = Ticket(
+            priority=priority,
+            tenant=tenant,
+            estimated_tokens=estimated_tokens,
+            enqueued_at=time.monotonic()
+        )
+        waiter = _Waiter(ticket=ticket, future=loop.create_future())
+
+        self._queues[priority].push(tenant, waiter)
+        self._wakeup.set()
+
+        try:
+            return await waiter.future
+        except asyncio.CancelledError:
+            # 許可剛好發出時被取消 → 歸還
+            if waiter.future.done() and not waiter.future.cancelled():
+                self.release(waiter.future.result())
+            raise
+
+    def release(self, ticket: Ticket, actual_tokens: Optional[int] = None):
+        """歸還許可；提供實際用量時修正 token 桶"""
+        self._in_flight -= 1
+
+        if actual_tokens is not None:
+            self.token_bucket.consume(actual_tokens - ticket.estimated_tokens, time.monotonic())
+
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    @asynccontextmanager
+    async def slot(self, priority: int = PRIORITY_CHAT, tenant: Optional[Tenant] = None,
+                   estimated_tokens: int = 500):
+        """async with scheduler.slot(...) as usage: ...
+
+        可在區塊內設定 usage["actual_tokens"]，歸還時用來修正 token 桶
+        """
+        ticket = await self.acquire(priority, tenant, estimated_tokens)
+        usage = {"actual_tokens": None}
+        try:
+            yield usage
+        finally:
+            self.release(ticket, usage["actual_tokens"])
+
+    def get_metrics(self) -> Dict:
+        """排程器統計"""
+        now = time.monotonic()
+        # 觸發補充，讓回報的餘額是最新的
+        self.request_bucket.time_until(0, now)
+        self.token_bucket.time_until(0, now)
+
+        metrics = {
+            "in_flight": self._in_flight,
+            "max_concurrency": self.max_concurrency,
+            "queue_depth": sum(len(q) for q in self._queues.values()),
+            "requests_available": round(self.request_bucket.level, 1),
+            "tokens_available": round(self.token_bucket.level, 1),
+            "priorities": {}
+        }
+
+        for priority, name in PRIORITY_NAMES.items():
+            stats = self._wait_stats[priority]
+            metrics["priorities"][name] = {
+                "queue_depth": len(self._queues[priority]),
+                "served": stats["count"],
+                "avg_wait_ms": round(stats["total"] / stats["count"] * 1000, 1) if stats["count"] else 0.0,
+                "max_wait_ms": round(stats["max"] * 1000, 1),
+                "last_wait_ms": round(stats["last"] * 1000, 1),
+            }
+
+        return metrics
+
+    # --------------------------
+    # 內部排程
+    # --------------------------
+    def _ensure_dispatcher(self):
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+
+    def _next_waiter(self) -> Optional[_Waiter]:
+        """依優先等級取得下一個等待者（略過已取消的）"""
+        for queue in self._queues.values():
+            while len(queue):
+                waiter = queue.peek()
+                if not waiter.future.cancelled():
+                    return waiter
+                queue.pop()
+        return None
+
+    async def _dispatch(self):
+        """發放許可的背景迴圈"""
+        while True:
+            self._wakeup.clear()
+
+            waiter = self._next_waiter()
+            if waiter is None or self._in_flight >= self.max_concurrency:
+                await self._wakeup.wait()
+                continue
+
+            now = time.monotonic()
+            delay = max(
+                self.request_bucket.time_until(1, now),
+                self.token_bucket.time_until(waiter.ticket.estimated_tokens, now)
+            )
+            if delay > 0:
+                # 等待額度恢復；期間若有更高優先的請求進來會提早醒來
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            self._queues[waiter.ticket.priority].pop()
+
+            self.request_bucket.consume(1, now)
+            self.token_bucket.consume(waiter.ticket.estimated_tokens, now)
+            self._in_flight += 1
+
+            ticket = waiter.ticket
+            ticket.granted_at = now
+            self._record_wait(ticket.priority, now - ticket.enqueued_at)
+            waiter.future.set_result(ticket)
+
+    def _record_wait(self, priority: int, waited: float):
+        stats = self._wait_stats[priority]
+        stats["count"] += 1
+        stats["total"] += waited
+        stats["max"] = max(stats["max"], waited)
+        stats["last"] = waited
@@ -0,0 +1,84 @@
+import copy
+import datetime as dt
+import re
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional
+
+import pytz
+
+
+def normalize_text(text: str) -> str:
+    """正規化輸入：全形轉半形、合併空白、英文轉小寫"""
+    text = unicodedata.normalize("NFKC", text)
+    text = re.sub(r"\s+", " ", text).strip()
+    return text.lower()
+
+
+class ParseCache:
+    """日曆解析結果 LRU 快取
+
+    key 為 (正規化文字, 當日日期, 其他參數)。
+    「明天」等相對日期隔天意義就不同，所以當地日期一換日就整個清空。
+    """
+
+    def __init__(self, timezone: str = "Asia/Taipei", max_size: int = 256):
+        self.timezone = timezone
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+
+        self._entries: "OrderedDict[Hashable, Dict]" = OrderedDict()
+        self._date: Optional[str] = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _today(self) -> str:
+        return dt.datetime.now(pytz.timezone(self.timezone)).strftime("%Y-%m-%d")
+
+    def _key(self, text: str, *variant) -> Hashable:
+        """建立 key，並在換日時清空快取"""
+        today = self._today()
+        if today != self._date:
+            self._entries.clear()
+            self._date = today
+        return (normalize_text(text), today) + variant
+
+    def get(self, text: str, *variant) -> Optional[Dict]:
+        """查詢快取（命中時回傳副本）"""
+        key = self._key(text, *variant)
+        result = self._entries.get(key)
+        if result is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return copy.deepcopy(result)
+
+    def put(self, text: str, result: Dict, *variant):
+        """寫入快取（只保存成功的結果）"""
+        if not result.get("success"):
+            return
+
+        key = self._key(text, *variant)
+        self._entries[key] = copy.deepcopy(result)
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+    def get_stats(self) -> Dict:
+        """快取統計"""
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+        }
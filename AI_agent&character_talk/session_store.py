@@ -0,0 +1,109 @@
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Deque, Dict, Hashable, List, Optional, Tuple
+
+# 對話 key: (guild_id, channel_id, user_id, role_key)
+SessionKey = Tuple[Optional[int], Optional[int], Optional[int], str]
+
+
+def make_session_key(guild_id: Optional[int], channel_id: Optional[int],
+                     user_id: Optional[int], role_key: str) -> SessionKey:
+    """建立對話 key"""
+    return (guild_id, channel_id, user_id, role_key)
+
+
+@dataclass
+class Session:
+    """單一對話（固定容量環狀緩衝）"""
+    history: Deque[Dict]  # 對話紀錄
+    last_active: float = field(default_factory=time.monotonic)  # 最後活動時間
+
+    def append(self, entry: Dict):
+        """加入一筆紀錄（超過容量時自動丟棄最舊的）"""
+        self.history.append(entry)
+        self.last_active = time.monotonic()
+
+    def recent(self, count: int) -> List[Dict]:
+        """取得最近 count 筆紀錄"""
+        if count >= len(self.history):
+            return list(self.history)
+        return list(self.history)[-count:]
+
+
+class SessionStore:
+    """依 (伺服器, 頻道, 用戶, 角色) 分開保存的對話紀錄
+
+    - 以 dict 查找，O(1)
+    - 每個對話使用固定容量的 deque
+    - 依最後活動時間排序（OrderedDict），閒置對話從最舊一端淘汰
+    """
+
+    def __init__(self, max_entries: int = 20, idle_timeout: float = 1800.0,
+                 max_sessions: int = 1000):
+        self.max_entries = max_entries
+        self.idle_timeout = idle_timeout
+        self.max_sessions = max_sessions
+        self._sessions: "OrderedDict[Hashable, Session]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._sessions
+
+    def get(self, key: Hashable) -> Session:
+        """取得（或建立）對話，並標記為最近使用"""
+        self._evict_idle()
+
+        session = self._sessions.get(key)
+        if session is None:
+            session = Session(history=deque(maxlen=self.max_entries))
+            self._sessions[key] = session
+
+            # 超過上限 → 淘汰最久未使用的對話
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        else:
+            session.last_active = time.monotonic()
+            self._sessions.move_to_end(key)
+
+        return session
+
+    def append(self, key: Hashable, entry: Dict):
+        """加入一筆對話紀錄"""
+        self.get(key).append(entry)
+
+    def recent(self, key: Hashable, count: int) -> List[Dict]:
+        """取得最近的對話紀錄（不存在或已閒置過期時回傳空列表）"""
+        self._evict_idle()
+        session = self._sessions.get(key)
+        if session is None:
+            return []
+        return session.recent(count)
+
+    def remove(self, key: Hashable) -> bool:
+        """移除對話"""
+        return self._sessions.pop(key, None) is not None
+
+    def total_entries(self) -> int:
+        """所有對話的紀錄總數"""
+        return sum(len(session.history) for session in self._sessions.values())
+
+    def clear(self) -> int:
+        """清除所有對話，回傳清除的紀錄數"""
+        count = self.total_entries()
+        self._sessions.clear()
+        return count
+
+    def _evict_idle(self):
+        """從最舊一端淘汰閒置的對話"""
+        if not self._sessions:
+            return
+
+        deadline = time.monotonic() - self.idle_timeout
+        while self._sessions:
+            oldest_key = next(iter(self._sessions))
+            if self._sessions[oldest_key].last_active > deadline:
+                break
+            del self._sessions[oldest_key]